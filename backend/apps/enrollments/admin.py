@@ -2,13 +2,19 @@
 Enrollments admin configuration.
 """
 from datetime import timedelta
+from django import forms
 from django.contrib import admin
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Enrollment, Coupon, Settings
+from .models import Enrollment, Coupon, Settings, EmailOutbox, Broadcast
+from .broadcasts import BroadcastAlreadyQueued, count_recipients, queue_broadcast, with_progress
+from .search import CPF_QUERY_PATTERN, only_digits
+from .seats import update_status_releasing_seats
+from .coupon_cache import invalidate_coupons
+from .coupon_generation import DEFAULT_LENGTH, coupon_template_from, generate_coupons, write_codes_csv
 
 
 @admin.register(Enrollment)
@@ -16,8 +22,8 @@ class EnrollmentAdmin(admin.ModelAdmin):
     """Admin for Enrollment model."""
     
     list_display = ['id', 'user_info', 'product', 'batch', 'status_badge', 'payment_method_display', 'final_amount', 'installments', 'shirt_size', 'pg_leader', 'created_at']
-    list_filter = ['status', 'payment_method', 'batch__product', 'created_at']
-    search_fields = ['user__email', 'user__first_name', 'user__last_name', 'product__name']
+    list_filter = ['status', 'payment_method', 'batch__product', 'shirt_size', 'created_at']
+    search_fields = ['user__email', 'user__first_name', 'user__last_name', 'product__name', '=participant_cpf']
     readonly_fields = ['created_at', 'updated_at', 'paid_at', 'total_amount', 'discount_amount', 'final_amount']
     date_hierarchy = 'created_at'
     
@@ -46,6 +52,16 @@ class EnrollmentAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_paid', 'cancel_enrollments', 'export_to_csv', 'reissue_cancelled_pix_installments']
     
+    def get_search_results(self, request, queryset, search_term):
+        """Also match CPFs typed with punctuation (e.g. 123.456.789-00)."""
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        search_term = search_term.strip()
+        if search_term and CPF_QUERY_PATTERN.fullmatch(search_term):
+            digits = only_digits(search_term)
+            if digits:
+                results |= queryset.filter(participant_cpf=digits)
+        return results, may_have_duplicates
+    
     def user_info(self, obj):
         """Display user information with link."""
         url = reverse('admin:users_user_change', args=[obj.user.id])
@@ -91,16 +107,6 @@ class EnrollmentAdmin(admin.ModelAdmin):
         )
     payment_method_display.short_description = _('Método')
     
-    def shirt_size(self, obj):
-        """Display shirt size from form_data."""
-        return obj.form_data.get('tamanho_camiseta', '-')
-    shirt_size.short_description = _('Camiseta')
-    
-    def pg_leader(self, obj):
-        """Display PG leader from form_data."""
-        return obj.form_data.get('lider_pg', '-')
-    pg_leader.short_description = _('Líder PG')
-    
     def mark_as_paid(self, request, queryset):
         """Mark selected enrollments as paid."""
         updated = queryset.filter(status='PENDING_PAYMENT').update(
@@ -112,7 +118,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
     
     def cancel_enrollments(self, request, queryset):
         """Cancel selected enrollments."""
-        updated = queryset.exclude(status='CANCELLED').update(status='CANCELLED')
+        updated = update_status_releasing_seats(queryset.exclude(status='CANCELLED'), 'CANCELLED')
         self.message_user(request, f'{updated} inscrição(ões) cancelada(s).')
     cancel_enrollments.short_description = _('Cancelar inscrições')
     
@@ -134,20 +140,20 @@ class EnrollmentAdmin(admin.ModelAdmin):
             'Valor Final', 'Data Inscrição', 'Data Pagamento'
         ])
         
-        for enrollment in queryset:
+        for enrollment in queryset.select_related('product', 'batch'):
             form_data = enrollment.form_data
             writer.writerow([
                 enrollment.id,
-                form_data.get('nome_completo', ''),
-                form_data.get('email', ''),
+                enrollment.participant_name,
+                enrollment.participant_email,
                 form_data.get('telefone', ''),
                 form_data.get('cpf', ''),
                 form_data.get('rg', ''),
-                form_data.get('data_nascimento', ''),
-                form_data.get('tamanho_camiseta', ''),
+                enrollment.birth_date.isoformat() if enrollment.birth_date else '',
+                enrollment.shirt_size,
                 form_data.get('membro_batista_capital', ''),
-                form_data.get('igreja', ''),
-                form_data.get('lider_pg', ''),
+                enrollment.church,
+                enrollment.pg_leader,
                 enrollment.product.name,
                 enrollment.batch.name,
                 enrollment.get_status_display(),
@@ -210,7 +216,7 @@ class CouponAdmin(admin.ModelAdmin):
     search_fields = ['code', 'description']
     readonly_fields = ['uses_count', 'created_at', 'updated_at']
     filter_horizontal = ['products']
-    actions = ['bulk_set_discount_value', 'bulk_set_max_installments']
+    actions = ['bulk_set_discount_value', 'bulk_set_max_installments', 'generate_codes_from_template']
     
     fieldsets = (
         (_('Informações Básicas'), {
@@ -301,6 +307,7 @@ class CouponAdmin(admin.ModelAdmin):
             if form.is_valid():
                 discount_value = form.cleaned_data['discount_value']
                 updated = queryset.update(discount_value=discount_value)
+                invalidate_coupons()
                 self.message_user(request, f'{updated} cupom(ns) atualizado(s) com desconto de {discount_value}.')
                 return HttpResponseRedirect(request.get_full_path())
         else:
@@ -344,6 +351,7 @@ class CouponAdmin(admin.ModelAdmin):
                     max_installments=max_installments,
                     enable_12x_installments=enable_special
                 )
+                invalidate_coupons()
                 self.message_user(request, f'{updated} cupom(ns) atualizado(s) com máximo de {max_installments}x parcelas.')
                 return HttpResponseRedirect(request.get_full_path())
         else:
@@ -356,6 +364,76 @@ class CouponAdmin(admin.ModelAdmin):
             'action': 'bulk_set_max_installments',
             'field_name': 'máximo de parcelas',
         })
+    
+    @admin.action(description=_('Gerar códigos em massa a partir do cupom selecionado'))
+    def generate_codes_from_template(self, request, queryset):
+        """Generate unique single-use codes copying the selected coupon's settings, as CSV."""
+        import io
+        from django import forms
+        from django.shortcuts import render
+        from django.http import HttpResponse
+        
+        class GenerateForm(forms.Form):
+            count = forms.IntegerField(
+                label='Quantidade de códigos',
+                min_value=1,
+                max_value=200000
+            )
+            prefix = forms.CharField(
+                label='Prefixo',
+                required=False,
+                max_length=20,
+                help_text='Ex: NATAL- (opcional)'
+            )
+            length = forms.IntegerField(
+                label='Caracteres aleatórios',
+                min_value=4,
+                max_value=20,
+                initial=DEFAULT_LENGTH
+            )
+            max_uses = forms.IntegerField(
+                label='Usos por código',
+                min_value=1,
+                initial=1
+            )
+        
+        if queryset.count() != 1:
+            self.message_user(request, 'Selecione exatamente um cupom para servir de modelo.', level=messages.ERROR)
+            return None
+        
+        coupon = queryset.get()
+        if 'apply' in request.POST:
+            form = GenerateForm(request.POST)
+            if form.is_valid():
+                template, product_ids = coupon_template_from(coupon)
+                template['max_uses'] = form.cleaned_data['max_uses']
+                try:
+                    codes = generate_coupons(
+                        form.cleaned_data['count'],
+                        template,
+                        prefix=form.cleaned_data['prefix'],
+                        length=form.cleaned_data['length'],
+                        product_ids=product_ids,
+                    )
+                except ValueError as e:
+                    self.message_user(request, str(e), level=messages.ERROR)
+                    return None
+                
+                # Written in one go: utf-8-sig would prefix every write() with a BOM
+                content = io.StringIO()
+                write_codes_csv(codes, content, template)
+                response = HttpResponse(content.getvalue(), content_type='text/csv; charset=utf-8-sig')
+                response['Content-Disposition'] = f'attachment; filename="cupons_{coupon.code}.csv"'
+                return response
+        else:
+            form = GenerateForm()
+        
+        return render(request, 'admin/generate_coupons_form.html', {
+            'title': 'Gerar Códigos em Massa',
+            'coupon': coupon,
+            'form': form,
+            'action': 'generate_codes_from_template',
+        })
 
 
 @admin.register(Settings)
@@ -382,3 +460,120 @@ class SettingsAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['updated_at']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Admin for the transactional email outbox (delivery status and retries)."""
+    
+    list_display = ['template', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'template']
+    search_fields = ['recipient', 'object_key']
+    readonly_fields = [
+        'template', 'recipient', 'object_key', 'status', 'attempts', 'next_attempt_at',
+        'last_error', 'provider_message_id', 'sent_at', 'created_at', 'updated_at',
+    ]
+    exclude = ['context']
+    actions = ['retry_emails']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description=_('Reenviar emails selecionados'))
+    def retry_emails(self, request, queryset):
+        """Put failed (or sent) emails back in the queue."""
+        updated = queryset.exclude(status='SENDING').update(
+            status='PENDING',
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            last_error='',
+        )
+        self.message_user(request, f'{updated} email(s) colocado(s) novamente na fila.', messages.SUCCESS)
+
+
+class BroadcastForm(forms.ModelForm):
+    enrollment_statuses = forms.MultipleChoiceField(
+        label='Status das inscrições',
+        choices=Enrollment.STATUS_CHOICES,
+        initial=['PAID'],
+        widget=forms.CheckboxSelectMultiple,
+    )
+    
+    class Meta:
+        model = Broadcast
+        fields = ['subject', 'body', 'product', 'batch', 'enrollment_statuses', 'payment_method']
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        product = cleaned_data.get('product')
+        batch = cleaned_data.get('batch')
+        if product and batch and batch.product_id != product.id:
+            self.add_error('batch', 'O lote não pertence ao evento selecionado.')
+        return cleaned_data
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    """Admin for broadcast emails to the participants of a product."""
+    
+    form = BroadcastForm
+    list_display = ['subject', 'product', 'batch', 'status', 'recipients_count', 'progress', 'queued_at', 'created_by']
+    list_filter = ['status', 'product']
+    search_fields = ['subject']
+    list_select_related = ['product', 'batch', 'created_by']
+    actions = ['send_broadcasts']
+    
+    def get_queryset(self, request):
+        return with_progress(super().get_queryset(request))
+    
+    def get_fields(self, request, obj=None):
+        fields = ['subject', 'body', 'product', 'batch', 'enrollment_statuses', 'payment_method']
+        if obj is None:
+            return fields
+        if obj.status == 'DRAFT':
+            return fields + ['recipients_preview']
+        return fields + ['status', 'recipients_count', 'progress', 'queued_at', 'created_by']
+    
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        if obj.status == 'DRAFT':
+            return ['recipients_preview']
+        # Already sent: keep the record as it went out
+        return self.get_fields(request, obj)
+    
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+    
+    def recipients_preview(self, obj):
+        return f'{count_recipients(obj)} email(s) distinto(s) com os filtros salvos'
+    recipients_preview.short_description = _('Destinatários')
+    
+    def progress(self, obj):
+        if obj.status == 'DRAFT':
+            return '-'
+        return format_html(
+            '{} de {} enviado(s)<br><small style="color: gray;">{} na fila, {} com falha</small>',
+            obj.sent_count,
+            obj.recipients_count,
+            obj.pending_count,
+            obj.failed_count,
+        )
+    progress.short_description = _('Progresso')
+    
+    @admin.action(description=_('Enviar comunicados selecionados'))
+    def send_broadcasts(self, request, queryset):
+        """Queue the selected draft broadcasts for their participants."""
+        for broadcast in queryset.select_related('product'):
+            try:
+                total = queue_broadcast(broadcast)
+            except BroadcastAlreadyQueued:
+                self.message_user(request, f'"{broadcast.subject}" já foi enviado.', messages.WARNING)
+                continue
+            self.message_user(
+                request,
+                f'"{broadcast.subject}" colocado na fila para {total} destinatário(s).',
+                messages.SUCCESS,
+            )
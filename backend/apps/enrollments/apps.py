@@ -5,3 +5,6 @@ class EnrollmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.enrollments'
     verbose_name = 'Inscrições'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
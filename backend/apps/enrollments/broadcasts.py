@@ -0,0 +1,114 @@
+"""
+Broadcast emails to the participants of a product.
+
+Queueing a broadcast streams the matching enrollments with iterator(),
+keeps one recipient per email address (participants enrolled more than
+once, or sharing an address, get a single email) and inserts the emails
+into the outbox in chunks. The send_emails worker then renders them per
+recipient and sends them through the provider's batch API, within
+EMAIL_PROVIDER_RATE_LIMIT. Progress is read back from the outbox rows.
+"""
+from django.db import transaction
+from django.db.models import CharField, Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Lower, NullIf
+from django.utils import timezone
+
+from .models import Broadcast, EmailOutbox, Enrollment
+from .outbox import queue_emails
+
+TEMPLATE = 'broadcast'
+CHUNK_SIZE = 1000
+
+
+class BroadcastAlreadyQueued(Exception):
+    """Raised when queueing a broadcast that is no longer a draft."""
+
+
+def broadcast_enrollments(broadcast):
+    """Enrollments targeted by a broadcast."""
+    enrollments = Enrollment.objects.filter(
+        product_id=broadcast.product_id,
+        status__in=broadcast.enrollment_statuses,
+    )
+    if broadcast.batch_id:
+        enrollments = enrollments.filter(batch_id=broadcast.batch_id)
+    if broadcast.payment_method:
+        enrollments = enrollments.filter(payment_method=broadcast.payment_method)
+    return enrollments
+
+
+def _recipients(broadcast, chunk_size):
+    """Yield (email, name) once per email address, oldest enrollment first."""
+    rows = broadcast_enrollments(broadcast).order_by('id').values_list(
+        'participant_email', 'user__email', 'participant_name', 'user__first_name', 'user__last_name'
+    )
+    seen = set()
+    for participant_email, user_email, participant_name, first_name, last_name in rows.iterator(chunk_size=chunk_size):
+        email = (participant_email or user_email or '').strip()
+        if not email or email.lower() in seen:
+            continue
+        seen.add(email.lower())
+        yield email, participant_name or f'{first_name} {last_name}'.strip()
+
+
+def count_recipients(broadcast):
+    """Number of distinct email addresses a broadcast would be sent to."""
+    return broadcast_enrollments(broadcast).aggregate(
+        total=Count(Lower(Coalesce(NullIf('participant_email', Value('')), 'user__email')), distinct=True)
+    )['total']
+
+
+def queue_broadcast(broadcast, chunk_size=CHUNK_SIZE):
+    """
+    Queue a draft broadcast for every targeted participant.
+
+    Returns:
+        Number of recipients
+
+    Raises:
+        BroadcastAlreadyQueued: If the broadcast was queued before
+    """
+    with transaction.atomic():
+        # Conditional update: two admins clicking "send" queue it once
+        if not Broadcast.objects.filter(pk=broadcast.pk, status='DRAFT').update(status='QUEUED'):
+            raise BroadcastAlreadyQueued()
+
+        total = 0
+        chunk = []
+        for email, name in _recipients(broadcast, chunk_size):
+            chunk.append((email, broadcast.outbox_key, {'broadcast_id': broadcast.pk, 'name': name}))
+            if len(chunk) >= chunk_size:
+                queue_emails(TEMPLATE, chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            queue_emails(TEMPLATE, chunk)
+            total += len(chunk)
+
+        broadcast.status = 'QUEUED'
+        broadcast.recipients_count = total
+        broadcast.queued_at = timezone.now()
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            recipients_count=total,
+            queued_at=broadcast.queued_at,
+            updated_at=broadcast.queued_at,
+        )
+    return total
+
+
+def with_progress(queryset):
+    """Annotate broadcasts with sent_count, failed_count and pending_count."""
+    def count(*statuses):
+        emails = EmailOutbox.objects.filter(
+            template=TEMPLATE,
+            object_key=Concat(Value('broadcast:'), Cast(OuterRef('pk'), CharField())),
+            status__in=statuses,
+        ).order_by().values('template').annotate(total=Count('id')).values('total')
+        return Coalesce(Subquery(emails, output_field=IntegerField()), 0)
+
+    return queryset.annotate(
+        sent_count=count('SENT'),
+        failed_count=count('FAILED'),
+        pending_count=count('PENDING', 'SENDING'),
+    )
+
@@ -0,0 +1,18 @@
+"""
+System checks for enrollment settings.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_waiting_room_cache(app_configs, **kwargs):
+    if settings.WAITING_ROOM_ENABLED and not settings.CACHE_IS_SHARED:
+        return [
+            Error(
+                'WAITING_ROOM_ENABLED requires a shared cache.',
+                hint='Set REDIS_URL: without it every process keeps its own queue and tokens.',
+                id='enrollments.E001',
+            )
+        ]
+    return []
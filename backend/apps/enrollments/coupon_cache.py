@@ -0,0 +1,206 @@
+"""
+Cached coupon lookups.
+
+Coupon definitions (including the ids of the products they are restricted
+to) are cached in the shared cache and in a small per-process dict, both
+keyed by a global coupon version. Any coupon save/delete or product
+restriction change bumps the version, which invalidates every entry at
+once; coupons change rarely, so this is simpler than per-code bookkeeping.
+Redemptions are the exception: a single-use campaign code is used up on
+every redemption, so only that code's entries are dropped
+(invalidate_coupon); other processes may keep their local copy for up to
+COUPON_LOCAL_CACHE_TIMEOUT, which redeem() catches.
+
+Guessed codes are answered by a Bloom filter over every existing code,
+built once per coupon version and kept in both caches: a code the filter
+rejects is unknown without a query or a per-code cache entry, however many
+different codes are tried. Only one caller rebuilds a missing filter; the
+others use the normal lookup meanwhile. Codes that pass the filter (existing ones plus
+~CODE_FILTER_ERROR_RATE false positives) go through the normal lookup,
+where unknown codes are cached too (negative caching). Creating a coupon
+bumps the version, making a new code visible immediately.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+COUPON_VERSION_KEY = 'coupons:version'
+MISSING = 'missing'
+LOCAL_MAX_ENTRIES = 1000
+CODE_FILTER_ERROR_RATE = 0.01
+FILTER_BUILD_LOCK_TIMEOUT = 60  # seconds
+
+_local = {}
+_local_lock = threading.Lock()
+_local_filter = None  # (version, CodeFilter)
+_filter_lock = threading.Lock()
+
+COUPON_FIELDS = [
+    'id', 'code', 'discount_type', 'discount_value', 'max_discount',
+    'min_purchase', 'max_uses', 'uses_count', 'valid_from', 'valid_until',
+    'active', 'description', 'enable_12x_installments', 'max_installments',
+]
+
+
+def get_coupon_version():
+    version = cache.get(COUPON_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses a version that
+        # per-process entries were stored under.
+        cache.add(COUPON_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(COUPON_VERSION_KEY)
+    return version
+
+
+def invalidate_coupons():
+    """Invalidate every cached coupon (positive and negative entries)."""
+    try:
+        cache.incr(COUPON_VERSION_KEY)
+    except ValueError:
+        cache.set(COUPON_VERSION_KEY, time.time_ns(), timeout=None)
+    with _local_lock:
+        _local.clear()
+
+
+def invalidate_coupon(code):
+    """Drop the cached definition of one coupon (e.g. once it is used up)."""
+    cache.delete(f'coupons:v{get_coupon_version()}:{code}')
+    with _local_lock:
+        _local.pop(code, None)
+
+
+class CodeFilter:
+    """Bloom filter over coupon codes: no false negatives, few false positives."""
+
+    def __init__(self, expected_count, error_rate=CODE_FILTER_ERROR_RATE):
+        expected_count = max(expected_count, 1)
+        self.bit_count = max(64, math.ceil(-expected_count * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / expected_count * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, code):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return ((first + index * second) % self.bit_count for index in range(self.hash_count))
+
+    def add(self, code):
+        for position in self._positions(code):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, code):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(code))
+
+
+def _build_code_filter():
+    from .models import Coupon
+
+    codes = Coupon.objects.order_by().values_list('code', flat=True)
+    code_filter = CodeFilter(codes.count())
+    for code in codes.iterator(chunk_size=5000):
+        code_filter.add(code)
+    return code_filter
+
+
+def get_code_filter(version):
+    """
+    Bloom filter of every existing coupon code for a coupon version.
+
+    Returns None while another thread or process is building it.
+    """
+    global _local_filter
+
+    entry = _local_filter
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    # One build per process; other threads skip the filter meanwhile
+    if not _filter_lock.acquire(blocking=False):
+        return None
+    try:
+        key = f'coupons:v{version}:filter'
+        code_filter = cache.get(key)
+        if code_filter is None:
+            # ...and one build across processes
+            lock_key = f'{key}:lock'
+            token = uuid.uuid4().hex
+            if not cache.add(lock_key, token, timeout=FILTER_BUILD_LOCK_TIMEOUT):
+                return None
+            try:
+                code_filter = _build_code_filter()
+                cache.set(key, code_filter, timeout=settings.COUPON_CACHE_TIMEOUT)
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+        _local_filter = (version, code_filter)
+        return code_filter
+    finally:
+        _filter_lock.release()
+
+
+def _load_definition(code):
+    from .models import Coupon
+
+    coupon = Coupon.objects.filter(code=code).values(*COUPON_FIELDS).first()
+    if coupon is None:
+        return MISSING
+    coupon['product_ids'] = list(
+        Coupon.products.through.objects.filter(coupon_id=coupon['id']).values_list('product_id', flat=True)
+    )
+    return coupon
+
+
+def _to_coupon(definition):
+    """Build a read-only Coupon instance from a cached definition."""
+    from .models import Coupon
+
+    fields = {name: definition[name] for name in COUPON_FIELDS}
+    coupon = Coupon(**fields)
+    coupon._state.adding = False
+    coupon.cached_product_ids = frozenset(definition['product_ids'])
+    return coupon
+
+
+def get_cached_coupon(code):
+    """
+    Return the Coupon for a (normalized) code, or None if it does not exist.
+
+    The returned instance is meant for validation and discount calculation;
+    its product restrictions are answered from the cache and uses_count may
+    lag by up to COUPON_CACHE_TIMEOUT (Coupon.redeem() stays authoritative).
+    """
+    version = get_coupon_version()
+    now = time.monotonic()
+
+    with _local_lock:
+        entry = _local.get(code)
+    if entry is not None and entry[0] == version and entry[1] > now:
+        definition = entry[2]
+    else:
+        code_filter = get_code_filter(version)
+        if code_filter is not None and code not in code_filter:
+            return None
+
+        key = f'coupons:v{version}:{code}'
+        definition = cache.get(key)
+        if definition is None:
+            definition = _load_definition(code)
+            timeout = (
+                settings.COUPON_NEGATIVE_CACHE_TIMEOUT if definition == MISSING
+                else settings.COUPON_CACHE_TIMEOUT
+            )
+            cache.set(key, definition, timeout=timeout)
+        with _local_lock:
+            if len(_local) >= LOCAL_MAX_ENTRIES:
+                _local.clear()
+            _local[code] = (version, now + settings.COUPON_LOCAL_CACHE_TIMEOUT, definition)
+
+    if definition == MISSING:
+        return None
+    return _to_coupon(definition)
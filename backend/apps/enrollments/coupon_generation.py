@@ -0,0 +1,124 @@
+"""
+Bulk generation of unique coupon codes.
+
+Codes are drawn at random from an alphabet without ambiguous characters,
+de-duplicated in memory against each other and against the existing codes
+with the same prefix (loaded once), then inserted with bulk_create in
+chunks. Product restrictions are inserted the same way through the M2M
+table, so generating 100k codes takes a handful of queries per chunk.
+"""
+import csv
+import secrets
+
+from django.db import transaction
+
+from .coupon_cache import invalidate_coupons
+from .models import Coupon
+
+# No 0/O, 1/I/L: codes are often typed by hand
+DEFAULT_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+DEFAULT_LENGTH = 8
+DEFAULT_CHUNK_SIZE = 5000
+
+COUPON_TEMPLATE_FIELDS = [
+    'discount_type', 'discount_value', 'max_discount', 'min_purchase',
+    'max_uses', 'valid_from', 'valid_until', 'active', 'description',
+    'enable_12x_installments', 'max_installments',
+]
+
+
+def _random_codes(count, prefix, length, alphabet, taken):
+    """Return `count` new codes not present in `taken` (which is updated)."""
+    space = len(alphabet) ** length
+    if len(taken) + count > space // 2:
+        raise ValueError(
+            f'Combinações insuficientes: aumente o tamanho do código ou o alfabeto '
+            f'({space} códigos possíveis)'
+        )
+
+    codes = []
+    while len(codes) < count:
+        code = prefix + ''.join(secrets.choice(alphabet) for _ in range(length))
+        if code not in taken:
+            taken.add(code)
+            codes.append(code)
+    return codes
+
+
+def generate_coupons(count, template, prefix='', length=DEFAULT_LENGTH,
+                     alphabet=DEFAULT_ALPHABET, product_ids=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create `count` coupons with unique random codes.
+
+    Args:
+        count: Number of coupons to create
+        template: Dict of Coupon fields shared by all codes
+            (see COUPON_TEMPLATE_FIELDS)
+        prefix: Fixed start of every code (e.g. 'NATAL-')
+        length: Number of random characters after the prefix
+        alphabet: Characters the random part is drawn from
+        product_ids: Products the coupons are restricted to (empty for all)
+        chunk_size: Rows per INSERT
+
+    Returns:
+        List of generated codes
+    """
+    prefix = prefix.strip().upper()
+    alphabet = ''.join(sorted(set(alphabet.upper())))
+    if count < 1:
+        raise ValueError('Quantidade deve ser maior que zero')
+    if len(prefix) + length > Coupon._meta.get_field('code').max_length:
+        raise ValueError('Prefixo + tamanho excede o limite do código do cupom')
+
+    fields = {name: template[name] for name in COUPON_TEMPLATE_FIELDS if name in template}
+    product_ids = list(product_ids or [])
+
+    taken = {
+        code for code in Coupon.objects.filter(code__startswith=prefix).values_list('code', flat=True)
+        if len(code) == len(prefix) + length
+    }
+    codes = _random_codes(count, prefix, length, alphabet, taken)
+
+    ProductRestriction = Coupon.products.through
+    with transaction.atomic():
+        for start in range(0, len(codes), chunk_size):
+            chunk = codes[start:start + chunk_size]
+            Coupon.objects.bulk_create(
+                [Coupon(code=code, **fields) for code in chunk],
+                batch_size=chunk_size,
+            )
+            if product_ids:
+                coupon_ids = Coupon.objects.filter(code__in=chunk).values_list('id', flat=True)
+                ProductRestriction.objects.bulk_create(
+                    [
+                        ProductRestriction(coupon_id=coupon_id, product_id=product_id)
+                        for coupon_id in coupon_ids
+                        for product_id in product_ids
+                    ],
+                    batch_size=chunk_size,
+                )
+        # bulk_create skips the signals that normally do this
+        transaction.on_commit(invalidate_coupons)
+
+    return codes
+
+
+def coupon_template_from(coupon):
+    """Template dict and product ids copied from an existing coupon."""
+    template = {name: getattr(coupon, name) for name in COUPON_TEMPLATE_FIELDS}
+    return template, list(coupon.products.values_list('id', flat=True))
+
+
+def write_codes_csv(codes, stream, template=None):
+    """Write generated codes (one per row) as CSV."""
+    writer = csv.writer(stream)
+    template = template or {}
+    writer.writerow(['codigo', 'tipo_desconto', 'valor_desconto', 'valido_ate'])
+    for code in codes:
+        writer.writerow([
+            code,
+            template.get('discount_type', ''),
+            template.get('discount_value', ''),
+            template['valid_until'].isoformat() if template.get('valid_until') else '',
+        ])
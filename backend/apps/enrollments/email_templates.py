@@ -0,0 +1,231 @@
+"""
+Email templates.
+
+Emails are Django templates under ``templates/emails/``. Those files are
+generated: the sources live in ``templates/emails/src/`` together with
+``styles.css``, and ``python manage.py build_email_templates`` copies them
+with the stylesheet already inlined into ``style`` attributes (rules that
+cannot be inlined, like ``:hover``, go in the ``<style>`` tag). Nothing is
+inlined or concatenated while sending.
+
+Templates are loaded through a dedicated engine with the cached loader, so
+each one is parsed once per process; rendering many messages with the same
+template (render_email_batch) reuses a single compiled template and context.
+"""
+import re
+from functools import lru_cache
+from html import escape
+from html.parser import HTMLParser
+from pathlib import Path
+
+from django.conf import settings
+from django.template import Context, Engine
+
+TEMPLATES_DIR = Path(settings.BASE_DIR) / 'templates'
+BUILD_DIR = TEMPLATES_DIR / 'emails'
+SOURCE_DIR = BUILD_DIR / 'src'
+STYLESHEET = SOURCE_DIR / 'styles.css'
+
+BUILD_HEADER = '{# Generated by manage.py build_email_templates from emails/src/%s; do not edit. #}\n'
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+SIMPLE_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)?((?:\.[\w-]+)*)$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    return Engine(
+        dirs=[str(TEMPLATES_DIR)],
+        loaders=[('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader'])],
+        autoescape=True,
+    )
+
+
+def get_email_template(name):
+    """Compiled template for an email (e.g. 'enrollment_confirmation')."""
+    return get_engine().get_template(f'emails/{name}.html')
+
+
+def render_email(name, context):
+    """Render one email to HTML."""
+    return get_email_template(name).render(Context(context))
+
+
+def render_email_batch(name, contexts, shared=None):
+    """
+    Render the same email for many recipients.
+
+    Args:
+        name: Email template name
+        contexts: Iterable of per-recipient context dicts
+        shared: Values common to every message (e.g. frontend_url)
+
+    Yields:
+        Rendered HTML, one per context, in order
+    """
+    template = get_email_template(name)
+    context = Context(shared or {})
+    for values in contexts:
+        with context.push(values):
+            yield template.render(context)
+
+
+# Build step: CSS inlining
+
+def _parse_compound(text):
+    match = SIMPLE_SELECTOR.match(text)
+    if not match or not text:
+        return None
+    tag, classes = match.groups()
+    return (tag.lower() if tag else None, frozenset(c for c in classes.split('.') if c))
+
+
+def parse_stylesheet(css):
+    """
+    Split a stylesheet into inlinable rules and leftover CSS.
+
+    Only tag, class and descendant selectors (``.box p``) are inlined.
+
+    Returns:
+        Tuple of (rules, leftover) where rules is a list of
+        (specificity, order, compounds, declarations)
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    rules = []
+    leftover = []
+    for selectors, body in re.findall(r'([^{}]+)\{([^{}]*)\}', css):
+        declarations = [
+            tuple(part.strip() for part in declaration.split(':', 1))
+            for declaration in body.split(';') if ':' in declaration
+        ]
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            compounds = [_parse_compound(part) for part in selector.split()]
+            if not compounds or None in compounds:
+                leftover.append(f'{selector} {{ {body.strip()} }}')
+                continue
+            specificity = (
+                sum(len(classes) for _, classes in compounds),
+                sum(1 for tag, _ in compounds if tag),
+            )
+            rules.append((specificity, len(rules), compounds, declarations))
+    rules.sort(key=lambda rule: rule[:2])
+    return rules, '\n'.join(leftover)
+
+
+def _matches(compound, element):
+    tag, classes = compound
+    return (tag is None or tag == element[0]) and classes <= element[1]
+
+
+def _selector_matches(compounds, element, ancestors):
+    if not _matches(compounds[-1], element):
+        return False
+    remaining = compounds[:-1]
+    for ancestor in reversed(ancestors):
+        if not remaining:
+            break
+        if _matches(remaining[-1], ancestor):
+            remaining = remaining[:-1]
+    return not remaining
+
+
+def _attribute(name, value):
+    if value is None:
+        return f' {name}'
+    value = escape(value, quote=False).replace('"', '&quot;')
+    return f' {name}="{value}"'
+
+
+class _Inliner(HTMLParser):
+    def __init__(self, rules, leftover):
+        super().__init__(convert_charrefs=False)
+        self.rules = rules
+        self.leftover = leftover
+        self.stack = []
+        self.out = []
+        self.in_style = False
+
+    def _start(self, tag, attrs, closing):
+        attrs = dict(attrs)
+        element = (tag, frozenset((attrs.get('class') or '').split()))
+        styles = {}
+        for _, _, compounds, declarations in self.rules:
+            if _selector_matches(compounds, element, self.stack):
+                styles.update(declarations)
+        if attrs.get('style'):
+            # Inline styles written in the source win over the stylesheet
+            styles.update(
+                tuple(part.strip() for part in declaration.split(':', 1))
+                for declaration in attrs['style'].split(';') if ':' in declaration
+            )
+        if styles:
+            attrs['style'] = '; '.join(f'{name}: {value}' for name, value in styles.items()) + ';'
+
+        rendered = ''.join(_attribute(name, value) for name, value in attrs.items())
+        self.out.append(f'<{tag}{rendered}{" /" if closing else ""}>')
+        if not closing and tag not in VOID_ELEMENTS:
+            self.stack.append(element)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, closing=False)
+        if tag == 'style':
+            self.in_style = True
+            self.out.append(self.leftover)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, closing=True)
+
+    def handle_endtag(self, tag):
+        if tag == 'style':
+            self.in_style = False
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                del self.stack[index:]
+                break
+        self.out.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        if not self.in_style:
+            self.out.append(data)
+
+    def handle_entityref(self, name):
+        self.out.append(f'&{name};')
+
+    def handle_charref(self, name):
+        self.out.append(f'&#{name};')
+
+    def handle_comment(self, data):
+        self.out.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self.out.append(f'<!{decl}>')
+
+
+def inline_css(html, css):
+    """
+    Return ``html`` with ``css`` moved into style attributes.
+
+    Template tags are left untouched as long as they are not used inside
+    an HTML tag (only in text and attribute values).
+    """
+    rules, leftover = parse_stylesheet(css)
+    inliner = _Inliner(rules, leftover)
+    inliner.feed(html)
+    inliner.close()
+    return ''.join(inliner.out)
+
+
+def build_email_templates():
+    """
+    Inline the stylesheet into every source template.
+
+    Returns:
+        Dict of output path -> generated content
+    """
+    css = STYLESHEET.read_text(encoding='utf-8')
+    return {
+        BUILD_DIR / source.name: BUILD_HEADER % source.name + inline_css(source.read_text(encoding='utf-8'), css)
+        for source in sorted(SOURCE_DIR.glob('*.html'))
+    }
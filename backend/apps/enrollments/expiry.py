@@ -0,0 +1,130 @@
+"""
+Expiry of abandoned enrollments.
+
+Enrollments left in PENDING_PAYMENT without any paid installment after
+ENROLLMENT_EXPIRY_HOURS are moved to EXPIRED, releasing their batch seat.
+Work is done in small keyset-paginated chunks, each in its own short
+transaction, so the sweep never holds locks on more than one chunk of rows.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Enrollment
+from .seats import update_status_releasing_seats
+
+logger = logging.getLogger(__name__)
+
+PAID_PAYMENT_STATUSES = ['CONFIRMED', 'RECEIVED']
+OPEN_PAYMENT_STATUSES = ['CREATED', 'PENDING', 'OVERDUE']
+
+
+def expirable_enrollments(now=None):
+    """
+    Enrollments eligible for expiry.
+
+    An enrollment expires when it was created before the expiry window, has
+    no paid payment, and no open charge is still within its due date.
+    """
+    from apps.payments.models import Payment
+
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.ENROLLMENT_EXPIRY_HOURS)
+    payments = Payment.objects.filter(enrollment=OuterRef('pk'))
+    return Enrollment.objects.filter(
+        status='PENDING_PAYMENT',
+        created_at__lt=cutoff,
+    ).exclude(
+        Exists(payments.filter(status__in=PAID_PAYMENT_STATUSES))
+    ).exclude(
+        Exists(payments.filter(status__in=OPEN_PAYMENT_STATUSES, due_date__gte=now.date()))
+    )
+
+
+def cancel_open_charge(payment_id):
+    """
+    Cancel one open charge in Asaas and locally.
+
+    Runs in a worker thread; the payment is re-read so charges paid in the
+    meantime are left alone.
+    """
+    from apps.payments.models import Payment
+    from apps.payments.services.asaas_service import AsaasService
+
+    try:
+        payment = Payment.objects.filter(pk=payment_id, status__in=OPEN_PAYMENT_STATUSES).first()
+        if payment is None:
+            return
+        if payment.asaas_payment_id:
+            AsaasService().cancel_payment(payment.asaas_payment_id)
+        payment.status = 'CANCELLED'
+        payment.save(update_fields=['status', 'updated_at'])
+    except Exception as e:
+        logger.error(f'Failed to cancel charge for payment {payment_id}: {e}')
+    finally:
+        close_old_connections()
+
+
+def expire_enrollments(chunk_size=None, pause=0, dry_run=False, cancel_workers=None, stdout=None):
+    """
+    Expire abandoned enrollments and cancel their open charges.
+
+    Args:
+        chunk_size: Enrollments per transaction
+        pause: Seconds to sleep between chunks (eases load during peak hours)
+        dry_run: Only count what would be expired
+        cancel_workers: Threads used to cancel Asaas charges in the background
+        stdout: Optional callable receiving progress messages
+
+    Returns:
+        Tuple of (expired enrollments, charges queued for cancellation)
+    """
+    from apps.payments.models import Payment
+
+    chunk_size = chunk_size or settings.ENROLLMENT_EXPIRY_CHUNK_SIZE
+    cancel_workers = cancel_workers or settings.ENROLLMENT_EXPIRY_CANCEL_WORKERS
+    candidates = expirable_enrollments()
+
+    if dry_run:
+        return candidates.count(), 0
+
+    expired_total = 0
+    charges_total = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=cancel_workers) as executor:
+        while True:
+            ids = list(
+                candidates.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            # Conditions are re-checked under lock, so an enrollment paid
+            # since the chunk was selected is skipped.
+            expired = update_status_releasing_seats(expirable_enrollments().filter(id__in=ids), 'EXPIRED')
+            expired_total += expired
+
+            charge_ids = list(
+                Payment.objects.filter(
+                    enrollment_id__in=ids,
+                    enrollment__status='EXPIRED',
+                    status__in=OPEN_PAYMENT_STATUSES,
+                ).values_list('id', flat=True)
+            )
+            for payment_id in charge_ids:
+                executor.submit(cancel_open_charge, payment_id)
+            charges_total += len(charge_ids)
+
+            if stdout:
+                stdout(f'Expired {expired} enrollment(s), cancelling {len(charge_ids)} charge(s)')
+            if pause:
+                time.sleep(pause)
+
+    return expired_total, charges_total
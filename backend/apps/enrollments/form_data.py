@@ -0,0 +1,60 @@
+"""
+Typed columns promoted from ``Enrollment.form_data``.
+
+The registration form stores its answers in a JSON document. The keys that
+are filtered, sorted, exported or sent to Asaas are also copied into typed,
+indexed columns on save so those paths never need to parse the JSON.
+"""
+from datetime import datetime
+
+from .search import only_digits
+
+# form_data key -> (Enrollment column, max_length or None for non-text columns)
+FORM_DATA_COLUMNS = {
+    'nome_completo': ('participant_name', 200),
+    'email': ('participant_email', 254),
+    'cpf': ('participant_cpf', 11),
+    'telefone': ('participant_phone', 20),
+    'data_nascimento': ('birth_date', None),
+    'tamanho_camiseta': ('shirt_size', 20),
+    'lider_pg': ('pg_leader', 200),
+    'igreja': ('church', 200),
+}
+
+FORM_DATA_COLUMN_NAMES = [column for column, _max_length in FORM_DATA_COLUMNS.values()]
+
+DIGIT_ONLY_KEYS = {'cpf', 'telefone'}
+
+
+def parse_birth_date(value):
+    """Parse an AAAA-MM-DD birth date; invalid or empty values become None."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def extract_form_data_columns(form_data):
+    """Return the promoted column values for a form_data document."""
+    form_data = form_data or {}
+    values = {}
+
+    for key, (column, max_length) in FORM_DATA_COLUMNS.items():
+        raw_value = form_data.get(key)
+
+        if key == 'data_nascimento':
+            values[column] = parse_birth_date(raw_value)
+            continue
+
+        if key in DIGIT_ONLY_KEYS:
+            value = only_digits(raw_value)
+        elif key == 'email':
+            value = str(raw_value or '').strip().lower()
+        else:
+            value = ' '.join(str(raw_value or '').split())
+
+        values[column] = value[:max_length]
+
+    return values
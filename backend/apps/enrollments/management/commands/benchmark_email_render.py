@@ -0,0 +1,68 @@
+"""
+Management command to benchmark email template rendering.
+
+Renders N personalized installment reminders three ways and reports
+renders per second:
+
+- parsed: template source parsed on every render (no template cache)
+- single: render_email() per message (cached compiled template)
+- batch: render_email_batch() (one compiled template and context)
+
+No database access; contexts are generated in memory.
+"""
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+
+from apps.enrollments.email_templates import TEMPLATES_DIR, get_email_template, render_email, render_email_batch
+
+TEMPLATE = 'installment_reminder'
+
+
+def _contexts(count):
+    due_date = date.today()
+    return [
+        {
+            'user_name': f'Participante {index}',
+            'product_name': 'Acampamento AreaMais',
+            'installment_number': index % 12 + 1,
+            'installments': 12,
+            'amount': Decimal('150.00') + index % 7,
+            'due_date': due_date + timedelta(days=index % 30),
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark email rendering (renders per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2000, help='Messages rendered per mode')
+
+    def handle(self, *args, **options):
+        contexts = _contexts(options['count'])
+        shared = {'frontend_url': 'https://areamais.com.br'}
+        get_email_template(TEMPLATE)  # warm the cache
+
+        uncached = Engine(dirs=[str(TEMPLATES_DIR)], loaders=['django.template.loaders.filesystem.Loader'])
+        modes = {
+            'parsed': lambda: [
+                uncached.get_template(f'emails/{TEMPLATE}.html').render(Context({**shared, **values}))
+                for values in contexts
+            ],
+            'single': lambda: [render_email(TEMPLATE, {**shared, **values}) for values in contexts],
+            'batch': lambda: list(render_email_batch(TEMPLATE, contexts, shared=shared)),
+        }
+
+        for mode, render in modes.items():
+            start = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {mode}: {len(contexts)} renders in {elapsed * 1000:.0f}ms '
+                f'({len(contexts) / elapsed:.0f} renders/s)'
+            ))
@@ -0,0 +1,114 @@
+"""
+Management command to benchmark the enrollment creation endpoint.
+
+Creates a throwaway product, batch, coupon and users, posts N enrollments
+through the API in-process and reports latency percentiles and queries per
+request. Everything runs inside a transaction that is rolled back at the
+end, so it is safe to run against a development database.
+"""
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.enrollments.models import Coupon
+from apps.products.models import Batch, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark POST /api/enrollments/ (p50/p99 latency and queries per request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of enrollments to create')
+        parser.add_argument('--warmup', type=int, default=10, help='Requests excluded from the results')
+        parser.add_argument('--coupon', action='store_true', help='Apply a coupon to every enrollment')
+
+    def handle(self, *args, **options):
+        total = options['requests'] + options['warmup']
+        try:
+            with transaction.atomic():
+                latencies, queries = self.run(total, options['coupon'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        latencies = latencies[options['warmup']:]
+        queries = queries[options['warmup']:]
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ requests={len(latencies)} "
+            f"p50={percentile(latencies, 50):.2f}ms "
+            f"p99={percentile(latencies, 99):.2f}ms "
+            f"mean={statistics.mean(latencies):.2f}ms "
+            f"queries/request={statistics.mean(queries):.1f}"
+        ))
+
+    def run(self, total, with_coupon):
+        User = get_user_model()
+        now = timezone.now()
+        product = Product.objects.create(
+            name='Benchmark',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        batch = Batch.objects.create(
+            product=product,
+            name='Lote Benchmark',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=1),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('110.00'),
+            credit_card_price=Decimal('120.00'),
+            max_enrollments=total + 1,
+            status='ACTIVE',
+        )
+        if with_coupon:
+            Coupon.objects.create(
+                code='BENCHMARK',
+                discount_type='PERCENTAGE',
+                discount_value=Decimal('10.00'),
+                valid_from=now - timedelta(days=1),
+                valid_until=now + timedelta(days=1),
+            )
+
+        client = APIClient(HTTP_HOST='localhost')
+        url = reverse('enrollments:enrollment-list')
+        latencies = []
+        queries = []
+        for index in range(total):
+            user = User.objects.create_user(email=f'benchmark{index}@example.com', password=None)
+            client.force_authenticate(user=user)
+            payload = {
+                'product_id': product.id,
+                'batch_id': batch.id,
+                'form_data': {'nome_completo': f'Participante {index}', 'email': user.email},
+            }
+            if with_coupon:
+                payload['coupon_code'] = 'benchmark'
+
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.post(url, payload, format='json')
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            if response.status_code != 201:
+                raise RuntimeError(f'Unexpected response {response.status_code}: {response.data}')
+
+        return latencies, queries
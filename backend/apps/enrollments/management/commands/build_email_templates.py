@@ -0,0 +1,35 @@
+"""
+Management command to build the email templates (CSS inlining).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.enrollments.email_templates import build_email_templates
+
+
+class Command(BaseCommand):
+    help = 'Inline styles.css into the email templates in templates/emails/src'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Exit with an error if the built templates are out of date',
+        )
+
+    def handle(self, *args, **options):
+        built = build_email_templates()
+        stale = [
+            path for path, content in built.items()
+            if not path.exists() or path.read_text(encoding='utf-8') != content
+        ]
+
+        if options['check']:
+            if stale:
+                names = ', '.join(path.name for path in stale)
+                raise CommandError(f'Email templates out of date ({names}); run build_email_templates')
+            self.stdout.write('Email templates are up to date')
+            return
+
+        for path in stale:
+            path.write_text(built[path], encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(stale)} email template(s) built'))
@@ -0,0 +1,65 @@
+"""
+Management command to expire abandoned enrollments.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.enrollments.expiry import expire_enrollments
+
+
+class Command(BaseCommand):
+    help = 'Expire unpaid enrollments older than ENROLLMENT_EXPIRY_HOURS and release their seats'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.ENROLLMENT_EXPIRY_CHUNK_SIZE,
+            help='Enrollments expired per transaction',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to wait between chunks (use during peak hours)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many enrollments would expire',
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and sweep every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='Seconds between sweeps with --watch',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired, charges = expire_enrollments(
+                chunk_size=options['chunk_size'],
+                pause=options['pause'],
+                dry_run=options['dry_run'],
+                stdout=self.stdout.write,
+            )
+
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(f'{expired} enrollment(s) would expire'))
+                return
+
+            if expired or not options['watch']:
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ {expired} enrollment(s) expired, {charges} charge(s) cancelled')
+                )
+            if not options['watch']:
+                return
+
+            time.sleep(max(options['interval'], 1))
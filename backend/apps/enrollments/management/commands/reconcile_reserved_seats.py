@@ -0,0 +1,16 @@
+"""
+Management command to recount batch seat counters from the enrollments.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.enrollments.seats import reconcile_reserved_seats
+
+
+class Command(BaseCommand):
+    help = 'Recount Batch.reserved_seats from enrollments that hold a seat'
+
+    def handle(self, *args, **options):
+        corrected = reconcile_reserved_seats()
+        for batch_id, (old, new) in corrected.items():
+            self.stdout.write(f'Batch {batch_id}: {old} -> {new} reserved seat(s)')
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(corrected)} batch(es) corrected'))
@@ -0,0 +1,42 @@
+"""
+Management command to deliver queued transactional emails.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.enrollments.outbox import send_due_emails
+
+
+class Command(BaseCommand):
+    help = 'Send due emails from the outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and send new emails as they are queued',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds between outbox checks with --watch',
+        )
+        parser.add_argument('--workers', type=int, help='Threads sending in parallel')
+        parser.add_argument('--batch-size', type=int, help='Emails claimed per round')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_due_emails(
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+            )
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f'✓ {sent} email(s) sent, {failed} failed'))
+            elif not options['watch']:
+                self.stdout.write('No emails to send')
+
+            if not options['watch']:
+                return
+            time.sleep(max(options['interval'], 1))
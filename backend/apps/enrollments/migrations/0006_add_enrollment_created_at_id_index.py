@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0005_add_settings_model'),
+        ('products', '0003_merge_20251113_0111'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['created_at', 'id'], name='enrollments_created_247333_idx'),
+        ),
+    ]
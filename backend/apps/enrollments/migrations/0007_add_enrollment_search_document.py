@@ -0,0 +1,93 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:03
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+# Frozen copy of apps.enrollments.search at the time of this migration, so
+# later changes to the live helpers do not change what this backfill does.
+def normalize_search_text(value):
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.lower().split())
+
+
+def build_search_document(form_data, first_name='', last_name='', email=''):
+    form_data = form_data or {}
+    parts = [
+        first_name,
+        last_name,
+        email,
+        form_data.get('nome_completo'),
+        form_data.get('email'),
+    ]
+    document = ' '.join(normalize_search_text(part) for part in parts if part)
+
+    cpf = re.sub(r'\D', '', str(form_data.get('cpf') or ''))
+    if cpf:
+        document = f'{document} {cpf}'
+
+    return document.strip()
+
+
+def backfill_search_document(apps, schema_editor):
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    queryset = Enrollment.objects.select_related('user').only(
+        'id', 'form_data', 'user__first_name', 'user__last_name', 'user__email'
+    ).order_by('id')
+
+    batch = []
+    for enrollment in queryset.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        enrollment.search_document = build_search_document(
+            enrollment.form_data,
+            first_name=enrollment.user.first_name,
+            last_name=enrollment.user.last_name,
+            email=enrollment.user.email,
+        )
+        batch.append(enrollment)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Enrollment.objects.bulk_update(batch, ['search_document'])
+            batch = []
+
+    if batch:
+        Enrollment.objects.bulk_update(batch, ['search_document'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS enrollments_search_document_trgm '
+        'ON enrollments_enrollment USING gin (search_document gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS enrollments_search_document_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0006_add_enrollment_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Nome, email e CPF normalizados para a busca do admin', verbose_name='Texto de Busca'),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:04
+
+import re
+from datetime import datetime
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Frozen copy of apps.enrollments.form_data at the time of this migration, so
+# later changes to the live helpers do not change what this backfill does.
+FORM_DATA_COLUMNS = {
+    'nome_completo': ('participant_name', 200),
+    'email': ('participant_email', 254),
+    'cpf': ('participant_cpf', 11),
+    'telefone': ('participant_phone', 20),
+    'data_nascimento': ('birth_date', None),
+    'tamanho_camiseta': ('shirt_size', 20),
+    'lider_pg': ('pg_leader', 200),
+    'igreja': ('church', 200),
+}
+
+FORM_DATA_COLUMN_NAMES = [column for column, _max_length in FORM_DATA_COLUMNS.values()]
+
+
+def parse_birth_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def extract_form_data_columns(form_data):
+    form_data = form_data or {}
+    values = {}
+
+    for key, (column, max_length) in FORM_DATA_COLUMNS.items():
+        raw_value = form_data.get(key)
+
+        if key == 'data_nascimento':
+            values[column] = parse_birth_date(raw_value)
+            continue
+
+        if key in ('cpf', 'telefone'):
+            value = re.sub(r'\D', '', str(raw_value or ''))
+        elif key == 'email':
+            value = str(raw_value or '').strip().lower()
+        else:
+            value = ' '.join(str(raw_value or '').split())
+
+        values[column] = value[:max_length]
+
+    return values
+
+
+def backfill_form_data_columns(apps, schema_editor):
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    queryset = Enrollment.objects.only('id', 'form_data').order_by('id')
+
+    batch = []
+    for enrollment in queryset.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        for column, value in extract_form_data_columns(enrollment.form_data).items():
+            setattr(enrollment, column, value)
+        batch.append(enrollment)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Enrollment.objects.bulk_update(batch, FORM_DATA_COLUMN_NAMES)
+            batch = []
+
+    if batch:
+        Enrollment.objects.bulk_update(batch, FORM_DATA_COLUMN_NAMES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0007_add_enrollment_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='birth_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='Data de Nascimento'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='church',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=200, verbose_name='Igreja'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='participant_cpf',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Somente dígitos', max_length=11, verbose_name='CPF'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='participant_email',
+            field=models.EmailField(blank=True, db_index=True, default='', editable=False, max_length=254, verbose_name='Email do Participante'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='participant_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200, verbose_name='Nome Completo'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='participant_phone',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Somente dígitos', max_length=20, verbose_name='Telefone'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='pg_leader',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=200, verbose_name='Líder PG'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='shirt_size',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20, verbose_name='Camiseta'),
+        ),
+        migrations.RunPython(backfill_form_data_columns, migrations.RunPython.noop),
+    ]
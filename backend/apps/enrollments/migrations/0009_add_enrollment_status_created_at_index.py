@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0008_promote_form_data_columns'),
+        ('products', '0004_add_batch_reserved_seats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['status', 'created_at'], name='enrollments_status_5cfaa1_idx'),
+        ),
+    ]
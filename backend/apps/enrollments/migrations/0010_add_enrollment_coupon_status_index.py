@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0009_add_enrollment_status_created_at_index'),
+        ('products', '0005_add_batch_product_status_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['coupon', 'status'], name='enrollments_coupon__1564ac_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat
+
+
+def cancel_duplicate_active_enrollments(apps, schema_editor):
+    """
+    Keep one active enrollment per user/product so the constraint can be added.
+
+    The paid enrollment (or else the oldest) is kept; extra unpaid ones are
+    cancelled and their seats released. Duplicate *paid* enrollments need a
+    human decision, so the migration stops and lists them instead.
+    """
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    Batch = apps.get_model('products', 'Batch')
+    active = Enrollment.objects.filter(status__in=['PENDING_PAYMENT', 'PAID'])
+    duplicates = active.values('user_id', 'product_id').annotate(total=Count('id')).filter(total__gt=1)
+
+    paid_conflicts = []
+    for row in duplicates:
+        enrollments = list(
+            active.filter(user_id=row['user_id'], product_id=row['product_id'])
+            .order_by('created_at', 'id')
+            .values('id', 'status', 'batch_id')
+        )
+        paid = [e for e in enrollments if e['status'] == 'PAID']
+        if len(paid) > 1:
+            paid_conflicts.extend(e['id'] for e in paid)
+            continue
+        keep = paid[0] if paid else enrollments[0]
+        for enrollment in enrollments:
+            if enrollment['id'] == keep['id']:
+                continue
+            Enrollment.objects.filter(pk=enrollment['id']).update(
+                status='CANCELLED',
+                admin_notes=Concat(F('admin_notes'), Value('\nCancelada automaticamente: inscrição duplicada.')),
+            )
+            Batch.objects.filter(pk=enrollment['batch_id'], reserved_seats__gt=0).update(
+                reserved_seats=F('reserved_seats') - 1
+            )
+
+    if paid_conflicts:
+        raise RuntimeError(
+            'Inscrições pagas duplicadas para o mesmo usuário/produto; '
+            f'resolva manualmente antes de migrar: {sorted(paid_conflicts)}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0010_add_enrollment_coupon_status_index'),
+        ('products', '0005_add_batch_product_status_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_active_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING_PAYMENT', 'PAID'])), fields=('user', 'product'), name='unique_active_enrollment_per_user_product'),
+        ),
+    ]
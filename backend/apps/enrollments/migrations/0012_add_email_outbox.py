@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0011_add_unique_active_enrollment_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('template', models.CharField(choices=[('enrollment_confirmation', 'Confirmação de inscrição'), ('payment_confirmation', 'Confirmação de pagamento'), ('installment_reminder', 'Lembrete de parcela'), ('password_reset', 'Recuperação de senha')], max_length=50, verbose_name='Modelo')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='Destinatário')),
+                ('object_key', models.CharField(help_text='Identifica o objeto do email (ex: enrollment:42); evita envios duplicados', max_length=100, verbose_name='Objeto')),
+                ('context', models.JSONField(blank=True, default=dict, verbose_name='Contexto')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('SENDING', 'Enviando'), ('SENT', 'Enviado'), ('FAILED', 'Falhou')], default='PENDING', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima tentativa')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último erro')),
+                ('provider_message_id', models.CharField(blank=True, max_length=100, verbose_name='ID no provedor')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviado em')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Email na Fila',
+                'verbose_name_plural': 'Fila de Emails',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='enrollments_status_256409_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emailoutbox',
+            constraint=models.UniqueConstraint(fields=('template', 'recipient', 'object_key'), name='unique_email_outbox_message'),
+        ),
+    ]
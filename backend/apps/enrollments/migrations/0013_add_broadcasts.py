@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:48
+
+import apps.enrollments.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0012_add_email_outbox'),
+        ('products', '0005_add_batch_product_status_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='Assunto')),
+                ('body', models.TextField(help_text='Texto simples; deixe uma linha em branco entre parágrafos. O email começa com "Olá, <nome do participante>!"', verbose_name='Mensagem')),
+                ('enrollment_statuses', models.JSONField(default=apps.enrollments.models.default_broadcast_statuses, verbose_name='Status das inscrições')),
+                ('payment_method', models.CharField(blank=True, choices=[('PIX_CASH', 'PIX à Vista'), ('PIX_INSTALLMENT', 'PIX Parcelado'), ('CREDIT_CARD', 'Cartão de Crédito')], help_text='Deixe em branco para todas', max_length=20, verbose_name='Forma de pagamento')),
+                ('status', models.CharField(choices=[('DRAFT', 'Rascunho'), ('QUEUED', 'Enviado para a fila')], default='DRAFT', max_length=20, verbose_name='Status')),
+                ('recipients_count', models.PositiveIntegerField(default=0, verbose_name='Destinatários')),
+                ('queued_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviado em')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Comunicado',
+                'verbose_name_plural': 'Comunicados',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='template',
+            field=models.CharField(choices=[('enrollment_confirmation', 'Confirmação de inscrição'), ('payment_confirmation', 'Confirmação de pagamento'), ('installment_reminder', 'Lembrete de parcela'), ('password_reset', 'Recuperação de senha'), ('broadcast', 'Comunicado')], max_length=50, verbose_name='Modelo'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['template', 'object_key'], name='enrollments_templat_10291b_idx'),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Deixe em branco para todos os lotes do evento', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='broadcasts', to='products.batch', verbose_name='Lote'),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Criado por'),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='broadcasts', to='products.product', verbose_name='Evento'),
+        ),
+    ]
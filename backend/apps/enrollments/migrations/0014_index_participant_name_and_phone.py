@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0013_add_broadcasts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollment',
+            name='participant_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=200, verbose_name='Nome Completo'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='participant_phone',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Somente dígitos', max_length=20, verbose_name='Telefone'),
+        ),
+    ]
@@ -2,12 +2,15 @@
 Enrollment models with clean architecture.
 """
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from .form_data import FORM_DATA_COLUMN_NAMES, extract_form_data_columns
+from .search import build_search_document
+
 
 class Enrollment(models.Model):
     """
@@ -20,6 +23,9 @@ class Enrollment(models.Model):
         ('EXPIRED', _('Expirado')),
     ]
     
+    # Statuses that hold a seat in the batch (see Batch.reserved_seats)
+    SEAT_HOLDING_STATUSES = ['PENDING_PAYMENT', 'PAID']
+    
     PAYMENT_METHOD_CHOICES = [
         ('PIX_CASH', _('PIX à Vista')),
         ('PIX_INSTALLMENT', _('PIX Parcelado')),
@@ -120,6 +126,87 @@ class Enrollment(models.Model):
         help_text=_('Notas internas visíveis apenas para administradores')
     )
     
+    # Columns promoted from form_data (kept in sync on save)
+    participant_name = models.CharField(
+        _('Nome Completo'),
+        max_length=200,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False
+    )
+    
+    participant_email = models.EmailField(
+        _('Email do Participante'),
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False
+    )
+    
+    participant_cpf = models.CharField(
+        _('CPF'),
+        max_length=11,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text=_('Somente dígitos')
+    )
+    
+    participant_phone = models.CharField(
+        _('Telefone'),
+        max_length=20,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text=_('Somente dígitos')
+    )
+    
+    birth_date = models.DateField(
+        _('Data de Nascimento'),
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
+    
+    shirt_size = models.CharField(
+        _('Camiseta'),
+        max_length=20,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False
+    )
+    
+    pg_leader = models.CharField(
+        _('Líder PG'),
+        max_length=200,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False
+    )
+    
+    church = models.CharField(
+        _('Igreja'),
+        max_length=200,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False
+    )
+    
+    search_document = models.TextField(
+        _('Texto de Busca'),
+        blank=True,
+        default='',
+        editable=False,
+        help_text=_('Nome, email e CPF normalizados para a busca do admin')
+    )
+    
     created_at = models.DateTimeField(_('Criado em'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Atualizado em'), auto_now=True)
     paid_at = models.DateTimeField(_('Pago em'), null=True, blank=True)
@@ -131,6 +218,18 @@ class Enrollment(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['batch', 'status']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['coupon', 'status']),
+        ]
+        constraints = [
+            # One active enrollment per person and product; enforced here
+            # instead of a racy pre-check when enrolling.
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                condition=models.Q(status__in=['PENDING_PAYMENT', 'PAID']),
+                name='unique_active_enrollment_per_user_product',
+            ),
         ]
     
     def __str__(self):
@@ -148,36 +247,111 @@ class Enrollment(models.Model):
         """Check if enrollment is paid."""
         return self.status == 'PAID'
     
-    def calculate_amounts(self):
-        """Calculate total, discount and final amounts based on batch, payment method and coupon."""
+    def quote_amounts(self, payment_method):
+        """
+        Return (total, coupon discount, final) for a payment method.
+        
+        Does not change the enrollment; calculate_amounts() stores the
+        result for the enrollment's own payment method.
+        """
         # Determine base price based on payment method
-        if self.payment_method == 'PIX_CASH':
-            self.total_amount = self.batch.price  # PIX à vista
-        elif self.payment_method == 'PIX_INSTALLMENT':
-            self.total_amount = self.batch.pix_installment_price  # PIX parcelado
-        elif self.payment_method == 'CREDIT_CARD':
-            self.total_amount = self.batch.credit_card_price  # Cartão de crédito
+        if payment_method == 'PIX_CASH':
+            total_amount = self.batch.price  # PIX à vista
+        elif payment_method == 'PIX_INSTALLMENT':
+            total_amount = self.batch.pix_installment_price  # PIX parcelado
+        elif payment_method == 'CREDIT_CARD':
+            total_amount = self.batch.credit_card_price  # Cartão de crédito
         else:
             # Fallback to PIX cash price
-            self.total_amount = self.batch.price
+            total_amount = self.batch.price
         
         # Apply coupon discount if exists
         if self.coupon:
-            coupon_discount_value = self.coupon.calculate_discount(self.total_amount)
-            self.coupon_discount = Decimal(str(coupon_discount_value))
-            self.discount_amount = self.coupon_discount
+            coupon_discount = Decimal(str(self.coupon.calculate_discount(total_amount)))
         else:
-            self.coupon_discount = Decimal('0.00')
-            self.discount_amount = Decimal('0.00')
+            coupon_discount = Decimal('0.00')
         
-        # Final amount
-        self.final_amount = self.total_amount - self.discount_amount
+        return total_amount, coupon_discount, total_amount - coupon_discount
+    
+    def calculate_amounts(self):
+        """Calculate total, discount and final amounts based on batch, payment method and coupon."""
+        self.total_amount, self.coupon_discount, self.final_amount = self.quote_amounts(self.payment_method)
+        self.discount_amount = self.coupon_discount
+    
+    def get_max_installments(self):
+        """Max installments allowed: the coupon's special limit or the global default."""
+        if self.coupon and self.coupon.enable_12x_installments:
+            return self.coupon.max_installments
+        return Settings.get_settings().max_installments
+    
+    def refresh_search_document(self):
+        """Rebuild the normalized text used by the admin search."""
+        user = self.user
+        self.search_document = build_search_document(
+            self.form_data,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+        )
+    
+    def sync_form_data_columns(self):
+        """Copy the promoted form_data keys into their typed columns."""
+        for column, value in extract_form_data_columns(self.form_data).items():
+            setattr(self, column, value)
     
     def save(self, *args, **kwargs):
-        """Auto-calculate amounts before saving."""
+        """Auto-calculate amounts and sync derived columns before saving."""
         if self.batch and self.total_amount is None:
             self.calculate_amounts()
-        super().save(*args, **kwargs)
+        
+        update_fields = kwargs.get('update_fields')
+        derived_fields = set()
+        if update_fields is None or 'form_data' in update_fields:
+            self.sync_form_data_columns()
+            derived_fields.update(FORM_DATA_COLUMN_NAMES)
+        if update_fields is None or 'form_data' in update_fields or 'user' in update_fields:
+            self.refresh_search_document()
+            derived_fields.add('search_document')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | derived_fields
+        
+        # No savepoint: a failure here aborts the caller's transaction anyway
+        with transaction.atomic(savepoint=False):
+            if update_fields is None or {'status', 'batch', 'batch_id'} & set(update_fields):
+                self.sync_reserved_seat()
+            super().save(*args, **kwargs)
+    
+    def sync_reserved_seat(self):
+        """
+        Keep Batch.reserved_seats in step with this enrollment's status.
+        
+        A new enrollment takes a seat with Batch.reserve_seat, raising
+        BatchFullError when none is left. Status or batch changes of an
+        existing enrollment release/take seats based on the row as stored,
+        locked so concurrent cancellations cannot release a seat twice.
+        Must run inside the transaction that saves the enrollment.
+        """
+        from apps.products.models import Batch, BatchFullError
+        
+        holds_seat = self.status in self.SEAT_HOLDING_STATUSES
+        if self._state.adding or self.pk is None:
+            if holds_seat and not Batch.reserve_seat(self.batch_id):
+                raise BatchFullError(self.batch_id)
+            return
+        
+        stored = Enrollment.objects.select_for_update().filter(pk=self.pk).values_list(
+            'batch_id', 'status'
+        ).first()
+        if stored is None:
+            return
+        stored_batch_id, stored_status = stored
+        held_seat = stored_status in self.SEAT_HOLDING_STATUSES
+        if held_seat and holds_seat and stored_batch_id == self.batch_id:
+            return
+        if held_seat:
+            Batch.adjust_reserved_seats(stored_batch_id, -1)
+        if holds_seat:
+            Batch.adjust_reserved_seats(self.batch_id, 1)
 
 
 class Coupon(models.Model):
@@ -322,9 +496,16 @@ class Coupon(models.Model):
     
     def can_apply_to_product(self, product):
         """Check if coupon can be applied to a specific product."""
+        return self.can_apply_to_product_id(product.id)
+    
+    def can_apply_to_product_id(self, product_id):
+        """Check a product restriction by id (answered from the cache when loaded from it)."""
+        product_ids = getattr(self, 'cached_product_ids', None)
+        if product_ids is not None:
+            return not product_ids or product_id in product_ids
         if not self.products.exists():
             return True
-        return self.products.filter(id=product.id).exists()
+        return self.products.filter(id=product_id).exists()
     
     def calculate_discount(self, original_amount):
         """Calculate discount amount for given original amount."""
@@ -342,10 +523,40 @@ class Coupon(models.Model):
         
         return float(discount)
     
-    def increment_uses(self):
-        """Increment usage counter."""
-        self.uses_count += 1
-        self.save(update_fields=['uses_count'])
+    def redeem(self):
+        """
+        Count one use with a single conditional UPDATE.
+        
+        Call inside the transaction that creates/updates the enrollment, so
+        a failed enrollment gives the use back. Concurrent redemptions can
+        never push uses_count past max_uses.
+        
+        Returns:
+            True if the use was counted, False if the coupon is used up
+        """
+        redeemed = Coupon.objects.filter(pk=self.pk).filter(
+            models.Q(max_uses__isnull=True) | models.Q(uses_count__lt=models.F('max_uses'))
+        ).update(uses_count=models.F('uses_count') + 1)
+        if redeemed and not self.max_uses:
+            self.uses_count += 1
+        elif redeemed:
+            self.refresh_from_db(fields=['uses_count'])
+            if self.uses_count >= self.max_uses:
+                # This code's cached definition must start reporting
+                # "Cupom esgotado"; other coupons stay cached.
+                from .coupon_cache import invalidate_coupon
+                transaction.on_commit(lambda: invalidate_coupon(self.code))
+        return bool(redeemed)
+    
+    def save(self, *args, **kwargs):
+        # uses_count is only changed by redeem(); never write back a
+        # possibly stale in-memory value (e.g. from the admin form).
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'uses_count'
+            ]
+        super().save(*args, **kwargs)
 
 
 class Settings(models.Model):
@@ -377,6 +588,144 @@ class Settings(models.Model):
     
     @classmethod
     def get_settings(cls):
-        """Get or create the singleton settings object."""
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
+        """
+        Get or create the singleton settings object.
+
+        Served from cache (see settings_cache); treat the result as read-only
+        and use Settings.objects.get(pk=1) when it has to be changed.
+        """
+        from .settings_cache import get_cached_settings
+        return get_cached_settings()
+
+
+class EmailOutbox(models.Model):
+    """
+    Transactional email waiting to be (or already) delivered.
+    
+    Rows are written in the same transaction as the change that triggers
+    the email and delivered by the send_emails worker (see outbox.py).
+    """
+    TEMPLATE_CHOICES = [
+        ('enrollment_confirmation', 'Confirmação de inscrição'),
+        ('payment_confirmation', 'Confirmação de pagamento'),
+        ('installment_reminder', 'Lembrete de parcela'),
+        ('password_reset', 'Recuperação de senha'),
+        ('broadcast', 'Comunicado'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendente'),
+        ('SENDING', 'Enviando'),
+        ('SENT', 'Enviado'),
+        ('FAILED', 'Falhou'),
+    ]
+    
+    template = models.CharField('Modelo', max_length=50, choices=TEMPLATE_CHOICES)
+    recipient = models.EmailField('Destinatário')
+    object_key = models.CharField(
+        'Objeto',
+        max_length=100,
+        help_text='Identifica o objeto do email (ex: enrollment:42); evita envios duplicados'
+    )
+    context = models.JSONField('Contexto', default=dict, blank=True)
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField('Tentativas', default=0)
+    next_attempt_at = models.DateTimeField('Próxima tentativa', default=timezone.now)
+    last_error = models.TextField('Último erro', blank=True)
+    provider_message_id = models.CharField('ID no provedor', max_length=100, blank=True)
+    sent_at = models.DateTimeField('Enviado em', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Email na Fila'
+        verbose_name_plural = 'Fila de Emails'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['template', 'object_key']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['template', 'recipient', 'object_key'],
+                name='unique_email_outbox_message',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.get_template_display()} → {self.recipient}'
+
+
+
+def default_broadcast_statuses():
+    return ['PAID']
+
+
+class Broadcast(models.Model):
+    """
+    Email sent to every participant of a product (optionally a batch)
+    whose enrollment matches the filters; see broadcasts.py.
+    """
+    STATUS_CHOICES = [
+        ('DRAFT', 'Rascunho'),
+        ('QUEUED', 'Enviado para a fila'),
+    ]
+    
+    subject = models.CharField('Assunto', max_length=200)
+    body = models.TextField(
+        'Mensagem',
+        help_text='Texto simples; deixe uma linha em branco entre parágrafos. '
+                  'O email começa com "Olá, <nome do participante>!"'
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.PROTECT,
+        related_name='broadcasts',
+        verbose_name='Evento'
+    )
+    batch = models.ForeignKey(
+        'products.Batch',
+        on_delete=models.PROTECT,
+        related_name='broadcasts',
+        null=True,
+        blank=True,
+        verbose_name='Lote',
+        help_text='Deixe em branco para todos os lotes do evento'
+    )
+    enrollment_statuses = models.JSONField(
+        'Status das inscrições',
+        default=default_broadcast_statuses
+    )
+    payment_method = models.CharField(
+        'Forma de pagamento',
+        max_length=20,
+        choices=Enrollment.PAYMENT_METHOD_CHOICES,
+        blank=True,
+        help_text='Deixe em branco para todas'
+    )
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='DRAFT')
+    recipients_count = models.PositiveIntegerField('Destinatários', default=0)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Criado por'
+    )
+    queued_at = models.DateTimeField('Enviado em', null=True, blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Comunicado'
+        verbose_name_plural = 'Comunicados'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f'{self.subject} ({self.product})'
+    
+    @property
+    def outbox_key(self):
+        """EmailOutbox.object_key shared by every email of this broadcast."""
+        return f'broadcast:{self.pk}'
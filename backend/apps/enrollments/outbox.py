@@ -0,0 +1,369 @@
+"""
+Transactional email outbox.
+
+Code that triggers an email only inserts an EmailOutbox row, in the same
+transaction as the change itself, so requests never wait on Resend and an
+email is queued if and only if the change commits. The row holds the
+template name and the ids needed to build the message; duplicates per
+(template, recipient, object) are dropped by a unique constraint.
+
+``python manage.py send_emails --watch`` drains the outbox: due rows are
+claimed in batches (SKIP LOCKED on PostgreSQL, so several workers can run),
+built and sent from a thread pool, then marked SENT or rescheduled with
+exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS is reached (FAILED).
+Requests rejected by the provider's rate limit are retried shortly without
+counting as an attempt.
+Bulk templates (BATCH_BUILDERS: installment reminders, broadcasts) are
+rendered together and sent through the provider's batch API, up to
+email_service.BATCH_LIMIT messages per request.
+A claim is a lease: rows left in SENDING by a crashed worker are picked up
+again once it expires.
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import email_service
+from .models import Broadcast, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Context holding secrets (reset links) is dropped once the email is sent
+SENSITIVE_TEMPLATES = {'password_reset'}
+
+# Seconds before retrying emails rejected by the provider's rate limit
+RATE_LIMITED_RETRY_DELAY = 5
+
+
+def _enrollment(entry):
+    from .models import Enrollment
+
+    return Enrollment.objects.select_related('user', 'product', 'batch').get(pk=entry.context['enrollment_id'])
+
+
+def _build_enrollment_confirmation(entry):
+    return email_service.build_enrollment_confirmation_email(_enrollment(entry))
+
+
+def _build_payment_confirmation(entry):
+    return email_service.build_payment_confirmation_email(_enrollment(entry))
+
+
+def _build_installment_reminder(entry):
+    from apps.payments.models import Payment
+
+    payment = Payment.objects.select_related(
+        'enrollment__user', 'enrollment__product', 'enrollment__batch'
+    ).get(pk=entry.context['payment_id'])
+    return email_service.build_installment_reminder_email(payment.enrollment, payment)
+
+
+def _build_installment_reminders(entries):
+    """Build reminders for many entries with one query and one batch render."""
+    from apps.payments.models import Payment
+
+    payments = Payment.objects.select_related(
+        'enrollment__user', 'enrollment__product'
+    ).in_bulk([entry.context['payment_id'] for entry in entries])
+    found = [entry for entry in entries if entry.context['payment_id'] in payments]
+    messages = email_service.build_installment_reminder_emails(
+        payments[entry.context['payment_id']] for entry in found
+    )
+    return {entry.pk: message for entry, message in zip(found, messages)}
+
+
+def _build_broadcasts(entries):
+    """Build broadcast emails, one batch render per broadcast."""
+    broadcasts = Broadcast.objects.select_related('product').in_bulk(
+        {entry.context['broadcast_id'] for entry in entries}
+    )
+    messages = {}
+    for broadcast_id, broadcast in broadcasts.items():
+        group = [entry for entry in entries if entry.context['broadcast_id'] == broadcast_id]
+        built = email_service.build_broadcast_emails(
+            broadcast,
+            [(entry.recipient, entry.context.get('name', '')) for entry in group],
+        )
+        messages.update((entry.pk, message) for entry, message in zip(group, built))
+    return messages
+
+
+def _build_password_reset(entry):
+    user = get_user_model().objects.get(pk=entry.context['user_id'])
+    return email_service.build_password_reset_email(user, entry.context['reset_link'])
+
+
+BUILDERS = {
+    'enrollment_confirmation': _build_enrollment_confirmation,
+    'payment_confirmation': _build_payment_confirmation,
+    'installment_reminder': _build_installment_reminder,
+    'password_reset': _build_password_reset,
+}
+
+# Templates sent in bulk: entries -> {entry id: message}
+BATCH_BUILDERS = {
+    'installment_reminder': _build_installment_reminders,
+    'broadcast': _build_broadcasts,
+}
+
+
+def queue_email(template, recipient, object_key, context):
+    """
+    Add an email to the outbox; does nothing if the same (template,
+    recipient, object) is already there.
+
+    Call inside the transaction that makes the triggering change.
+    """
+    queue_emails(template, [(recipient, object_key, context)])
+
+
+def queue_emails(template, messages):
+    """
+    Add many emails with the same template to the outbox in one INSERT.
+
+    Args:
+        template: Email template name
+        messages: Iterable of (recipient, object_key, context)
+    """
+    EmailOutbox.objects.bulk_create(
+        [
+            EmailOutbox(template=template, recipient=recipient, object_key=object_key, context=context)
+            for recipient, object_key, context in messages
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def queue_enrollment_email(template, enrollment):
+    """Queue an enrollment email (confirmation, payment) for its participant."""
+    queue_email(
+        template,
+        enrollment.participant_email or enrollment.user.email,
+        f'enrollment:{enrollment.pk}',
+        {'enrollment_id': enrollment.pk},
+    )
+
+
+def claim_due_emails(limit, now=None, template=None):
+    """
+    Lease up to ``limit`` due emails to this worker.
+
+    Args:
+        limit: Maximum number of emails to claim
+        now: Current time (defaults to timezone.now())
+        template: Only claim emails with this template
+
+    Returns:
+        List of claimed (id, template) tuples
+    """
+    now = now or timezone.now()
+    lease_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+    due = EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+        status__in=['PENDING', 'SENDING'],
+        next_attempt_at__lte=now,
+    )
+    if template:
+        due = due.filter(template=template)
+    with transaction.atomic():
+        claimed = list(due.order_by('next_attempt_at').values_list('id', 'template')[:limit])
+        EmailOutbox.objects.filter(id__in=[entry_id for entry_id, _ in claimed]).update(
+            status='SENDING',
+            attempts=F('attempts') + 1,
+            next_attempt_at=lease_until,
+            updated_at=now,
+        )
+    return claimed
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt (exponential, capped)."""
+    return min(
+        settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0),
+        settings.EMAIL_OUTBOX_MAX_RETRY_DELAY,
+    )
+
+
+def deliver_email(entry_id):
+    """
+    Build and send one claimed email, recording the outcome.
+
+    Returns:
+        True if the email was sent
+    """
+    entry = EmailOutbox.objects.filter(pk=entry_id, status='SENDING').first()
+    if entry is None:
+        return False
+
+    try:
+        message = BUILDERS[entry.template](entry)
+        message['to'] = [entry.recipient]
+        message_id = email_service.deliver(message)
+    except Exception as e:
+        _record_failure([entry], e)
+        logger.error(f'Email {entry.pk} ({entry.template} → {entry.recipient}) failed, attempt {entry.attempts}: {e}')
+        return False
+
+    now = timezone.now()
+    fields = {
+        'status': 'SENT',
+        'sent_at': now,
+        'provider_message_id': message_id or '',
+        'last_error': '',
+        'updated_at': now,
+    }
+    if entry.template in SENSITIVE_TEMPLATES:
+        fields['context'] = {}
+    EmailOutbox.objects.filter(pk=entry.pk).update(**fields)
+    return True
+
+
+def _record_failure(entries, error):
+    """Reschedule failed entries with backoff, or mark them FAILED."""
+    now = timezone.now()
+    if isinstance(error, email_service.ProviderRateLimited):
+        # Nothing wrong with the emails: give the attempt back
+        EmailOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            status='PENDING',
+            attempts=F('attempts') - 1,
+            next_attempt_at=now + timedelta(seconds=RATE_LIMITED_RETRY_DELAY),
+            last_error=str(error)[:1000],
+            updated_at=now,
+        )
+        return
+    for attempts in {entry.attempts for entry in entries}:
+        EmailOutbox.objects.filter(pk__in=[entry.pk for entry in entries if entry.attempts == attempts]).update(
+            status='FAILED' if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS else 'PENDING',
+            next_attempt_at=now + timedelta(seconds=retry_delay(attempts)),
+            last_error=str(error)[:1000],
+            updated_at=now,
+        )
+
+
+def deliver_email_batch(entry_ids):
+    """
+    Build and send claimed emails of one BATCH_BUILDERS template with a
+    single provider request (at most email_service.BATCH_LIMIT).
+
+    Returns:
+        Tuple of (sent, failed) counts
+    """
+    entries = list(EmailOutbox.objects.filter(pk__in=entry_ids, status='SENDING').order_by('pk'))
+    if not entries:
+        return 0, 0
+    template = entries[0].template
+
+    try:
+        messages = BATCH_BUILDERS[template](entries)
+    except Exception as e:
+        _record_failure(entries, e)
+        logger.error(f'{len(entries)} {template} email(s) could not be built: {e}')
+        return 0, len(entries)
+
+    missing = [entry for entry in entries if entry.pk not in messages]
+    if missing:
+        _record_failure(missing, 'Objeto do email não encontrado')
+    ready = [entry for entry in entries if entry.pk in messages]
+    if not ready:
+        return 0, len(missing)
+
+    for entry in ready:
+        messages[entry.pk]['to'] = [entry.recipient]
+    try:
+        message_ids = email_service.deliver_batch([messages[entry.pk] for entry in ready])
+    except Exception as e:
+        _record_failure(ready, e)
+        logger.error(f'Batch of {len(ready)} {template} email(s) failed: {e}')
+        return 0, len(entries)
+
+    now = timezone.now()
+    for entry, message_id in zip(ready, message_ids):
+        entry.status = 'SENT'
+        entry.sent_at = now
+        entry.provider_message_id = message_id or ''
+        entry.last_error = ''
+        entry.updated_at = now
+    EmailOutbox.objects.bulk_update(
+        ready, ['status', 'sent_at', 'provider_message_id', 'last_error', 'updated_at']
+    )
+    return len(ready), len(missing)
+
+
+def _deliver(task):
+    batch, entry_ids = task
+    if batch:
+        return deliver_email_batch(entry_ids)
+    sent = deliver_email(entry_ids[0])
+    return int(sent), int(not sent)
+
+
+def _deliver_in_thread(task):
+    try:
+        return _deliver(task)
+    except Exception as e:
+        logger.error(f'Emails {task[1]} could not be processed: {e}')
+        return 0, len(task[1])
+    finally:
+        close_old_connections()
+
+
+def _delivery_tasks(claimed):
+    """Split claimed emails into single sends and provider-sized batches."""
+    tasks = []
+    batched = defaultdict(list)
+    for entry_id, template in claimed:
+        if template in BATCH_BUILDERS:
+            batched[template].append(entry_id)
+        else:
+            tasks.append((False, [entry_id]))
+    for entry_ids in batched.values():
+        for start in range(0, len(entry_ids), email_service.BATCH_LIMIT):
+            tasks.append((True, entry_ids[start:start + email_service.BATCH_LIMIT]))
+    return tasks
+
+
+def send_due_emails(workers=None, batch_size=None, stdout=None, template=None):
+    """
+    Send every due email in the outbox.
+
+    Args:
+        workers: Threads sending in parallel (1 sends inline)
+        batch_size: Emails claimed per round
+        stdout: Optional callable receiving progress messages
+        template: Only send emails with this template
+
+    Returns:
+        Tuple of (sent, failed) counts
+    """
+    workers = workers or settings.EMAIL_OUTBOX_WORKERS
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = failed = 0
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            claimed = claim_due_emails(batch_size, template=template)
+            if not claimed:
+                break
+            tasks = _delivery_tasks(claimed)
+            if executor:
+                results = list(executor.map(_deliver_in_thread, tasks))
+            else:
+                results = [_deliver(task) for task in tasks]
+            round_sent = sum(result[0] for result in results)
+            round_failed = sum(result[1] for result in results)
+            sent += round_sent
+            failed += round_failed
+            if stdout:
+                stdout(f'Sent {round_sent} email(s), {round_failed} failed')
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return sent, failed
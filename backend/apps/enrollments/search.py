@@ -0,0 +1,60 @@
+"""
+Search helpers for enrollments.
+
+The admin search matches against ``Enrollment.search_document``, a
+denormalized, lowercased and accent-stripped text built from the user and
+form_data fields. On PostgreSQL the column carries a trigram GIN index, so
+substring matches do not need to scan or parse form_data.
+"""
+import re
+import unicodedata
+
+CPF_QUERY_PATTERN = re.compile(r'[\d.\-/\s]+')
+
+
+def normalize_search_text(value):
+    """Lowercase, strip accents and collapse whitespace."""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.lower().split())
+
+
+def only_digits(value):
+    """Keep only the digits of a value (CPF, phone, CEP)."""
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def build_search_document(form_data, first_name='', last_name='', email=''):
+    """Build the searchable text for an enrollment."""
+    form_data = form_data or {}
+    parts = [
+        first_name,
+        last_name,
+        email,
+        form_data.get('nome_completo'),
+        form_data.get('email'),
+    ]
+    document = ' '.join(normalize_search_text(part) for part in parts if part)
+
+    cpf = only_digits(form_data.get('cpf'))
+    if cpf:
+        document = f'{document} {cpf}'
+
+    return document.strip()
+
+
+def normalize_search_query(search):
+    """
+    Normalize an admin search term the same way documents are built.
+
+    Terms made only of digits and CPF punctuation are reduced to digits so
+    "123.456.789-09" and "12345678909" find the same enrollment.
+    """
+    search = (search or '').strip()
+    if search and CPF_QUERY_PATTERN.fullmatch(search):
+        digits = only_digits(search)
+        if digits:
+            return digits
+    return normalize_search_text(search)
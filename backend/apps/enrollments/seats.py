@@ -0,0 +1,80 @@
+"""
+Bulk enrollment status changes that keep batch seat counters in step, and
+a recount for when the counters drift anyway.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.products.models import Batch
+from apps.products.transitions import update_batch_statuses
+
+from .models import Enrollment
+
+
+def update_status_releasing_seats(queryset, status, **fields):
+    """
+    Move enrollments to a status that does not hold a seat, releasing seats.
+
+    Bulk ``update()`` bypasses Enrollment.save(), so the seats held by the
+    affected rows are released here, in the same transaction.
+
+    Returns:
+        Number of enrollments updated
+    """
+    assert status not in Enrollment.SEAT_HOLDING_STATUSES
+
+    with transaction.atomic():
+        rows = list(
+            Enrollment.objects.select_for_update()
+            .filter(pk__in=queryset.values('pk'))
+            .values_list('id', 'batch_id', 'status')
+        )
+        if not rows:
+            return 0
+
+        updated = Enrollment.objects.filter(id__in=[row[0] for row in rows]).update(
+            status=status,
+            updated_at=timezone.now(),
+            **fields
+        )
+        released = Counter(
+            batch_id for _, batch_id, old_status in rows
+            if old_status in Enrollment.SEAT_HOLDING_STATUSES
+        )
+        for batch_id, count in released.items():
+            Batch.adjust_reserved_seats(batch_id, -count)
+    return updated
+
+
+def reconcile_reserved_seats():
+    """
+    Recount Batch.reserved_seats from the enrollments that hold a seat.
+
+    Each batch row is locked while it is recounted, so concurrent
+    reservations (which update the same row) are not lost. Batches whose
+    count changed then go through the ACTIVE <-> FULL transitions.
+
+    Returns:
+        Dict of batch id -> (old count, new count) for the corrected batches
+    """
+    corrected = {}
+    for batch_id in Batch.objects.order_by('id').values_list('id', flat=True):
+        with transaction.atomic():
+            old = Batch.objects.select_for_update().filter(pk=batch_id).values_list(
+                'reserved_seats', flat=True
+            ).first()
+            if old is None:
+                continue
+            new = Enrollment.objects.filter(
+                batch_id=batch_id,
+                status__in=Enrollment.SEAT_HOLDING_STATUSES,
+            ).count()
+            if new != old:
+                Batch.objects.filter(pk=batch_id).update(reserved_seats=new, updated_at=timezone.now())
+                corrected[batch_id] = (old, new)
+
+    if corrected:
+        update_batch_statuses()
+    return corrected
@@ -2,11 +2,57 @@
 Enrollment serializers.
 """
 from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
+from . import waiting_room
 from .models import Enrollment
 from apps.products.serializers import ProductSerializer, BatchSerializer
 
 
+def optimize_enrollment_queryset(queryset):
+    """
+    Add the joins/prefetches EnrollmentSerializer needs.
+
+    With this, serializing a page of enrollments costs a fixed number of
+    queries: the page itself, one for payments (already ordered by due
+    date) and, per distinct product/batch, the memoized active batch and
+    enrollment count.
+    """
+    from apps.payments.models import Payment
+
+    return queryset.select_related(
+        'product', 'batch', 'user', 'coupon'
+    ).prefetch_related(
+        Prefetch('payments', queryset=Payment.objects.order_by('due_date', 'id'))
+    )
+
+
+def _payment_sort_key(payment):
+    # Same order as ORDER BY due_date on PostgreSQL (NULLs last).
+    return (payment.due_date is None, payment.due_date, payment.id)
+
+
+def serialize_enrollment_payments(enrollment):
+    """
+    Serialize an enrollment's payments ordered by due date.
+
+    Uses the prefetched payments when available; sorting in Python keeps
+    the order stable whether or not the prefetch was ordered.
+    """
+    payments = sorted(enrollment.payments.all(), key=_payment_sort_key)
+    return [{
+        'id': p.id,
+        'amount': str(p.amount),
+        'status': p.status,
+        'installment_number': p.installment_number,
+        'due_date': p.due_date.isoformat() if p.due_date else None,
+        'paid_at': p.paid_at.isoformat() if p.paid_at else None,
+        'pix_qr_code': getattr(p, 'pix_qr_code', None),
+        'pix_copy_paste': getattr(p, 'pix_copy_paste', None),
+    } for p in payments]
+
+
 class EnrollmentSerializer(serializers.ModelSerializer):
     """Serializer for Enrollment model."""
     
@@ -28,24 +74,15 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         if obj.coupon and obj.coupon.enable_12x_installments:
             return obj.coupon.max_installments
         
-        # Use global settings default
-        settings = Settings.get_settings()
-        return settings.max_installments
+        # Use global settings default, loaded once per serialization
+        if '_settings' not in self.context:
+            self.context['_settings'] = Settings.get_settings()
+        return self.context['_settings'].max_installments
     
     def get_payments(self, obj):
         """Get payments for this enrollment."""
         try:
-            payments = obj.payments.all().order_by('due_date')
-            return [{
-                'id': p.id,
-                'amount': str(p.amount),
-                'status': p.status,
-                'installment_number': p.installment_number,
-                'due_date': p.due_date.isoformat() if p.due_date else None,
-                'paid_at': p.paid_at.isoformat() if p.paid_at else None,
-                'pix_qr_code': getattr(p, 'pix_qr_code', None),
-                'pix_copy_paste': getattr(p, 'pix_copy_paste', None),
-            } for p in payments]
+            return serialize_enrollment_payments(obj)
         except Exception as e:
             return []
     
@@ -87,20 +124,23 @@ class EnrollmentCreateSerializer(serializers.Serializer):
     batch_id = serializers.IntegerField()
     form_data = serializers.JSONField(required=False, default=dict)
     coupon_code = serializers.CharField(required=False, allow_blank=True)
+    queue_token = serializers.CharField(required=False, allow_blank=True)
     
     def validate(self, data):
         """Validate product and batch."""
         from apps.products.models import Product, Batch
         
-        try:
-            product = Product.objects.get(id=data['product_id'], is_active=True)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError({'product_id': 'Produto não encontrado ou inativo'})
-        
-        try:
-            batch = Batch.objects.get(id=data['batch_id'], product=product)
-        except Batch.DoesNotExist:
+        # Product and batch in one query; the second one only runs on error
+        batch = Batch.objects.select_related('product').filter(
+            id=data['batch_id'],
+            product_id=data['product_id'],
+            product__is_active=True,
+        ).first()
+        if batch is None:
+            if not Product.objects.filter(id=data['product_id'], is_active=True).exists():
+                raise serializers.ValidationError({'product_id': 'Produto não encontrado ou inativo'})
             raise serializers.ValidationError({'batch_id': 'Lote não encontrado'})
+        product = batch.product
         
         if batch.is_full:
             raise serializers.ValidationError({'batch_id': 'Lote esgotado'})
@@ -108,6 +148,16 @@ class EnrollmentCreateSerializer(serializers.Serializer):
         if batch.status != 'ACTIVE':
             raise serializers.ValidationError({'batch_id': 'Lote não está ativo'})
         
+        request = self.context.get('request')
+        
+        # Only users admitted by the waiting room may enroll
+        if waiting_room.is_enabled():
+            user_id = request.user.id if request and request.user.is_authenticated else None
+            if not waiting_room.is_admitted(data.get('queue_token'), batch.id, user_id):
+                raise serializers.ValidationError({
+                    'queue_token': 'Aguarde sua vez na fila de inscrição.'
+                })
+        
         # Validate age (block anyone born in 2010 or later)
         form_data = data.get('form_data', {})
         data_nascimento = form_data.get('data_nascimento')
@@ -127,37 +177,8 @@ class EnrollmentCreateSerializer(serializers.Serializer):
                     'form_data': 'Data de nascimento inválida. Use o formato AAAA-MM-DD.'
                 })
         
-        # Check for duplicate enrollment
-        request = self.context.get('request')
-        
-        # If user is authenticated, check by user
-        if request and request.user.is_authenticated:
-            existing_enrollment = Enrollment.objects.filter(
-                user=request.user,
-                product=product,
-                status__in=['PENDING_PAYMENT', 'PAID']
-            ).exists()
-            
-            if existing_enrollment:
-                raise serializers.ValidationError({
-                    'form_data': 'Você já possui uma inscrição ativa para este produto. Cada pessoa pode fazer apenas uma inscrição.'
-                })
-        else:
-            # If not authenticated, check by email in form_data
-            form_data = data.get('form_data', {})
-            email = form_data.get('email', '').lower().strip()
-            
-            if email:
-                existing_enrollment = Enrollment.objects.filter(
-                    user__email__iexact=email,
-                    product=product,
-                    status__in=['PENDING_PAYMENT', 'PAID']
-                ).exists()
-                
-                if existing_enrollment:
-                    raise serializers.ValidationError({
-                        'form_data': 'Você já possui uma inscrição ativa para este produto. Cada pessoa pode fazer apenas uma inscrição.'
-                    })
+        # Duplicate enrollments are rejected by the unique constraint on
+        # insert (see create), not by a pre-check.
         
         data['product'] = product
         data['batch'] = batch
@@ -204,29 +225,26 @@ class EnrollmentCreateSerializer(serializers.Serializer):
         validated_data.pop('product_id')
         validated_data.pop('batch_id')
         coupon_code = validated_data.pop('coupon_code', None)
+        queue_token = validated_data.pop('queue_token', None)
         
-        # Validate and apply coupon if provided
+        # Validate and apply coupon if provided (definition served from cache;
+        # Coupon.redeem() below is the authoritative usage check)
         coupon = None
         if coupon_code:
-            from .models import Coupon
-            try:
-                coupon = Coupon.objects.get(code=coupon_code.strip().upper())
-                
-                # Validate coupon
-                is_valid, message = coupon.is_valid()
-                if not is_valid:
-                    raise serializers.ValidationError({'coupon_code': message})
-                
-                # Check product restriction
-                if not coupon.can_apply_to_product(product):
-                    raise serializers.ValidationError({
-                        'coupon_code': 'Este cupom não é válido para este produto'
-                    })
-                
-                # Check minimum purchase (will be validated after calculating base price)
-                
-            except Coupon.DoesNotExist:
+            from .coupon_cache import get_cached_coupon
+            coupon = get_cached_coupon(coupon_code.strip().upper())
+            if coupon is None:
                 raise serializers.ValidationError({'coupon_code': 'Cupom não encontrado'})
+            
+            is_valid, message = coupon.is_valid()
+            if not is_valid:
+                raise serializers.ValidationError({'coupon_code': message})
+            
+            # Check product restriction
+            if not coupon.can_apply_to_product(product):
+                raise serializers.ValidationError({
+                    'coupon_code': 'Este cupom não é válido para este produto'
+                })
         
         # Set default values for amounts (will be recalculated when payment method is chosen)
         # Use the base price (PIX cash) as initial total_amount
@@ -244,20 +262,43 @@ class EnrollmentCreateSerializer(serializers.Serializer):
         
         final_amount = initial_total - discount_amount
         
-        enrollment = Enrollment.objects.create(
-            user=user,
-            product=product,
-            batch=batch,
-            coupon=coupon,
-            total_amount=initial_total,
-            discount_amount=discount_amount,
-            final_amount=final_amount,
-            **validated_data
-        )
+        # The seat is taken by a conditional UPDATE inside Enrollment.save()
+        # and the coupon use by Coupon.redeem(), both in this transaction, so
+        # concurrent sign-ups cannot oversell the batch or the coupon, and the
+        # unique constraint rejects a second active enrollment. The
+        # confirmation email is queued in the same transaction.
+        from apps.products.models import BatchFullError
+        from .outbox import queue_enrollment_email
+        try:
+            with transaction.atomic():
+                if coupon and not coupon.redeem():
+                    raise serializers.ValidationError({'coupon_code': 'Cupom esgotado'})
+                enrollment = Enrollment.objects.create(
+                    user=user,
+                    product=product,
+                    batch=batch,
+                    coupon=coupon,
+                    total_amount=initial_total,
+                    discount_amount=discount_amount,
+                    final_amount=final_amount,
+                    **validated_data
+                )
+                queue_enrollment_email('enrollment_confirmation', enrollment)
+        except BatchFullError:
+            raise serializers.ValidationError({'batch_id': 'Lote esgotado'})
+        except IntegrityError:
+            if not Enrollment.objects.filter(
+                user=user,
+                product=product,
+                status__in=Enrollment.SEAT_HOLDING_STATUSES,
+            ).exists():
+                raise
+            raise serializers.ValidationError({
+                'form_data': 'Você já possui uma inscrição ativa para este produto. Cada pessoa pode fazer apenas uma inscrição.'
+            })
         
-        # Increment coupon usage
-        if coupon:
-            coupon.increment_uses()
+        if queue_token:
+            waiting_room.release(queue_token)
         
         return enrollment
 
@@ -272,17 +313,7 @@ class EnrollmentListSerializer(serializers.ModelSerializer):
     def get_payments(self, obj):
         """Get payments for this enrollment."""
         try:
-            payments = obj.payments.all().order_by('due_date')
-            return [{
-                'id': p.id,
-                'amount': str(p.amount),
-                'status': p.status,
-                'installment_number': p.installment_number,
-                'due_date': p.due_date.isoformat() if p.due_date else None,
-                'paid_at': p.paid_at.isoformat() if p.paid_at else None,
-                'pix_qr_code': getattr(p, 'pix_qr_code', None),
-                'pix_copy_paste': getattr(p, 'pix_copy_paste', None),
-            } for p in payments]
+            return serialize_enrollment_payments(obj)
         except Exception as e:
             return []
     
@@ -0,0 +1,62 @@
+"""
+Cached global Settings singleton.
+
+The row is kept in the shared cache and in this process, and is invalidated
+in both when it is saved. Other processes notice a change once their local
+copy expires (SETTINGS_LOCAL_CACHE_TIMEOUT), so a local hit costs no I/O at
+all; the shared cache only saves the database read on a local miss.
+
+The shared entry is keyed by a version that every save increments, so a
+reader that loaded the row just before a save cannot put the old copy back
+under the key later readers use.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+SETTINGS_VERSION_KEY = 'enrollments:settings:version'
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def get_settings_version():
+    version = cache.get(SETTINGS_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses an old version.
+        cache.add(SETTINGS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(SETTINGS_VERSION_KEY)
+    return version
+
+
+def get_cached_settings():
+    """Return the Settings singleton, creating it on first use."""
+    from .models import Settings
+
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local.get('settings')
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    key = f'enrollments:settings:v{get_settings_version()}'
+    obj = cache.get(key)
+    if obj is None:
+        obj, _created = Settings.objects.get_or_create(pk=1)
+        cache.set(key, obj, timeout=settings.SETTINGS_CACHE_TIMEOUT)
+
+    with _local_lock:
+        _local['settings'] = (now + settings.SETTINGS_LOCAL_CACHE_TIMEOUT, obj)
+    return obj
+
+
+def invalidate_settings():
+    """Drop the cached Settings in the shared cache and in this process."""
+    try:
+        cache.incr(SETTINGS_VERSION_KEY)
+    except ValueError:
+        cache.set(SETTINGS_VERSION_KEY, time.time_ns(), timeout=None)
+    with _local_lock:
+        _local.clear()
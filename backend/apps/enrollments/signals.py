@@ -0,0 +1,70 @@
+"""
+Enrollment signal handlers.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .coupon_cache import invalidate_coupons
+from .models import Coupon, Enrollment, Settings
+from .settings_cache import invalidate_settings
+
+SEARCH_USER_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_enrollment_search_documents(sender, instance, created, update_fields=None, **kwargs):
+    """Keep enrollment search documents in sync with the user's name/email."""
+    if created:
+        return
+    # Saves that cannot touch the indexed fields (e.g. last_login on every
+    # login) skip the enrollment query.
+    if update_fields is not None and not SEARCH_USER_FIELDS.intersection(update_fields):
+        return
+
+    enrollments = list(Enrollment.objects.filter(user=instance).only('id', 'form_data', 'search_document'))
+    changed = []
+    for enrollment in enrollments:
+        enrollment.user = instance
+        previous = enrollment.search_document
+        enrollment.refresh_search_document()
+        if enrollment.search_document != previous:
+            changed.append(enrollment)
+
+    if changed:
+        Enrollment.objects.bulk_update(changed, ['search_document'])
+
+
+@receiver(pre_delete, sender=Enrollment)
+def remember_held_seat(sender, instance, **kwargs):
+    """Read the stored status before the row goes (the instance may be stale)."""
+    stored = Enrollment.objects.filter(pk=instance.pk).values_list('batch_id', 'status').first()
+    instance._held_seat_batch_id = (
+        stored[0] if stored and stored[1] in Enrollment.SEAT_HOLDING_STATUSES else None
+    )
+
+
+@receiver(post_delete, sender=Enrollment)
+def release_deleted_enrollment_seat(sender, instance, **kwargs):
+    """Give back the seat of a deleted enrollment (admin delete, user cascade)."""
+    from apps.products.models import Batch
+
+    batch_id = getattr(instance, '_held_seat_batch_id', None)
+    if batch_id:
+        Batch.adjust_reserved_seats(batch_id, -1)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+@receiver(m2m_changed, sender=Coupon.products.through)
+def invalidate_coupon_cache(sender, **kwargs):
+    """Drop cached coupon definitions once the change is committed."""
+    transaction.on_commit(invalidate_coupons)
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def invalidate_settings_cache(sender, **kwargs):
+    """Drop the cached Settings singleton once the change is committed."""
+    transaction.on_commit(invalidate_settings)
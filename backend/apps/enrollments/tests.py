@@ -1,13 +1,30 @@
 from decimal import Decimal
-from datetime import timedelta
+from datetime import date, timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from apps.enrollments import email_service
+from apps.enrollments.coupon_cache import CodeFilter, get_coupon_version
+from apps.enrollments.coupon_generation import generate_coupons
+from apps.enrollments.email_templates import inline_css
+from apps.enrollments.expiry import expire_enrollments
+from apps.enrollments.outbox import queue_enrollment_email, send_due_emails
+from apps.enrollments.broadcasts import BroadcastAlreadyQueued, queue_broadcast, with_progress
+from apps.enrollments.models import Broadcast, Coupon, EmailOutbox, Enrollment, Settings
+from apps.enrollments.seats import update_status_releasing_seats
+from apps.enrollments.settings_cache import get_settings_version, invalidate_settings
+from apps.enrollments import waiting_room
+from apps.payments.models import Payment
 from apps.products.models import Batch, Product
 
 
@@ -68,3 +85,1000 @@ class EnrollmentSecurityTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['product']['id'], self.product.id)
         self.assertEqual(response.data['batch']['id'], self.batch.id)
+
+
+class EnrollmentFormDataColumnsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='participant@example.com',
+            password='password123',
+        )
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+
+    def test_promoted_columns_follow_form_data(self):
+        enrollment = Enrollment.objects.create(
+            user=self.user,
+            product=self.product,
+            batch=self.batch,
+            form_data={
+                'nome_completo': '  Maria   Silva ',
+                'email': 'Maria@Example.com',
+                'cpf': '529.982.247-25',
+                'telefone': '(61) 99999-0000',
+                'data_nascimento': '2000-05-17',
+                'tamanho_camiseta': 'M',
+                'lider_pg': 'João',
+                'igreja': 'Batista Capital',
+            },
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+
+        self.assertEqual(enrollment.participant_name, 'Maria Silva')
+        self.assertEqual(enrollment.participant_email, 'maria@example.com')
+        self.assertEqual(enrollment.participant_cpf, '52998224725')
+        self.assertEqual(enrollment.participant_phone, '61999990000')
+        self.assertEqual(enrollment.birth_date, date(2000, 5, 17))
+        self.assertEqual(enrollment.shirt_size, 'M')
+        self.assertEqual(enrollment.pg_leader, 'João')
+        self.assertEqual(enrollment.church, 'Batista Capital')
+
+        enrollment.form_data['tamanho_camiseta'] = 'G'
+        enrollment.form_data['data_nascimento'] = 'invalid'
+        enrollment.save(update_fields=['form_data'])
+        enrollment.refresh_from_db()
+
+        self.assertEqual(enrollment.shirt_size, 'G')
+        self.assertIsNone(enrollment.birth_date)
+        self.assertEqual(Enrollment.objects.filter(shirt_size='G').count(), 1)
+
+    def test_admin_searches_punctuated_cpf_and_exports_original_values(self):
+        enrollment = Enrollment.objects.create(
+            user=self.user,
+            product=self.product,
+            batch=self.batch,
+            form_data={'nome_completo': 'Maria Silva', 'cpf': '529.982.247-25', 'telefone': '(61) 99999-0000'},
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+        admin_user = User.objects.create_user(
+            email='admin@example.com', password='password123', is_staff=True, is_superuser=True,
+        )
+        self.client.force_login(admin_user)
+        url = reverse('admin:enrollments_enrollment_changelist')
+
+        response = self.client.get(url, {'q': '529.982.247-25'}, HTTP_HOST='localhost')
+        self.assertEqual(list(response.context['cl'].result_list), [enrollment])
+
+        response = self.client.post(
+            url,
+            {'action': 'export_to_csv', '_selected_action': [enrollment.pk]},
+            HTTP_HOST='localhost',
+        )
+        row = response.content.decode('utf-8-sig').splitlines()[1]
+        self.assertIn('(61) 99999-0000,529.982.247-25', row)
+
+
+class BatchSeatReservationTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+            max_enrollments=1,
+        )
+
+    def enroll(self, email):
+        user = User.objects.create_user(email=email, password='password123')
+        self.client.force_authenticate(user=user)
+        with patch('apps.enrollments.email_service.send_enrollment_confirmation_email'):
+            return self.client.post(
+                reverse('enrollments:enrollment-list'),
+                {
+                    'product_id': self.product.id,
+                    'batch_id': self.batch.id,
+                    'form_data': {'email': email, 'nome_completo': 'Participante'},
+                },
+                format='json',
+            )
+
+    def test_full_batch_rejects_new_enrollment(self):
+        self.assertEqual(self.enroll('first@example.com').status_code, status.HTTP_201_CREATED)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+
+        response = self.enroll('second@example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_reservation_is_conditional_on_capacity(self):
+        self.assertTrue(Batch.reserve_seat(self.batch.id))
+        self.assertFalse(Batch.reserve_seat(self.batch.id))
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+
+    def test_cancelling_releases_seat(self):
+        self.enroll('first@example.com')
+        enrollment = Enrollment.objects.get()
+
+        response = self.client.post(reverse('enrollments:enrollment-cancel', args=[enrollment.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+
+        # Cancelling again must not release a second seat
+        enrollment.refresh_from_db()
+        enrollment.save()
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+
+    def test_bulk_status_update_releases_seats(self):
+        self.enroll('first@example.com')
+
+        updated = update_status_releasing_seats(Enrollment.objects.all(), 'EXPIRED')
+
+        self.assertEqual(updated, 1)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+
+    def test_deleting_enrollment_releases_seat(self):
+        self.enroll('first@example.com')
+        Enrollment.objects.get().delete()
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+        self.assertEqual(self.enroll('second@example.com').status_code, status.HTTP_201_CREATED)
+
+    def test_deleting_user_releases_seat(self):
+        self.enroll('first@example.com')
+        User.objects.get(email='first@example.com').delete()
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+
+    def test_deleting_cancelled_enrollment_keeps_seats(self):
+        self.enroll('first@example.com')
+        enrollment = Enrollment.objects.get()
+        update_status_releasing_seats(Enrollment.objects.all(), 'CANCELLED')
+        Batch.reserve_seat(self.batch.id)
+
+        # Stale in-memory status: the stored (cancelled) one decides
+        enrollment.delete()
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+
+    def test_reconcile_recounts_reserved_seats(self):
+        self.enroll('first@example.com')
+        Batch.objects.filter(pk=self.batch.pk).update(reserved_seats=0)
+
+        call_command('reconcile_reserved_seats', stdout=StringIO())
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+        self.assertEqual(self.batch.status, 'FULL')
+
+    def test_saving_batch_keeps_reserved_seats(self):
+        stale = Batch.objects.get(pk=self.batch.pk)
+        Batch.reserve_seat(self.batch.id)
+
+        stale.name = 'Lote Renomeado'
+        stale.save()
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+
+
+class EnrollmentCreationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+            status='ACTIVE',
+        )
+        self.user = User.objects.create_user(email='participant@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+    def enroll(self):
+        return self.client.post(
+            reverse('enrollments:enrollment-list'),
+            {
+                'product_id': self.product.id,
+                'batch_id': self.batch.id,
+                'form_data': {'email': self.user.email, 'nome_completo': 'Participante'},
+            },
+            format='json',
+        )
+
+    def test_second_active_enrollment_is_rejected_by_constraint(self):
+        self.assertEqual(self.enroll().status_code, status.HTTP_201_CREATED)
+
+        response = self.enroll()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('form_data', response.data)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 1)
+
+    def test_cancelled_enrollment_allows_a_new_one(self):
+        self.enroll()
+        Enrollment.objects.update(status='CANCELLED')
+
+        self.assertEqual(self.enroll().status_code, status.HTTP_201_CREATED)
+
+    @patch('apps.enrollments.email_service.deliver')
+    def test_confirmation_email_is_queued_not_sent(self, mock_deliver):
+        response = self.enroll()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_deliver.assert_not_called()
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.template, 'enrollment_confirmation')
+        self.assertEqual(entry.object_key, f'enrollment:{response.data["id"]}')
+
+
+class EnrollmentExpiryTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=10),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+
+    def create_enrollment(self, email, age_hours):
+        user = User.objects.create_user(email=email, password='password123')
+        enrollment = Enrollment.objects.create(
+            user=user,
+            product=self.product,
+            batch=self.batch,
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+        Enrollment.objects.filter(pk=enrollment.pk).update(
+            created_at=timezone.now() - timedelta(hours=age_hours)
+        )
+        return enrollment
+
+    def create_payment(self, enrollment, status, due_in_days=-1):
+        return Payment.objects.create(
+            enrollment=enrollment,
+            asaas_payment_id=f'pay_{enrollment.id}_{status}',
+            amount=Decimal('100.00'),
+            status=status,
+            installment_number=1,
+            due_date=timezone.localdate() + timedelta(days=due_in_days),
+        )
+
+    @patch('apps.enrollments.expiry.cancel_open_charge')
+    def test_expires_abandoned_enrollments_and_releases_seats(self, mock_cancel):
+        abandoned = self.create_enrollment('abandoned@example.com', age_hours=100)
+        overdue_charge = self.create_payment(abandoned, 'OVERDUE')
+        recent = self.create_enrollment('recent@example.com', age_hours=1)
+        paid_installment = self.create_enrollment('paid@example.com', age_hours=100)
+        self.create_payment(paid_installment, 'RECEIVED')
+        open_charge = self.create_enrollment('open@example.com', age_hours=100)
+        self.create_payment(open_charge, 'PENDING', due_in_days=2)
+
+        with self.settings(ENROLLMENT_EXPIRY_HOURS=72):
+            expired, charges = expire_enrollments(chunk_size=1)
+
+        self.assertEqual((expired, charges), (1, 1))
+        mock_cancel.assert_called_once_with(overdue_charge.id)
+        statuses = dict(Enrollment.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[abandoned.id], 'EXPIRED')
+        self.assertEqual(statuses[recent.id], 'PENDING_PAYMENT')
+        self.assertEqual(statuses[paid_installment.id], 'PENDING_PAYMENT')
+        self.assertEqual(statuses[open_charge.id], 'PENDING_PAYMENT')
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 3)
+
+    @patch('apps.enrollments.management.commands.expire_enrollments.time.sleep')
+    def test_watch_mode_sweeps_on_every_interval(self, mock_sleep):
+        first = self.create_enrollment('first@example.com', age_hours=100)
+        second = self.create_enrollment('second@example.com', age_hours=1)
+
+        def abandon_second(seconds):
+            if mock_sleep.call_count > 1:
+                raise KeyboardInterrupt
+            Enrollment.objects.filter(pk=second.pk).update(created_at=timezone.now() - timedelta(hours=100))
+
+        mock_sleep.side_effect = abandon_second
+        with self.settings(ENROLLMENT_EXPIRY_HOURS=72), self.assertRaises(KeyboardInterrupt):
+            call_command('expire_enrollments', '--watch', '--interval', '60', stdout=StringIO())
+
+        mock_sleep.assert_called_with(60)
+        self.assertEqual(
+            set(Enrollment.objects.filter(status='EXPIRED').values_list('id', flat=True)),
+            {first.id, second.id},
+        )
+
+
+@override_settings(WAITING_ROOM_ENABLED=True, WAITING_ROOM_ADMISSIONS_PER_SECOND=1, CACHE_IS_SHARED=True)
+class WaitingRoomTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.users = [
+            User.objects.create_user(email=f'user{i}@example.com', password='password123')
+            for i in range(3)
+        ]
+
+    def join(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            reverse('enrollments:waiting-room-join'), {'batch_id': self.batch.id}, format='json'
+        )
+
+    def test_queue_admits_at_configured_rate(self):
+        with patch('apps.enrollments.waiting_room.time.time', return_value=1000):
+            first, second, third = [self.join(user).data for user in self.users]
+
+        self.assertTrue(first['admitted'])
+        self.assertFalse(second['admitted'])
+        self.assertEqual(third['position'], 2)
+
+        with patch('apps.enrollments.waiting_room.time.time', return_value=1001):
+            self.client.force_authenticate(user=self.users[2])
+            response = self.client.get(
+                reverse('enrollments:waiting-room-status', args=[third['token']])
+            )
+        self.assertEqual(response.data['position'], 1)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+    def test_joining_again_keeps_the_same_ticket(self):
+        with patch('apps.enrollments.waiting_room.time.time', return_value=1000):
+            self.join(self.users[0])
+            first = self.join(self.users[1]).data
+            for _ in range(3):
+                again = self.join(self.users[1]).data
+            third = self.join(self.users[2]).data
+
+        self.assertEqual(again['token'], first['token'])
+        self.assertEqual(again['position'], 1)
+        self.assertEqual(third['position'], 2)
+
+    def test_token_is_released_after_enrolling(self):
+        first = self.join(self.users[0]).data
+        waiting_room.release(first['token'])
+
+        self.assertNotEqual(self.join(self.users[0]).data['token'], first['token'])
+
+    def test_rejects_batches_that_are_not_open(self):
+        Batch.objects.filter(pk=self.batch.pk).update(status='SCHEDULED')
+        self.assertEqual(self.join(self.users[0]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(
+            reverse('enrollments:waiting-room-join'), {'batch_id': self.batch.id + 100}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(cache.get(f'waiting_room:{self.batch.id + 100}:tail'))
+
+    def test_status_is_private_to_token_owner(self):
+        token = self.join(self.users[0]).data['token']
+
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.get(reverse('enrollments:waiting-room-status', args=[token]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('apps.enrollments.email_service.send_enrollment_confirmation_email')
+    def test_enrollment_requires_admitted_token(self, mock_send_email):
+        user = self.users[0]
+        payload = {
+            'product_id': self.product.id,
+            'batch_id': self.batch.id,
+            'form_data': {'email': user.email, 'nome_completo': 'Participante'},
+        }
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('enrollments:enrollment-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('queue_token', response.data)
+
+        token = self.join(user).data['token']
+        response = self.client.post(
+            reverse('enrollments:enrollment-list'), {**payload, 'queue_token': token}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(waiting_room.is_admitted(token, self.batch.id, user.id))
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_refuses_to_run_on_a_per_process_cache(self):
+        from django.core.checks import run_checks
+
+        with self.assertRaises(ImproperlyConfigured):
+            waiting_room.is_enabled()
+        self.assertIn('enrollments.E001', [error.id for error in run_checks()])
+
+
+class CouponRedemptionTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.coupon = Coupon.objects.create(
+            code='PROMO',
+            discount_type='FIXED',
+            discount_value=Decimal('10.00'),
+            max_uses=1,
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=1),
+        )
+
+    def test_redeem_never_exceeds_max_uses(self):
+        stale = Coupon.objects.get(pk=self.coupon.pk)
+
+        self.assertTrue(self.coupon.redeem())
+        self.assertFalse(stale.redeem())
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.uses_count, 1)
+
+    def test_saving_coupon_keeps_uses_count(self):
+        stale = Coupon.objects.get(pk=self.coupon.pk)
+        self.coupon.redeem()
+
+        stale.description = 'Editado no admin'
+        stale.save()
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.uses_count, 1)
+
+    @patch('apps.enrollments.email_service.send_enrollment_confirmation_email')
+    def test_used_up_coupon_rolls_back_enrollment(self, mock_send_email):
+        self.coupon.redeem()
+        user = User.objects.create_user(email='late@example.com', password='password123')
+        self.client.force_authenticate(user=user)
+
+        with patch.object(Coupon, 'is_valid', return_value=(True, 'Cupom válido')):
+            response = self.client.post(
+                reverse('enrollments:enrollment-list'),
+                {
+                    'product_id': self.product.id,
+                    'batch_id': self.batch.id,
+                    'form_data': {'email': user.email, 'nome_completo': 'Participante'},
+                    'coupon_code': 'promo',
+                },
+                format='json',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Enrollment.objects.count(), 0)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.reserved_seats, 0)
+
+
+class CouponValidationCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        self.other_product = Product.objects.create(
+            name='Outro Produto',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon = Coupon.objects.create(
+                code='PROMO',
+                discount_type='PERCENTAGE',
+                discount_value=Decimal('10.00'),
+                valid_from=now - timedelta(days=1),
+                valid_until=now + timedelta(days=1),
+            )
+        self.url = reverse('enrollments:validate-coupon')
+
+    def validate(self, code, product_id=None):
+        return self.client.post(
+            self.url,
+            {'code': code, 'product_id': product_id or self.product.id, 'amount': 100},
+            format='json',
+        )
+
+    def test_valid_and_unknown_codes_are_served_from_cache(self):
+        self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.validate('NOPE').status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('promo').data['discount_amount'], 10.0)
+            self.assertEqual(self.validate('NOPE').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_guessed_codes_are_rejected_by_the_code_filter(self):
+        self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            for index in range(20):
+                self.assertEqual(self.validate(f'GUESS{index}').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(f'coupons:v{get_coupon_version()}:GUESS0'))
+
+    def test_using_up_a_coupon_only_drops_its_own_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Coupon.objects.create(
+                code='ONCE',
+                discount_type='FIXED',
+                discount_value=Decimal('10.00'),
+                max_uses=1,
+                valid_from=timezone.now() - timedelta(days=1),
+                valid_until=timezone.now() + timedelta(days=1),
+            )
+        self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.validate('ONCE').status_code, status.HTTP_200_OK)
+        version = get_coupon_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(Coupon.objects.get(code='ONCE').redeem())
+
+        self.assertEqual(get_coupon_version(), version)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.validate('ONCE').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_code_filter_is_built_by_one_caller_at_a_time(self):
+        version = get_coupon_version()
+        cache.add(f'coupons:v{version}:filter:lock', 'other', timeout=60)
+
+        with patch('apps.enrollments.coupon_cache._build_code_filter') as mock_build:
+            self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.validate('NOPE').status_code, status.HTTP_404_NOT_FOUND)
+
+        mock_build.assert_not_called()
+
+    def test_code_filter_has_no_false_negatives(self):
+        codes = [f'CODE{index}' for index in range(1000)]
+        code_filter = CodeFilter(len(codes))
+        for code in codes:
+            code_filter.add(code)
+
+        self.assertTrue(all(code in code_filter for code in codes))
+        false_positives = sum(f'OTHER{index}' in code_filter for index in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_product_restriction_change_invalidates_cache(self):
+        self.assertEqual(self.validate('PROMO', self.other_product.id).status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.products.add(self.product)
+
+        self.assertEqual(
+            self.validate('PROMO', self.other_product.id).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(self.validate('PROMO').status_code, status.HTTP_200_OK)
+
+    def test_new_coupon_replaces_negative_entry(self):
+        self.assertEqual(self.validate('NEW10').status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Coupon.objects.create(
+                code='NEW10',
+                discount_type='FIXED',
+                discount_value=Decimal('10.00'),
+                valid_from=timezone.now() - timedelta(days=1),
+                valid_until=timezone.now() + timedelta(days=1),
+            )
+
+        self.assertEqual(self.validate('NEW10').status_code, status.HTTP_200_OK)
+
+
+class CouponGenerationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Produto',
+            description='Descricao',
+            base_price=Decimal('100.00'),
+        )
+        self.template = {
+            'discount_type': 'PERCENTAGE',
+            'discount_value': Decimal('15.00'),
+            'max_uses': 1,
+            'valid_from': timezone.now() - timedelta(days=1),
+            'valid_until': timezone.now() + timedelta(days=30),
+        }
+
+    def test_generates_unique_codes_with_prefix_and_product_restriction(self):
+        Coupon.objects.create(code='PROMO-AAAA', **self.template)
+
+        codes = generate_coupons(
+            50, self.template, prefix='promo-', length=4,
+            product_ids=[self.product.id], chunk_size=20,
+        )
+
+        self.assertEqual(len(set(codes)), 50)
+        self.assertNotIn('PROMO-AAAA', codes)
+        self.assertTrue(all(code.startswith('PROMO-') and len(code) == 10 for code in codes))
+        self.assertEqual(Coupon.objects.filter(code__in=codes).count(), 50)
+        self.assertEqual(Coupon.products.through.objects.filter(product=self.product).count(), 50)
+
+    def test_rejects_requests_beyond_code_space(self):
+        with self.assertRaises(ValueError):
+            generate_coupons(10, self.template, length=1, alphabet='AB')
+        self.assertFalse(Coupon.objects.exists())
+
+    def test_command_writes_csv(self):
+        out = StringIO()
+        call_command(
+            'generate_coupons', '3', '--prefix', 'VIP', '--discount-value', '10',
+            stdout=out, stderr=StringIO(),
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'codigo,tipo_desconto,valor_desconto,valido_ate')
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(Coupon.objects.filter(code__startswith='VIP', max_uses=1).count(), 3)
+
+
+class SettingsCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_settings()
+        self.addCleanup(invalidate_settings)
+        self.url = reverse('enrollments:get-settings')
+
+    def test_settings_are_loaded_once(self):
+        Settings.get_settings()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            Settings.get_settings()
+
+        self.assertEqual(response.data['max_installments'], 6)
+
+    def test_save_invalidates_cached_settings(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            obj = Settings.objects.get(pk=1)
+            obj.max_installments = 3
+            obj.save()
+
+        self.assertEqual(self.client.get(self.url).data['max_installments'], 3)
+
+    def test_stale_read_is_not_served_after_a_save(self):
+        # A reader loads the row, a save is committed, then the reader
+        # stores its stale copy: the next reader must not pick it up.
+        stale, _created = Settings.objects.get_or_create(pk=1)
+        key = f'enrollments:settings:v{get_settings_version()}'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            obj = Settings.objects.get(pk=1)
+            obj.max_installments = 3
+            obj.save()
+        cache.set(key, stale)
+
+        self.assertEqual(self.client.get(self.url).data['max_installments'], 3)
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+class EmailOutboxTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.user = User.objects.create_user(email='participant@example.com', password='password123')
+        self.enrollment = Enrollment.objects.create(
+            user=self.user,
+            product=self.product,
+            batch=self.batch,
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+
+    def test_same_email_is_queued_once(self):
+        queue_enrollment_email('payment_confirmation', self.enrollment)
+        queue_enrollment_email('payment_confirmation', self.enrollment)
+
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    @patch('apps.enrollments.email_service.deliver', return_value='msg-1')
+    def test_worker_sends_due_emails(self, mock_deliver):
+        queue_enrollment_email('enrollment_confirmation', self.enrollment)
+
+        self.assertEqual(send_due_emails(workers=1), (1, 0))
+
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'SENT')
+        self.assertEqual(entry.provider_message_id, 'msg-1')
+        message = mock_deliver.call_args[0][0]
+        self.assertEqual(message['to'], ['participant@example.com'])
+        self.assertIn('Produto Teste', message['subject'])
+
+    @patch('apps.enrollments.email_service.deliver', side_effect=RuntimeError('provider down'))
+    def test_failures_are_retried_with_backoff_then_marked_failed(self, mock_deliver):
+        queue_enrollment_email('enrollment_confirmation', self.enrollment)
+
+        self.assertEqual(send_due_emails(workers=1), (0, 1))
+        entry = EmailOutbox.objects.get()
+        self.assertEqual(entry.status, 'PENDING')
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(entry.last_error, 'provider down')
+
+        # Not due yet
+        self.assertEqual(send_due_emails(workers=1), (0, 0))
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        send_due_emails(workers=1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'FAILED')
+        self.assertEqual(entry.attempts, 2)
+
+    @patch('apps.enrollments.email_service.deliver', side_effect=email_service.ProviderRateLimited('Too many requests'))
+    def test_rate_limited_sends_do_not_use_up_attempts(self, mock_deliver):
+        queue_enrollment_email('enrollment_confirmation', self.enrollment)
+
+        for _ in range(3):
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(send_due_emails(workers=1), (0, 1))
+
+        entry = EmailOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('PENDING', 0))
+        self.assertLess(entry.next_attempt_at, timezone.now() + timedelta(seconds=10))
+
+    @override_settings(CACHE_IS_SHARED=True, EMAIL_PROVIDER_RATE_LIMIT=2)
+    def test_rate_limit_is_shared_between_processes(self):
+        cache.clear()
+        clock = [1000.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        # Separate limiters stand in for separate processes
+        limiters = [email_service.RateLimiter() for _ in range(3)]
+        with patch('apps.enrollments.email_service.time.time', lambda: clock[0]), \
+                patch('apps.enrollments.email_service.time.sleep', side_effect=sleep) as mock_sleep:
+            for limiter in limiters:
+                limiter.wait()
+
+        mock_sleep.assert_called_once_with(1.0)
+        self.assertEqual(clock[0], 1001.0)
+
+
+class EmailTemplateTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Produto Teste', base_price=Decimal('100.00'))
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.user = User.objects.create_user(email='participant@example.com', password='password123')
+        self.enrollment = Enrollment.objects.create(
+            user=self.user,
+            product=self.product,
+            batch=self.batch,
+            form_data={'nome_completo': '<b>Maria</b>'},
+            installments=3,
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+
+    def test_built_templates_are_up_to_date(self):
+        call_command('build_email_templates', '--check', stdout=StringIO())
+
+    def test_inline_css(self):
+        html = inline_css(
+            '<style></style><div class="box" style="color: red"><p>{{ name }}</p></div><p>x</p>',
+            '.box { color: blue; padding: 4px; } .box p { margin: 0; } a:hover { opacity: 0.9; }',
+        )
+
+        self.assertEqual(
+            html,
+            '<style>a:hover { opacity: 0.9; }</style>'
+            '<div class="box" style="color: red; padding: 4px;"><p style="margin: 0;">{{ name }}</p></div><p>x</p>',
+        )
+
+    def test_email_is_rendered_with_inlined_styles_and_escaped_values(self):
+        message = email_service.build_enrollment_confirmation_email(self.enrollment)
+
+        self.assertEqual(message['to'], ['participant@example.com'])
+        self.assertIn('&lt;b&gt;Maria&lt;/b&gt;', message['html'])
+        self.assertIn('3x', message['html'])
+        self.assertIn('class="info-box" style="background: #f8f9fa;', message['html'])
+
+    def test_batch_render_matches_single_render(self):
+        payments = [
+            Payment.objects.create(
+                enrollment=self.enrollment,
+                amount=Decimal('33.33'),
+                installment_number=number,
+                due_date=date(2026, 1, number),
+            )
+            for number in (1, 2, 3)
+        ]
+
+        messages = email_service.build_installment_reminder_emails(payments)
+
+        self.assertEqual(len(messages), 3)
+        for payment, message in zip(payments, messages):
+            self.assertEqual(message, email_service.build_installment_reminder_email(self.enrollment, payment))
+        self.assertIn('02/01/2026', messages[1]['html'])
+
+
+class BroadcastTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Acampamento', base_price=Decimal('100.00'))
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote 1',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.enroll('ana@example.com', {'nome_completo': 'Ana Souza'})
+        self.enroll('bia@example.com', {'nome_completo': 'Bia Lima', 'email': 'familia@example.com'})
+        # Same participant email as Bia's enrollment: one email only
+        self.enroll('carla@example.com', {'nome_completo': 'Carla Lima', 'email': 'FAMILIA@example.com'})
+        self.enroll('pending@example.com', {}, status='PENDING_PAYMENT')
+        self.broadcast = Broadcast.objects.create(
+            subject='Informações do acampamento',
+            body='Chegada às 8h.\n\nTraga roupa de cama.',
+            product=self.product,
+        )
+
+    def enroll(self, email, form_data, status='PAID'):
+        return Enrollment.objects.create(
+            user=User.objects.create_user(email=email, password='password123'),
+            product=self.product,
+            batch=self.batch,
+            form_data=form_data,
+            status=status,
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+        )
+
+    def test_queue_targets_filtered_enrollments_once_per_email(self):
+        self.assertEqual(queue_broadcast(self.broadcast, chunk_size=1), 2)
+
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('template', 'recipient')),
+            {('broadcast', 'ana@example.com'), ('broadcast', 'familia@example.com')},
+        )
+        self.broadcast.refresh_from_db()
+        self.assertEqual(self.broadcast.status, 'QUEUED')
+        self.assertEqual(self.broadcast.recipients_count, 2)
+
+        with self.assertRaises(BroadcastAlreadyQueued):
+            queue_broadcast(self.broadcast)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    @patch('apps.enrollments.email_service.deliver_batch')
+    def test_worker_sends_personalized_messages_in_one_batch(self, mock_deliver_batch):
+        mock_deliver_batch.side_effect = lambda messages: [f'msg-{index}' for index in range(len(messages))]
+        self.broadcast.enrollment_statuses = ['PAID', 'PENDING_PAYMENT']
+        self.broadcast.save()
+        queue_broadcast(self.broadcast)
+
+        self.assertEqual(send_due_emails(workers=1), (3, 0))
+
+        mock_deliver_batch.assert_called_once()
+        messages = sorted(mock_deliver_batch.call_args[0][0], key=lambda message: message['to'])
+        self.assertEqual([message['to'] for message in messages], [
+            ['ana@example.com'], ['familia@example.com'], ['pending@example.com'],
+        ])
+        self.assertEqual({message['subject'] for message in messages}, {'Informações do acampamento'})
+        self.assertIn('Olá, <strong>Ana Souza</strong>', messages[0]['html'])
+        self.assertIn('<p>Traga roupa de cama.</p>', messages[0]['html'])
+        self.assertIn('Olá, <strong>Participante</strong>', messages[2]['html'])
+
+        broadcast = with_progress(Broadcast.objects.all()).get()
+        self.assertEqual((broadcast.sent_count, broadcast.pending_count, broadcast.failed_count), (3, 0, 0))
+
+    def test_admin_action_queues_and_changelist_shows_progress(self):
+        admin_user = User.objects.create_user(
+            email='admin@example.com', password='password123', is_staff=True, is_superuser=True,
+        )
+        self.client.force_login(admin_user)
+        url = reverse('admin:enrollments_broadcast_changelist')
+
+        response = self.client.get(
+            reverse('admin:enrollments_broadcast_change', args=[self.broadcast.pk]),
+            HTTP_HOST='localhost',
+        )
+        self.assertContains(response, '2 email(s) distinto(s)')
+
+        response = self.client.post(
+            url,
+            {'action': 'send_broadcasts', '_selected_action': [self.broadcast.pk]},
+            HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(EmailOutbox.objects.filter(template='broadcast').count(), 2)
+
+        response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertContains(response, '0 de 2 enviado(s)')
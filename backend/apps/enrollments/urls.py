@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import EnrollmentViewSet, get_settings
 from .views_coupon import validate_coupon
+from .views_waiting_room import join_waiting_room, waiting_room_status
 
 app_name = 'enrollments'
 
@@ -11,5 +12,7 @@ router.register(r'', EnrollmentViewSet, basename='enrollment')
 urlpatterns = [
     path('validate-coupon/', validate_coupon, name='validate-coupon'),
     path('settings/', get_settings, name='get-settings'),
+    path('waiting-room/', join_waiting_room, name='waiting-room-join'),
+    path('waiting-room/<str:token>/', waiting_room_status, name='waiting-room-status'),
     path('', include(router.urls)),
 ]
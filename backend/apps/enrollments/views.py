@@ -2,6 +2,7 @@
 Enrollment views.
 """
 import logging
+from django.db import transaction
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
@@ -9,7 +10,8 @@ from .models import Enrollment, Settings
 from .serializers import (
     EnrollmentSerializer,
     EnrollmentCreateSerializer,
-    EnrollmentListSerializer
+    EnrollmentListSerializer,
+    optimize_enrollment_queryset
 )
 
 logger = logging.getLogger(__name__)
@@ -26,9 +28,9 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Return enrollments for current user."""
         if self.request.user.is_authenticated:
-            return Enrollment.objects.filter(user=self.request.user).select_related(
-                'product', 'batch', 'user'
-            ).prefetch_related('payments')
+            return optimize_enrollment_queryset(
+                Enrollment.objects.filter(user=self.request.user)
+            )
         # Return empty queryset if not authenticated
         return Enrollment.objects.none()
     
@@ -41,19 +43,15 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     
     def create(self, request, *args, **kwargs):
         """Create new enrollment."""
-        from .email_service import send_enrollment_confirmation_email
+        from apps.payments.models import Payment
         
+        # The confirmation email is queued by the serializer (see outbox.py)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         enrollment = serializer.save()
         
-        # Send confirmation email (non-blocking)
-        try:
-            send_enrollment_confirmation_email(enrollment)
-        except Exception as e:
-            logger.error(f"Erro ao enviar email de confirmação: {e}")
-        
-        # Return full enrollment data
+        # Return full enrollment data (a new enrollment has no payments yet)
+        enrollment._prefetched_objects_cache = {'payments': Payment.objects.none()}
         response_serializer = EnrollmentSerializer(enrollment)
         return Response(
             response_serializer.data,
@@ -104,6 +102,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             enrollment.form_data.update(request.data['form_data'])
         
         # Apply coupon if provided and enrollment doesn't have one yet
+        coupon = None
         if 'coupon_code' in request.data and not enrollment.coupon:
             coupon_code = request.data['coupon_code']
             try:
@@ -137,16 +136,30 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 enrollment.discount_amount = discount_amount
                 enrollment.final_amount = enrollment.total_amount - discount_amount
                 
-                # Increment coupon usage
-                coupon.increment_uses()
-                
             except Coupon.DoesNotExist:
                 return Response(
                     {'detail': 'Cupom não encontrado'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        enrollment.save()
+        with transaction.atomic():
+            if coupon:
+                # Lock the enrollment so two concurrent requests cannot both
+                # apply (and count) a coupon.
+                locked_coupon_id = Enrollment.objects.select_for_update().filter(
+                    pk=enrollment.pk
+                ).values_list('coupon_id', flat=True).first()
+                if locked_coupon_id is not None:
+                    return Response(
+                        {'detail': 'Esta inscrição já possui um cupom aplicado'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if not coupon.redeem():
+                    return Response(
+                        {'detail': 'Cupom esgotado'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            enrollment.save()
         
         serializer = self.get_serializer(enrollment)
         return Response(serializer.data)
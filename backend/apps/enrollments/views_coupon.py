@@ -6,7 +6,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from .models import Coupon
+from .coupon_cache import get_cached_coupon
 
 
 @api_view(['POST'])
@@ -46,10 +46,9 @@ def validate_coupon(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Find coupon
-    try:
-        coupon = Coupon.objects.get(code=code)
-    except Coupon.DoesNotExist:
+    # Find coupon (cached, including unknown codes)
+    coupon = get_cached_coupon(code)
+    if coupon is None:
         return Response(
             {'error': 'Cupom não encontrado'},
             status=status.HTTP_404_NOT_FOUND
@@ -65,16 +64,18 @@ def validate_coupon(request):
     
     # Check product restriction
     if product_id:
-        from apps.products.models import Product
         try:
-            product = Product.objects.get(id=product_id)
-            if not coupon.can_apply_to_product(product):
-                return Response(
-                    {'error': 'Este cupom não é válido para este produto'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except Product.DoesNotExist:
-            pass
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Produto inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not coupon.can_apply_to_product_id(product_id):
+            return Response(
+                {'error': 'Este cupom não é válido para este produto'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
     
     # Check minimum purchase
     if amount < float(coupon.min_purchase):
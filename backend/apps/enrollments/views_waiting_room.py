@@ -0,0 +1,76 @@
+"""
+Waiting room views.
+"""
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from apps.products.models import Batch
+
+from . import waiting_room
+
+
+def _no_store(response):
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def join_waiting_room(request):
+    """
+    Enter the queue for a batch.
+    
+    Expected payload:
+    {
+        "batch_id": 1
+    }
+    
+    Joining again returns the user's current token while it is valid.
+    When the waiting room is disabled the user is admitted immediately and
+    no token is needed to enroll.
+    """
+    try:
+        batch_id = int(request.data.get('batch_id'))
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'Lote é obrigatório'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if not waiting_room.is_enabled():
+        return _no_store(Response({
+            'token': None,
+            'batch_id': batch_id,
+            'admitted': True,
+            'position': 0,
+            'estimated_wait': 0,
+            'retry_after': 0,
+        }))
+    
+    if not Batch.objects.filter(pk=batch_id, status='ACTIVE').exists():
+        return Response(
+            {'error': 'Lote não encontrado ou não está aberto para inscrições'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    queue_status = waiting_room.join(batch_id, request.user.id)
+    return _no_store(Response(queue_status, status=status.HTTP_201_CREATED))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def waiting_room_status(request, token):
+    """Current position of a queue token (cache lookups only)."""
+    queue_status = waiting_room.get_status(token, request.user.id)
+    if queue_status is None:
+        return _no_store(Response(
+            {'error': 'Senha da fila inválida ou expirada'},
+            status=status.HTTP_404_NOT_FOUND
+        ))
+    
+    response = Response(queue_status)
+    if not queue_status['admitted']:
+        response['Retry-After'] = str(queue_status['retry_after'])
+    return _no_store(response)
@@ -0,0 +1,150 @@
+"""
+Virtual waiting room for batch openings.
+
+Each batch has a queue made of two counters in the shared cache:
+
+- ``tail``: last ticket handed out (incremented on join)
+- ``head``: highest ticket admitted so far
+
+Tickets up to ``head`` may create an enrollment. ``head`` advances by
+WAITING_ROOM_ADMISSIONS_PER_SECOND for every second elapsed, but only while
+someone is waiting (it never runs ahead of ``tail``), so quiet periods do not
+bank admissions that a later spike could use all at once. Advancing happens
+lazily on status checks, at most once per second per batch, and every check
+is a few cache reads: no database access and no background worker.
+
+A user holds at most one ticket per batch (``user:<id>``): joining again,
+e.g. after a form error, returns the same token and place in the queue.
+
+The counters and tokens must be visible to every web process, so the
+waiting room refuses to run without a shared cache (REDIS_URL).
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+KEY_PREFIX = 'waiting_room'
+TICK_TIMEOUT = 5  # seconds
+
+
+def is_enabled():
+    if not settings.WAITING_ROOM_ENABLED:
+        return False
+    if not settings.CACHE_IS_SHARED:
+        # A per-process cache would give every gunicorn worker its own queue
+        raise ImproperlyConfigured('WAITING_ROOM_ENABLED requires a shared cache (REDIS_URL)')
+    return True
+
+
+def _key(batch_id, name):
+    return f'{KEY_PREFIX}:{batch_id}:{name}'
+
+
+def _token_key(token):
+    return f'{KEY_PREFIX}:token:{token}'
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, timeout=settings.WAITING_ROOM_TTL)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.add(key, 0, timeout=settings.WAITING_ROOM_TTL)
+        return cache.incr(key, delta)
+
+
+def advance(batch_id, now=None):
+    """Admit the tickets due since the last advance (one caller per second)."""
+    now = int(now if now is not None else time.time())
+    if not cache.add(_key(batch_id, f'tick:{now}'), 1, timeout=TICK_TIMEOUT):
+        return
+
+    last_tick = cache.get(_key(batch_id, 'last_tick'))
+    cache.set(_key(batch_id, 'last_tick'), now, timeout=settings.WAITING_ROOM_TTL)
+    if last_tick is None:
+        elapsed = 1
+    else:
+        elapsed = min(max(now - last_tick, 0), settings.WAITING_ROOM_MAX_CATCH_UP)
+
+    head = cache.get(_key(batch_id, 'head'), 0)
+    tail = cache.get(_key(batch_id, 'tail'), 0)
+    due = min(elapsed * settings.WAITING_ROOM_ADMISSIONS_PER_SECOND, tail - head)
+    if due > 0:
+        _incr(_key(batch_id, 'head'), due)
+
+
+def join(batch_id, user_id):
+    """
+    Put a user in the queue of a batch, or return their existing ticket.
+
+    Returns:
+        Queue status dict (see get_status) including the token
+    """
+    user_key = _key(batch_id, f'user:{user_id}')
+    token = uuid.uuid4().hex
+    if not cache.add(user_key, token, timeout=settings.WAITING_ROOM_TTL):
+        existing = cache.get(user_key)
+        queue_status = get_status(existing, user_id) if existing else None
+        if queue_status is not None and queue_status['batch_id'] == batch_id:
+            return queue_status
+        # The old token expired or was used: hand out a new ticket
+        cache.set(user_key, token, timeout=settings.WAITING_ROOM_TTL)
+
+    ticket = _incr(_key(batch_id, 'tail'))
+    # Keep the queue alive for as long as people keep joining
+    cache.touch(_key(batch_id, 'tail'), settings.WAITING_ROOM_TTL)
+    cache.touch(_key(batch_id, 'head'), settings.WAITING_ROOM_TTL)
+    cache.set(
+        _token_key(token),
+        {'batch_id': batch_id, 'user_id': user_id, 'ticket': ticket},
+        timeout=settings.WAITING_ROOM_TTL,
+    )
+    return get_status(token, user_id)
+
+
+def get_status(token, user_id):
+    """
+    Return the queue status for a user's token, or None if it is unknown,
+    expired or belongs to someone else.
+
+    ``position`` is the number of people still ahead; ``retry_after`` is the
+    suggested delay in seconds before polling again.
+    """
+    entry = cache.get(_token_key(token))
+    if entry is None or entry['user_id'] != user_id:
+        return None
+
+    advance(entry['batch_id'])
+    head = cache.get(_key(entry['batch_id'], 'head'), 0)
+    ahead = max(entry['ticket'] - head, 0)
+    rate = settings.WAITING_ROOM_ADMISSIONS_PER_SECOND
+    return {
+        'token': token,
+        'batch_id': entry['batch_id'],
+        'admitted': ahead == 0,
+        'position': ahead,
+        'estimated_wait': ahead // rate if ahead else 0,
+        'retry_after': 0 if ahead == 0 else min(max(ahead // rate, 2), 10),
+    }
+
+
+def is_admitted(token, batch_id, user_id):
+    """Check that a token was issued to this user for this batch and has been admitted."""
+    entry = cache.get(_token_key(token)) if token else None
+    if entry is None or entry['batch_id'] != batch_id or entry['user_id'] != user_id:
+        return False
+    return entry['ticket'] <= cache.get(_key(batch_id, 'head'), 0)
+
+
+def release(token):
+    """Invalidate a token once it has been used."""
+    entry = cache.get(_token_key(token))
+    if entry is not None:
+        user_key = _key(entry['batch_id'], f'user:{entry["user_id"]}')
+        if cache.get(user_key) == token:
+            cache.delete(user_key)
+    cache.delete(_token_key(token))
@@ -5,3 +5,6 @@ class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.payments'
     verbose_name = 'Pagamentos'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,256 @@
+"""
+Real-time payment status events.
+
+Payment status changes are published with PostgreSQL ``NOTIFY`` so every
+gunicorn worker (on any node) hears them. Each worker process keeps a single
+``LISTEN`` connection in a background thread and fans the notifications out
+to the checkout streams it is serving, so open streams do not each hold a
+database connection.
+
+On other databases (tests, local SQLite) publishing is a no-op and streams
+fall back to re-reading the payment status on every heartbeat.
+
+Streams run on gunicorn's (gthread) worker threads, so each open stream
+occupies one thread for up to PAYMENT_EVENTS_TIMEOUT. Only
+PAYMENT_EVENTS_MAX_STREAMS streams are served per process; beyond that the
+endpoint answers 503 with Retry-After, and the checkout page reads the
+(ETag/304) status endpoint once and reconnects with exponential backoff.
+Streams do not keep a database connection open between status reads.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_EVENTS_CHANNEL = 'payment_events'
+PAID_STATUSES = ['CONFIRMED', 'RECEIVED']
+
+
+def notifications_supported():
+    """LISTEN/NOTIFY is only available on PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def publish_payment_status(payment):
+    """Publish a payment status change once the current transaction commits."""
+    if not notifications_supported():
+        return
+
+    payload = json.dumps({
+        'payment_id': payment.id,
+        'enrollment_id': payment.enrollment_id,
+        'status': payment.status,
+        'paid_at': payment.paid_at,
+    }, cls=DjangoJSONEncoder)
+
+    def notify():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [PAYMENT_EVENTS_CHANNEL, payload])
+
+    transaction.on_commit(notify)
+
+
+class PaymentEventHub:
+    """
+    Per-process fan-out of payment notifications to subscriber queues.
+
+    The listener thread starts lazily on the first subscription, i.e. after
+    gunicorn has forked the worker.
+    """
+
+    reconnect_delay = 5
+    select_timeout = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._thread = None
+
+    def subscribe(self, payment_id):
+        """Register interest in a payment and return the queue events arrive on."""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers[payment_id].add(events)
+            if notifications_supported() and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='payment-events-listener',
+                    daemon=True,
+                )
+                self._thread.start()
+        return events
+
+    def unsubscribe(self, payment_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(payment_id)
+            if subscribers is None:
+                return
+            subscribers.discard(events)
+            if not subscribers:
+                del self._subscribers[payment_id]
+
+    def dispatch(self, payload):
+        """Deliver a decoded notification to the subscribers of its payment."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(payload.get('payment_id'), ()))
+        for events in subscribers:
+            events.put(payload)
+
+    def _open_connection(self):
+        wrapper = connections['default']
+        raw_connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        raw_connection.autocommit = True
+        with raw_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {PAYMENT_EVENTS_CHANNEL}')
+        return raw_connection
+
+    def _run(self):
+        while True:
+            raw_connection = None
+            try:
+                raw_connection = self._open_connection()
+                while True:
+                    ready, _, _ = select.select([raw_connection], [], [], self.select_timeout)
+                    if not ready:
+                        continue
+                    raw_connection.poll()
+                    while raw_connection.notifies:
+                        notification = raw_connection.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(notification.payload))
+                        except ValueError:
+                            logger.warning(f'Invalid payment event payload: {notification.payload}')
+            except Exception as e:
+                logger.error(f'Payment events listener error: {e}')
+            finally:
+                if raw_connection is not None:
+                    try:
+                        raw_connection.close()
+                    except Exception:
+                        pass
+            time.sleep(self.reconnect_delay)
+
+
+hub = PaymentEventHub()
+
+
+class StreamSlots:
+    """Per-process cap on concurrently open payment event streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = 0
+
+    def acquire(self):
+        """Take a slot; returns False when PAYMENT_EVENTS_MAX_STREAMS are open."""
+        with self._lock:
+            if self._open >= settings.PAYMENT_EVENTS_MAX_STREAMS:
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._open = max(self._open - 1, 0)
+
+
+stream_slots = StreamSlots()
+
+
+class SlotStream:
+    """
+    Streaming response content that gives its slot back when closed.
+
+    Django closes the content when the response ends, including when the
+    client disconnects before the generator ever started.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._released = False
+
+    def __iter__(self):
+        return self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                stream_slots.release()
+
+
+def release_connection():
+    """Return this thread's database connection between status reads."""
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def format_sse(event, data):
+    """Format a Server-Sent Events message."""
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def payment_event_stream(payment_id, fetch_status, timeout=None, heartbeat=None):
+    """
+    Yield SSE messages for a payment until it is paid or the timeout expires.
+
+    Args:
+        payment_id: Payment primary key
+        fetch_status: Callable returning the payment's current status dict
+        timeout: Seconds to keep the stream open
+        heartbeat: Seconds between keep-alive comments / status re-checks
+    """
+    timeout = settings.PAYMENT_EVENTS_TIMEOUT if timeout is None else timeout
+    heartbeat = settings.PAYMENT_EVENTS_HEARTBEAT if heartbeat is None else heartbeat
+
+    yield 'retry: 3000\n\n'
+
+    events = hub.subscribe(payment_id)
+    try:
+        # Read the status after subscribing so a change between the two
+        # cannot be missed.
+        current = fetch_status()
+        yield format_sse('status', current)
+        if current['status'] in PAID_STATUSES:
+            return
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                payload = events.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                # Safety net for missed notifications (and the only source
+                # of updates on databases without LISTEN/NOTIFY).
+                latest = fetch_status()
+                if latest['status'] != current['status']:
+                    current = latest
+                    yield format_sse('status', current)
+                    if current['status'] in PAID_STATUSES:
+                        return
+                else:
+                    yield ': keep-alive\n\n'
+                continue
+
+            current = {**current, 'status': payload['status'], 'paid_at': payload.get('paid_at')}
+            yield format_sse('status', current)
+            if current['status'] in PAID_STATUSES:
+                return
+
+        yield format_sse('timeout', {'id': payment_id})
+    finally:
+        hub.unsubscribe(payment_id, events)
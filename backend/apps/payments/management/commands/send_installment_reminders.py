@@ -0,0 +1,68 @@
+"""
+Management command to remind participants of upcoming PIX installments.
+
+Runs as the ``reminders`` Procfile process (--watch); safe to re-run (see
+apps.payments.reminders). Reminders are only queued: the ``emails`` process
+sends them, so a single sender stays within the provider's rate limit.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.enrollments.email_service import BATCH_LIMIT
+from apps.enrollments.outbox import send_due_emails
+from apps.payments.reminders import TEMPLATE, queue_installment_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue reminders for PIX installments due in N days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.INSTALLMENT_REMINDER_DAYS,
+            help='Remind installments due this many days from today',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.EMAIL_OUTBOX_WORKERS,
+            help='Batch requests sent in parallel',
+        )
+        parser.add_argument(
+            '--send',
+            action='store_true',
+            help='Also send the queued reminders (only when send_emails is not running)',
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and queue reminders every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=3600,
+            help='Seconds between runs with --watch (picks up the new day soon after midnight)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            queued, skipped = queue_installment_reminders(options['days'])
+            if queued or not options['watch']:
+                self.stdout.write(f'{queued} reminder(s) queued, {skipped} already reminded')
+
+            if options['send']:
+                sent, failed = send_due_emails(
+                    workers=options['workers'],
+                    batch_size=BATCH_LIMIT * options['workers'],
+                    template=TEMPLATE,
+                )
+                self.stdout.write(self.style.SUCCESS(f'✓ {sent} reminder(s) sent, {failed} failed'))
+
+            if not options['watch']:
+                return
+
+            time.sleep(max(options['interval'], 1))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0005_add_settings_model'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'due_date'], name='payments_pa_status_0d3455_idx'),
+        ),
+    ]
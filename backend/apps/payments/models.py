@@ -111,6 +111,7 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['enrollment', 'status']),
             models.Index(fields=['asaas_payment_id']),
+            models.Index(fields=['status', 'due_date']),
         ]
     
     def __str__(self):
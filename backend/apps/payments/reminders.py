@@ -0,0 +1,85 @@
+"""
+Installment reminders.
+
+``python manage.py send_installment_reminders --watch`` runs as the
+``reminders`` Procfile process. Every hour it queues a reminder in the email
+outbox for every unpaid PIX installment due in INSTALLMENT_REMINDER_DAYS
+days; the ``emails`` process sends them in provider batches.
+
+The outbox row is the sent marker: its key holds the payment, the due date
+and the offset, so running the job twice (or again after a crash) never
+reminds anyone twice, while a payment whose due date moves gets a new
+reminder. Candidates come from the (status, due_date) index and are
+queued in chunks with one lookup and one INSERT per chunk.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from apps.enrollments.models import EmailOutbox, Enrollment
+from apps.enrollments.outbox import queue_emails
+
+from .models import Payment
+
+TEMPLATE = 'installment_reminder'
+# Installments not paid yet (later installments stay CREATED until issued)
+REMINDER_STATUSES = ['CREATED', 'PENDING']
+CHUNK_SIZE = 1000
+
+
+def due_installments(due_date):
+    """Unpaid PIX installments of active enrollments due on ``due_date``."""
+    return Payment.objects.filter(
+        status__in=REMINDER_STATUSES,
+        due_date=due_date,
+        enrollment__payment_method='PIX_INSTALLMENT',
+        enrollment__status__in=Enrollment.SEAT_HOLDING_STATUSES,
+    )
+
+
+def reminder_key(payment_id, due_date, days_before):
+    return f'payment:{payment_id}:{due_date.isoformat()}:{days_before}d'
+
+
+def queue_installment_reminders(days_before, today=None, chunk_size=CHUNK_SIZE):
+    """
+    Queue reminders for the installments due ``days_before`` days from today.
+
+    Returns:
+        Tuple of (queued, skipped) where skipped were already reminded
+    """
+    today = today or timezone.localdate()
+    due_date = today + timedelta(days=days_before)
+    rows = due_installments(due_date).order_by('id').values_list(
+        'id', 'enrollment__participant_email', 'enrollment__user__email'
+    )
+
+    queued = skipped = 0
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            added = _queue_chunk(chunk, due_date, days_before)
+            queued += added
+            skipped += len(chunk) - added
+            chunk = []
+    if chunk:
+        added = _queue_chunk(chunk, due_date, days_before)
+        queued += added
+        skipped += len(chunk) - added
+    return queued, skipped
+
+
+def _queue_chunk(rows, due_date, days_before):
+    keys = {payment_id: reminder_key(payment_id, due_date, days_before) for payment_id, _, _ in rows}
+    reminded = set(
+        EmailOutbox.objects.filter(template=TEMPLATE, object_key__in=keys.values())
+        .values_list('object_key', flat=True)
+    )
+    messages = [
+        (participant_email or user_email, keys[payment_id], {'payment_id': payment_id})
+        for payment_id, participant_email, user_email in rows
+        if keys[payment_id] not in reminded
+    ]
+    queue_emails(TEMPLATE, messages)
+    return len(messages)
@@ -72,13 +72,7 @@ class PaymentCreateSerializer(serializers.Serializer):
         
         if payment_method in ['PIX_INSTALLMENT', 'CREDIT_CARD']:
             # Get max installments from coupon or global settings
-            from apps.enrollments.models import Settings
-            
-            if enrollment.coupon and enrollment.coupon.enable_12x_installments:
-                max_installments = enrollment.coupon.max_installments
-            else:
-                settings = Settings.get_settings()
-                max_installments = settings.max_installments
+            max_installments = enrollment.get_max_installments()
             
             if installments > max_installments:
                 raise serializers.ValidationError({
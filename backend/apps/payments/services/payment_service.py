@@ -54,13 +54,11 @@ class PaymentService:
         
         # Create customer in Asaas
         # Get CPF from enrollment form_data first (more recent), then from profile
-        cpf = None
-        
         # Try to get from latest enrollment first
         from apps.enrollments.models import Enrollment
-        enrollment = Enrollment.objects.filter(user=user).order_by('-created_at').first()
-        if enrollment and enrollment.form_data:
-            cpf = enrollment.form_data.get('cpf', '')
+        cpf = Enrollment.objects.filter(user=user).exclude(
+            participant_cpf=''
+        ).order_by('-created_at').values_list('participant_cpf', flat=True).first()
         
         # If not found in enrollment, use profile CPF
         if not cpf:
@@ -265,17 +263,9 @@ class PaymentService:
         # Prepare holder info from enrollment form_data
         form_data = enrollment.form_data or {}
         
-        # Normalize phone (remove non-digits)
-        phone = form_data.get('telefone', '')
-        if phone:
-            import re
-            phone = re.sub(r'\D', '', phone)
-        
-        # Normalize CPF (remove non-digits)
-        cpf = form_data.get('cpf', '')
-        if cpf:
-            import re
-            cpf = re.sub(r'\D', '', cpf)
+        # Phone and CPF are stored digits-only in promoted columns
+        phone = enrollment.participant_phone
+        cpf = enrollment.participant_cpf
         
         # Normalize CEP (remove non-digits)
         cep = form_data.get('cep', '')
@@ -284,7 +274,7 @@ class PaymentService:
             cep = re.sub(r'\D', '', cep)
         
         holder_info = {
-            'name': enrollment.user.get_full_name() or form_data.get('nome_completo') or enrollment.user.email,
+            'name': enrollment.user.get_full_name() or enrollment.participant_name or enrollment.user.email,
             'email': enrollment.user.email,
             'cpfCnpj': cpf,
             'postalCode': cep or '01310100',  # Usa CEP do formulário ou padrão
@@ -365,6 +355,7 @@ class PaymentService:
         payment.save()
         return payment
     
+    @transaction.atomic
     def process_webhook(self, webhook_data: Dict) -> None:
         """
         Process Asaas webhook event.
@@ -419,12 +410,9 @@ class PaymentService:
                     enrollment.paid_at = timezone.now()
                 enrollment.save()
                 
-                # Send payment confirmation email
-                try:
-                    from apps.enrollments.email_service import send_payment_confirmation_email
-                    send_payment_confirmation_email(enrollment)
-                except Exception as e:
-                    print(f"Erro ao enviar email de confirmação de pagamento: {e}")
+                # Queue payment confirmation email (sent by the outbox worker)
+                from apps.enrollments.outbox import queue_enrollment_email
+                queue_enrollment_email('payment_confirmation', enrollment)
     
     def _send_payment_confirmation_email(self, payment: 'Payment') -> None:
         """Send payment confirmation email to user."""
@@ -0,0 +1,16 @@
+"""
+Payment signal handlers.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .events import publish_payment_status
+from .models import Payment
+
+
+@receiver(post_save, sender=Payment)
+def publish_payment_status_change(sender, instance, created, update_fields=None, **kwargs):
+    """Notify open checkout streams whenever a payment status is written."""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    publish_payment_status(instance)
@@ -1,16 +1,19 @@
 from decimal import Decimal
-from datetime import timedelta
+from datetime import date, timedelta
+from io import StringIO
 from unittest.mock import patch, MagicMock
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
 from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from apps.enrollments.models import Enrollment
+from apps.enrollments.models import EmailOutbox, Enrollment, Settings
 from apps.payments.models import Payment
+from apps.payments.reminders import queue_installment_reminders
 from apps.products.models import Batch, Product
 
 
@@ -143,6 +146,110 @@ class PaymentSecurityTests(APITestCase):
         self.assertEqual(response.data['asaas_payment_id'], 'pay-created-1')
         self.assertEqual(response.data['enrollment']['id'], self.owner_enrollment.id)
 
+    def test_payment_status_supports_conditional_requests(self):
+        self.client.force_authenticate(user=self.owner)
+        url = reverse('payments:payment-payment-status', args=[self.owner_payment.id])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'PENDING')
+        self.assertEqual(response.data['enrollment_status'], 'PENDING_PAYMENT')
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        self.owner_payment.status = 'RECEIVED'
+        self.owner_payment.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'RECEIVED')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_payment_status_hides_other_users_payments(self):
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get(
+            reverse('payments:payment-payment-status', args=[self.other_payment.id])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_payment_events_stream_ends_when_payment_is_paid(self):
+        self.owner_payment.status = 'RECEIVED'
+        self.owner_payment.save()
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get(
+            reverse('payments:payment-payment-events', args=[self.owner_payment.id]),
+            HTTP_ACCEPT='text/event-stream',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: status', body)
+        self.assertIn('"status": "RECEIVED"', body)
+        self.assertNotIn('event: timeout', body)
+
+    @override_settings(PAYMENT_EVENTS_TIMEOUT=0)
+    def test_payment_events_stream_times_out_while_pending(self):
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get(
+            reverse('payments:payment-payment-events', args=[self.owner_payment.id]),
+            HTTP_ACCEPT='text/event-stream',
+        )
+
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('"status": "PENDING"', body)
+        self.assertIn('event: timeout', body)
+
+    def test_payment_events_stream_picks_up_status_change(self):
+        from apps.payments.events import payment_event_stream
+
+        statuses = iter(['PENDING', 'CONFIRMED'])
+
+        def fetch_status():
+            return {'id': self.owner_payment.id, 'status': next(statuses), 'paid_at': None}
+
+        messages = list(payment_event_stream(
+            self.owner_payment.id, fetch_status, timeout=5, heartbeat=0.01
+        ))
+
+        self.assertIn('"status": "CONFIRMED"', messages[-1])
+
+    @override_settings(PAYMENT_EVENTS_TIMEOUT=0, PAYMENT_EVENTS_MAX_STREAMS=1)
+    def test_payment_events_are_capped_per_process(self):
+        self.client.force_authenticate(user=self.owner)
+        url = reverse('payments:payment-payment-events', args=[self.owner_payment.id])
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(second.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(second['Retry-After'], '5')
+
+        # Finishing the open stream frees its slot
+        b''.join(first.streaming_content)
+        third = self.client.get(url)
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        third.close()
+
+    def test_payment_events_hides_other_users_payments(self):
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get(
+            reverse('payments:payment-payment-events', args=[self.other_payment.id])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_payment_rejects_other_users_enrollment(self):
         self.client.force_authenticate(user=self.owner)
 
@@ -190,6 +297,34 @@ class PaymentSecurityTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['final_amount'], 100.0)
 
+    def test_payment_quote_lists_every_method_and_installment_count(self):
+        Settings.get_settings()
+        self.client.force_authenticate(user=self.owner)
+        url = reverse('payments:quote', args=[self.owner_enrollment.id])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        methods = {method['payment_method']: method for method in response.data['methods']}
+        self.assertEqual(response.data['max_installments'], 6)
+        self.assertEqual([o['installments'] for o in methods['PIX_CASH']['options']], [1])
+        self.assertEqual([o['installments'] for o in methods['PIX_INSTALLMENT']['options']], [2, 3, 4, 5, 6])
+        self.assertEqual(len(methods['CREDIT_CARD']['options']), 6)
+        self.assertEqual(methods['CREDIT_CARD']['final_amount'], 130.0)
+        self.assertEqual(methods['PIX_INSTALLMENT']['options'][1]['installment_value'], 40.0)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_payment_quote_rejects_other_users_enrollment(self):
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.get(reverse('payments:quote', args=[self.other_enrollment.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_simulate_pix_is_hidden_outside_debug(self):
         with override_settings(DEBUG=False):
             response = self.client.post(
@@ -240,3 +375,88 @@ class PaymentSecurityTests(APITestCase):
         self.assertEqual(recreated.pix_copy_paste, 'pix-copy-paste')
         self.assertEqual(recreated.due_date, timezone.now().date() + timedelta(days=3))
         self.assertEqual(recreated.raw_webhook_data['created']['id'], 'pay-owner-reissued')
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class InstallmentReminderTests(APITestCase):
+    def setUp(self):
+        self.today = date(2026, 3, 10)
+        self.due_date = self.today + timedelta(days=3)
+        self.product = Product.objects.create(name='Acampamento Teste', base_price=Decimal('100.00'))
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote 1',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.payments = [self.create_installment(f'user{index}@example.com') for index in range(3)]
+
+    def create_installment(self, email, payment_method='PIX_INSTALLMENT', status='CREATED', due_date=None):
+        enrollment = Enrollment.objects.create(
+            user=User.objects.create_user(email=email, password='password123'),
+            product=self.product,
+            batch=self.batch,
+            payment_method=payment_method,
+            installments=3,
+            total_amount=Decimal('120.00'),
+            final_amount=Decimal('120.00'),
+        )
+        return Payment.objects.create(
+            enrollment=enrollment,
+            amount=Decimal('40.00'),
+            installment_number=2,
+            status=status,
+            due_date=due_date or self.due_date,
+        )
+
+    def test_only_unpaid_pix_installments_due_in_n_days_are_queued_once(self):
+        self.create_installment('paid@example.com', status='RECEIVED')
+        self.create_installment('card@example.com', payment_method='CREDIT_CARD')
+        self.create_installment('later@example.com', due_date=self.due_date + timedelta(days=1))
+
+        self.assertEqual(queue_installment_reminders(3, today=self.today), (3, 0))
+        self.assertEqual(queue_installment_reminders(3, today=self.today, chunk_size=2), (0, 3))
+
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('recipient', flat=True)),
+            {'user0@example.com', 'user1@example.com', 'user2@example.com'},
+        )
+
+    @patch('apps.enrollments.email_service.deliver_batch')
+    def test_command_sends_reminders_in_provider_batches(self, mock_deliver_batch):
+        mock_deliver_batch.side_effect = lambda messages: [f'msg-{index}' for index in range(len(messages))]
+
+        with patch('apps.payments.reminders.timezone.localdate', return_value=self.today):
+            call_command('send_installment_reminders', '--days', '3', '--send', '--workers', '1', stdout=StringIO())
+
+        mock_deliver_batch.assert_called_once()
+        messages = mock_deliver_batch.call_args[0][0]
+        self.assertEqual(len(messages), 3)
+        self.assertIn('13/03/2026', messages[0]['html'])
+        self.assertEqual(EmailOutbox.objects.filter(status='SENT').count(), 3)
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('provider_message_id', flat=True)),
+            {'msg-0', 'msg-1', 'msg-2'},
+        )
+
+    @patch('apps.enrollments.email_service.deliver_batch')
+    def test_command_only_queues_by_default(self, mock_deliver_batch):
+        with patch('apps.payments.reminders.timezone.localdate', return_value=self.today):
+            call_command('send_installment_reminders', '--days', '3', stdout=StringIO())
+
+        mock_deliver_batch.assert_not_called()
+        self.assertEqual(EmailOutbox.objects.filter(status='PENDING').count(), 3)
+
+    @patch('apps.enrollments.email_service.deliver_batch', side_effect=RuntimeError('provider down'))
+    def test_failed_batch_is_rescheduled(self, mock_deliver_batch):
+        with patch('apps.payments.reminders.timezone.localdate', return_value=self.today):
+            call_command('send_installment_reminders', '--send', '--workers', '1', stdout=StringIO())
+
+        self.assertEqual(
+            list(EmailOutbox.objects.values_list('status', 'attempts', 'last_error').order_by().distinct()),
+            [('PENDING', 1, 'provider down')],
+        )
@@ -1,14 +1,20 @@
 """
 Payment views.
 """
+from decimal import Decimal
+
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 from .models import Payment
 from .serializers import (
     PaymentSerializer,
@@ -16,6 +22,16 @@ from .serializers import (
     PaymentListSerializer
 )
 from .services import PaymentService
+from .events import SlotStream, payment_event_stream, release_connection, stream_slots
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream for streaming endpoints."""
+    media_type = 'text/event-stream'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -57,6 +73,104 @@ class PaymentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=True, methods=['get'], url_path='status')
+    def payment_status(self, request, pk=None):
+        """
+        Lightweight status check for checkout polling.
+
+        Returns only status fields and supports conditional requests: the
+        ETag/Last-Modified come from the payment and enrollment updated_at,
+        so unchanged polls get an empty 304.
+        """
+        row = self.get_queryset().filter(pk=pk).values(
+            'id',
+            'status',
+            'paid_at',
+            'updated_at',
+            'enrollment_id',
+            'enrollment__status',
+            'enrollment__updated_at',
+        ).first()
+        if row is None:
+            raise Http404
+
+        last_modified = max(row['updated_at'], row['enrollment__updated_at'])
+        etag = quote_etag('{}-{}-{}'.format(
+            row['id'],
+            int(row['updated_at'].timestamp() * 1000000),
+            int(row['enrollment__updated_at'].timestamp() * 1000000),
+        ))
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            not_modified = etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            not_modified = bool(if_modified_since) and int(last_modified.timestamp()) <= if_modified_since
+
+        if not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({
+                'id': row['id'],
+                'status': row['status'],
+                'paid_at': row['paid_at'],
+                'updated_at': row['updated_at'],
+                'enrollment_id': row['enrollment_id'],
+                'enrollment_status': row['enrollment__status'],
+            })
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Browsers must revalidate every poll, but can reuse the body on 304.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='events',
+        renderer_classes=[JSONRenderer, EventStreamRenderer],
+    )
+    def payment_events(self, request, pk=None):
+        """
+        Server-Sent Events stream for a single payment.
+
+        Sends the current status immediately, then a 'status' event whenever
+        the payment changes (pushed via PostgreSQL LISTEN/NOTIFY), keep-alive
+        comments in between, and a final 'timeout' event when the stream
+        expires; clients reconnect after that.
+        """
+        queryset = self.get_queryset().filter(pk=pk)
+        if not queryset.exists():
+            raise Http404
+
+        if not stream_slots.acquire():
+            # Every stream pins a worker thread: past the cap, clients check
+            # the status endpoint and reconnect after Retry-After.
+            response = Response(
+                {'detail': 'Muitas conexões abertas. Consulte o status do pagamento.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = str(settings.PAYMENT_EVENTS_RETRY_AFTER)
+            return response
+
+        def fetch_status():
+            try:
+                return queryset.values('id', 'status', 'paid_at', 'enrollment_id').get()
+            finally:
+                release_connection()
+
+        response = StreamingHttpResponse(
+            SlotStream(payment_event_stream(int(pk), fetch_status)),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Ask reverse proxies (nginx and friends) not to buffer the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AsaasWebhookView(APIView):
@@ -224,3 +338,87 @@ def calculate_payment(request):
         'installments': installments,
         'installment_value': float(installment_value),
     })
+
+
+# Installment counts offered per payment method (upper bound is the
+# enrollment's max installments); mirrors the checkout UI.
+QUOTE_MIN_INSTALLMENTS = {
+    'PIX_CASH': None,  # always 1x
+    'PIX_INSTALLMENT': 2,
+    'CREDIT_CARD': 1,
+}
+
+
+def build_payment_quote(enrollment):
+    """Amounts for every payment method and allowed installment count."""
+    max_installments = enrollment.get_max_installments()
+    methods = []
+    for payment_method, min_installments in QUOTE_MIN_INSTALLMENTS.items():
+        total_amount, discount_amount, final_amount = enrollment.quote_amounts(payment_method)
+        counts = [1] if min_installments is None else range(min_installments, max_installments + 1)
+        methods.append({
+            'payment_method': payment_method,
+            'original_amount': float(total_amount),
+            'discount_amount': float(discount_amount),
+            'final_amount': float(final_amount),
+            'options': [
+                {
+                    'installments': count,
+                    'installment_value': float((final_amount / count).quantize(Decimal('0.01'))),
+                }
+                for count in counts
+            ],
+        })
+
+    return {
+        'enrollment_id': enrollment.id,
+        'coupon_code': enrollment.coupon.code if enrollment.coupon else None,
+        'max_installments': max_installments,
+        'methods': methods,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def payment_quote(request, enrollment_id):
+    """
+    Full checkout quote for an enrollment: every payment method with each
+    allowed installment count.
+
+    Loaded with a single query (Settings comes from its cache). The ETag
+    changes whenever the enrollment, its batch, its coupon or the global
+    Settings change, so the client can keep the quote and revalidate it.
+    """
+    from apps.enrollments.models import Enrollment, Settings
+
+    enrollment = Enrollment.objects.select_related('batch', 'coupon').filter(pk=enrollment_id).first()
+    if enrollment is None:
+        return Response(
+            {'detail': 'Inscrição não encontrada'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if not (request.user.is_staff or request.user.is_superuser or enrollment.user_id == request.user.id):
+        raise PermissionDenied('Você não tem permissão para consultar esta inscrição.')
+
+    versions = [
+        enrollment.updated_at,
+        enrollment.batch.updated_at,
+        enrollment.coupon.updated_at if enrollment.coupon else None,
+        Settings.get_settings().updated_at,
+    ]
+    etag = quote_etag('quote-{}-{}'.format(
+        enrollment.id,
+        '-'.join(str(int(version.timestamp() * 1000000)) if version else '0' for version in versions),
+    ))
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(build_payment_quote(enrollment))
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
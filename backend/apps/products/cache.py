@@ -0,0 +1,118 @@
+"""
+Caching for the public product catalog.
+
+Catalog responses are cached under a version number that is bumped whenever
+a Product or Batch is saved or deleted, so one increment invalidates every
+list, detail and active-batch payload at once. Entries never outlive the
+next batch start/end boundary, because the active batch (and prices shown)
+change at those instants without any write to the database.
+
+Concurrent misses for the same key are coalesced: one request rebuilds the
+payload while the others wait briefly for it instead of all hitting the
+database.
+
+The version only invalidates other processes when the cache is shared
+(REDIS_URL). With the per-process LocMem fallback, a process that did not
+handle the write keeps serving its entries for up to CATALOG_CACHE_TIMEOUT
+seconds; the products.W001 check warns about this outside DEBUG.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+CATALOG_VERSION_KEY = 'catalog:version'
+REBUILD_LOCK_TIMEOUT = 10  # seconds
+COALESCE_WAIT = 2.0  # seconds a request waits for another one's rebuild
+COALESCE_POLL_INTERVAL = 0.05
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_catalog():
+    """Invalidate every cached catalog payload."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+
+
+def seconds_until_next_batch_boundary():
+    """Seconds until the next batch start_date/end_date, or None if none is upcoming."""
+    from .models import Batch
+
+    now = timezone.now()
+    boundaries = Batch.objects.aggregate(
+        next_start=Min('start_date', filter=Q(start_date__gt=now)),
+        next_end=Min('end_date', filter=Q(end_date__gt=now)),
+    )
+    upcoming = [value for value in boundaries.values() if value is not None]
+    if not upcoming:
+        return None
+    return max(1, int((min(upcoming) - now).total_seconds()) + 1)
+
+
+def catalog_cache_key(*parts):
+    raw = ':'.join(str(part) for part in parts)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'catalog:v{get_catalog_version()}:{digest}'
+
+
+def get_or_build(key, builder, cacheable=None):
+    """
+    Return the cached payload for key, building it on a miss.
+
+    Only one caller rebuilds a missing key at a time; the others poll the
+    cache for up to COALESCE_WAIT seconds before building it themselves.
+    Payloads for which cacheable(payload) is false are returned but not
+    stored.
+    """
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    acquired = cache.add(lock_key, token, timeout=REBUILD_LOCK_TIMEOUT)
+    if not acquired:
+        deadline = time.monotonic() + COALESCE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(COALESCE_POLL_INTERVAL)
+            payload = cache.get(key)
+            if payload is not None:
+                return payload
+
+    try:
+        payload = builder()
+        if cacheable is None or cacheable(payload):
+            timeout = settings.CATALOG_CACHE_TIMEOUT
+            boundary = seconds_until_next_batch_boundary()
+            if boundary is not None:
+                timeout = min(timeout, boundary)
+            cache.set(key, payload, timeout=timeout)
+        return payload
+    finally:
+        # Only release our own lock: it may have expired during a slow
+        # build and been taken by another caller since.
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def set_catalog_cache_headers(response):
+    """Let browsers and CDNs absorb catalog traffic for a short while."""
+    response['Cache-Control'] = (
+        f'public, max-age={settings.CATALOG_BROWSER_MAX_AGE}, '
+        f's-maxage={settings.CATALOG_CACHE_TIMEOUT}, '
+        f'stale-while-revalidate={settings.CATALOG_BROWSER_MAX_AGE}'
+    )
+    return response
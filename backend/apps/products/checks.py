@@ -0,0 +1,22 @@
+"""
+System checks for product settings.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_catalog_cache(app_configs, **kwargs):
+    if not settings.DEBUG and not settings.CACHE_IS_SHARED:
+        return [
+            Warning(
+                'The catalog cache is not shared between processes.',
+                hint=(
+                    'Set REDIS_URL: without it catalog changes only invalidate the cache of the '
+                    'process that saved them, and the others serve stale payloads for up to '
+                    'CATALOG_CACHE_TIMEOUT seconds.'
+                ),
+                id='products.W001',
+            )
+        ]
+    return []
@@ -0,0 +1,75 @@
+"""
+Management command to write the static catalog snapshot.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.products.cache import get_catalog_version, seconds_until_next_batch_boundary
+from apps.products.snapshot import get_snapshot_dir, write_catalog_snapshot
+
+logger = logging.getLogger(__name__)
+
+ERROR_RETRY_DELAY = 10  # seconds
+
+
+class Command(BaseCommand):
+    help = 'Write the public catalog JSON snapshot served as a static file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and rebuild on catalog changes and at every batch start/end date',
+        )
+        parser.add_argument(
+            '--poll',
+            type=int,
+            default=5,
+            help='Seconds between catalog version checks with --watch',
+        )
+
+    def handle(self, *args, **options):
+        if not options['watch']:
+            name = write_catalog_snapshot()
+            self.stdout.write(
+                self.style.SUCCESS(f'Catalog snapshot written: {get_snapshot_dir()}/{name}')
+            )
+            return
+
+        # Nothing restarts this process (gunicorn starts it next to the
+        # workers), so errors such as a database or Redis restart are
+        # logged and retried instead of ending the loop.
+        while True:
+            try:
+                self.build_and_wait(options['poll'])
+            except Exception as e:
+                logger.exception(f'Catalog snapshot watcher failed: {e}')
+                close_old_connections()
+                time.sleep(ERROR_RETRY_DELAY)
+
+    def build_and_wait(self, poll):
+        version = get_catalog_version()
+        name = write_catalog_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(f'Catalog snapshot written: {get_snapshot_dir()}/{name}')
+        )
+
+        # Wake up at the next batch boundary, and at least often enough
+        # to refresh remaining seats before the snapshot expires.
+        delay = settings.CATALOG_SNAPSHOT_MAX_AGE // 2
+        boundary = seconds_until_next_batch_boundary()
+        if boundary is not None:
+            delay = min(delay, boundary)
+        deadline = time.monotonic() + max(delay, 1)
+
+        # Writes made by other processes (admin saves on another
+        # instance, the batches process) bump the shared catalog
+        # version; rebuild as soon as that is seen.
+        while time.monotonic() < deadline:
+            time.sleep(max(min(poll, deadline - time.monotonic()), 0))
+            if get_catalog_version() != version:
+                return
@@ -0,0 +1,45 @@
+"""
+Management command to apply scheduled batch status transitions.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.products.cache import seconds_until_next_batch_boundary
+from apps.products.transitions import update_batch_statuses
+
+
+class Command(BaseCommand):
+    help = 'Move batches to ACTIVE/FULL/ENDED at their start/end dates and capacity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and apply transitions at every batch boundary',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Maximum seconds between runs with --watch (catches sold out lotes)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            changes = update_batch_statuses()
+            changed = {status: count for status, count in changes.items() if count}
+            if changed:
+                summary = ', '.join(f'{count} → {status}' for status, count in changed.items())
+                self.stdout.write(self.style.SUCCESS(f'✓ Batch statuses updated: {summary}'))
+            elif not options['watch']:
+                self.stdout.write('No batch status changes')
+
+            if not options['watch']:
+                return
+
+            delay = options['interval']
+            boundary = seconds_until_next_batch_boundary()
+            if boundary is not None:
+                delay = min(delay, boundary)
+            time.sleep(max(delay, 1))
@@ -0,0 +1,48 @@
+"""
+Static file serving for the catalog snapshot.
+"""
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+
+from .snapshot import SNAPSHOT_FILENAME, get_snapshot_dir, get_snapshot_url_prefix
+
+
+class CatalogSnapshotWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also serves the catalog snapshot.
+
+    WhiteNoise indexes STATIC_ROOT once at startup, but snapshot files are
+    rewritten while the process runs, so requests under the snapshot prefix
+    are looked up on disk each time (a stat, no view and no database).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.snapshot_prefix = get_snapshot_url_prefix()
+        super().__init__(*args, **kwargs)
+
+    def __call__(self, request):
+        path = request.path_info
+        if path.startswith(self.snapshot_prefix):
+            static_file = self.find_snapshot_file(path)
+            if static_file is not None:
+                return self.serve(static_file, request)
+        return super().__call__(request)
+
+    def find_snapshot_file(self, url):
+        name = url[len(self.snapshot_prefix):]
+        if not name or '/' in name or name.startswith('.'):
+            return None
+        try:
+            return self.get_static_file(f'{get_snapshot_dir()}/{name}', url)
+        except (MissingFileError, OSError):
+            return None
+
+    def add_cache_headers(self, headers, path, url):
+        if url.startswith(self.snapshot_prefix):
+            if url.endswith('/' + SNAPSHOT_FILENAME):
+                headers['Cache-Control'] = f'public, max-age={settings.CATALOG_BROWSER_MAX_AGE}'
+            else:
+                headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return
+        super().add_cache_headers(headers, path, url)
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reserved_seats(apps, schema_editor):
+    Batch = apps.get_model('products', 'Batch')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    counts = (
+        Enrollment.objects.filter(status__in=['PENDING_PAYMENT', 'PAID'])
+        .values('batch_id')
+        .annotate(total=Count('id'))
+    )
+    for row in counts:
+        Batch.objects.filter(pk=row['batch_id']).update(reserved_seats=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_merge_20251113_0111'),
+        ('enrollments', '0008_promote_form_data_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='reserved_seats',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Inscrições ativas (aguardando pagamento ou pagas) neste lote', verbose_name='Vagas Reservadas'),
+        ),
+        migrations.RunPython(backfill_reserved_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-19 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_add_batch_reserved_seats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['product', 'status', 'start_date'], name='products_ba_product_a624e2_idx'),
+        ),
+    ]
@@ -2,6 +2,8 @@
 Product and Batch models with clean architecture.
 """
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -66,13 +68,21 @@ class Product(models.Model):
         return self.name
     
     def get_active_batch(self):
-        """Returns the currently active batch for this product."""
-        now = timezone.now()
-        return self.batches.filter(
-            status='ACTIVE',
-            start_date__lte=now,
-            end_date__gte=now
-        ).first()
+        """
+        Returns the currently active batch for this product.
+        
+        Batch status is kept current by update_batch_statuses (see
+        apps.products.transitions), so it is trusted without date checks.
+        """
+        if 'batches' in getattr(self, '_prefetched_objects_cache', {}):
+            # Reuse prefetch_related('batches') instead of issuing a query.
+            active = [batch for batch in self.batches.all() if batch.status == 'ACTIVE']
+            return min(active, key=lambda batch: batch.start_date) if active else None
+        return self.batches.filter(status='ACTIVE').order_by('start_date').first()
+
+
+class BatchFullError(Exception):
+    """Raised when a batch has no seats left."""
 
 
 class Batch(models.Model):
@@ -157,6 +167,13 @@ class Batch(models.Model):
         default='SCHEDULED'
     )
     
+    reserved_seats = models.PositiveIntegerField(
+        _('Vagas Reservadas'),
+        default=0,
+        editable=False,
+        help_text=_('Inscrições ativas (aguardando pagamento ou pagas) neste lote')
+    )
+    
     created_at = models.DateTimeField(_('Criado em'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Atualizado em'), auto_now=True)
     
@@ -165,6 +182,9 @@ class Batch(models.Model):
         verbose_name_plural = _('Lotes')
         ordering = ['start_date']
         unique_together = ['product', 'name']
+        indexes = [
+            models.Index(fields=['product', 'status', 'start_date']),
+        ]
     
     def __str__(self):
         return f'{self.product.name} - {self.name}'
@@ -172,14 +192,91 @@ class Batch(models.Model):
     @property
     def current_enrollments(self):
         """Returns the count of active enrollments in this batch (pending or paid)."""
-        return self.enrollments.filter(status__in=['PENDING_PAYMENT', 'PAID']).count()
+        return self.reserved_seats
     
     @property
     def is_full(self):
         """Check if batch has reached max enrollments."""
         if self.max_enrollments is None:
             return False
-        return self.current_enrollments >= self.max_enrollments
+        return self.reserved_seats >= self.max_enrollments
+    
+    @classmethod
+    def reserve_seat(cls, batch_id):
+        """
+        Take one seat with a single conditional UPDATE.
+        
+        The row lock taken by the UPDATE serializes concurrent sign-ups, so
+        max_enrollments can never be exceeded.
+        
+        Returns:
+            True if a seat was reserved, False if the batch is full
+        """
+        has_capacity = Q(max_enrollments__isnull=True) | Q(reserved_seats__lt=F('max_enrollments'))
+        return bool(cls._change_seats(batch_id, 1, has_capacity))
+    
+    @classmethod
+    def adjust_reserved_seats(cls, batch_id, delta):
+        """Add (or, with a negative delta, release) seats without checking capacity."""
+        cls._change_seats(batch_id, delta)
+    
+    @classmethod
+    def _change_seats(cls, batch_id, delta, condition=Q(), attempts=2):
+        """
+        Move reserved_seats by delta, flipping ACTIVE <-> FULL when needed.
+        
+        Changes that flip the status run as their own UPDATE so the catalog
+        (cache and snapshot) is told once they commit: bulk updates skip
+        the post_save handlers. The usual, non-flipping change stays a
+        single UPDATE.
+        
+        Returns:
+            Number of rows updated (0 or 1)
+        """
+        batches = cls.objects.filter(condition, pk=batch_id)
+        seats = Greatest(F('reserved_seats') + delta, 0)
+        flips = cls._capacity_flips(delta)
+        for _attempt in range(attempts):
+            updated = batches.exclude(flips).update(reserved_seats=seats)
+            if updated:
+                return updated
+            updated = batches.filter(flips).update(
+                reserved_seats=seats,
+                status=cls._capacity_status(delta),
+            )
+            if updated:
+                from .transitions import _notify_catalog_changed
+                _notify_catalog_changed()
+                return updated
+            # Neither matched: the row is gone, fails the condition, or
+            # changed between the two statements.
+        return 0
+    
+    @staticmethod
+    def _capacity_flips(delta):
+        """
+        Rows whose status flips ACTIVE <-> FULL when seats change by delta.
+        
+        Conditions see the row before the UPDATE, hence the explicit delta.
+        """
+        return Q(
+            status='ACTIVE',
+            max_enrollments__isnull=False,
+            max_enrollments__lte=F('reserved_seats') + delta,
+        ) | Q(
+            status='FULL',
+            max_enrollments__gt=F('reserved_seats') + delta,
+            end_date__gte=timezone.now(),
+        )
+    
+    @staticmethod
+    def _capacity_status(delta):
+        """Status expression for the rows matched by _capacity_flips(delta)."""
+        return Case(
+            When(status='ACTIVE', then=Value('FULL')),
+            When(status='FULL', then=Value('ACTIVE')),
+            default=F('status'),
+        )
     
     @property
     def is_active_now(self):
@@ -199,4 +296,12 @@ class Batch(models.Model):
         elif timezone.now() < self.start_date:
             self.status = 'SCHEDULED'
         
+        # reserved_seats is only ever changed with atomic UPDATEs; never
+        # write back a possibly stale in-memory value.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved_seats'
+            ]
+        
         super().save(*args, **kwargs)
@@ -1,14 +1,24 @@
 """
 Product serializers.
+
+Batch counts and active batches are memoized in the serializer context
+(shared by every row of a ``many=True`` serializer), so a list that repeats
+the same product/batch runs those queries once per request instead of once
+per row.
 """
 from rest_framework import serializers
 from .models import Product, Batch
 
 
+def _context_cache(serializer, name):
+    """Return a per-request memo dict stored in the root serializer context."""
+    return serializer.context.setdefault(name, {})
+
+
 class BatchSerializer(serializers.ModelSerializer):
     """Serializer for Batch model."""
     
-    current_enrollments = serializers.IntegerField(read_only=True)
+    current_enrollments = serializers.IntegerField(source='reserved_seats', read_only=True)
     is_full = serializers.BooleanField(read_only=True)
     
     class Meta:
@@ -32,7 +42,17 @@ class BatchSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     """Serializer for Product model."""
     
-    active_batch = BatchSerializer(read_only=True, source='get_active_batch')
+    active_batch = serializers.SerializerMethodField()
+    
+    def get_active_batch(self, obj):
+        """Serialize the product's active batch once per product per request."""
+        active_batches = _context_cache(self, '_active_batches')
+        if obj.pk not in active_batches:
+            batch = obj.get_active_batch()
+            active_batches[obj.pk] = (
+                BatchSerializer(batch, context=self.context).data if batch else None
+            )
+        return active_batches[obj.pk]
     
     class Meta:
         model = Product
@@ -0,0 +1,29 @@
+"""
+Product signal handlers.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog
+from .models import Batch, Product
+from .snapshot import refresh_catalog_snapshot
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Drop cached catalog responses once the change is committed."""
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Batch)
+@receiver(post_delete, sender=Batch)
+@receiver(post_save, sender='enrollments.Settings')
+def refresh_catalog_snapshot_on_change(sender, **kwargs):
+    """Rewrite the static catalog snapshot once the change is committed."""
+    transaction.on_commit(refresh_catalog_snapshot)
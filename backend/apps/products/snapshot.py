@@ -0,0 +1,184 @@
+"""
+Pre-rendered catalog snapshot.
+
+The landing page only needs the active products, their current batch prices
+and the installment limit, so that data is written as JSON under
+STATIC_ROOT and served by WhiteNoise (see CatalogSnapshotWhiteNoiseMiddleware) without
+running a view or touching the database.
+
+Each build writes an immutable ``catalog.<hash>.json`` plus ``catalog.json``
+pointing at the latest contents. ``valid_until`` is the next batch
+start/end date (capped by CATALOG_SNAPSHOT_MAX_AGE); clients fall back to
+the API once it has passed, so a missed rebuild never shows stale prices.
+
+Each web instance serves its own STATIC_ROOT, so gunicorn starts
+``build_catalog_snapshot --watch`` next to the workers (see gunicorn.conf.py).
+It rebuilds at batch boundaries and whenever the shared catalog version is
+bumped, which also covers changes made by other processes (e.g. batch
+transitions in the ``batches`` process).
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .cache import seconds_until_next_batch_boundary
+from .models import Batch, Product
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIRNAME = 'catalog'
+SNAPSHOT_FILENAME = 'catalog.json'
+KEEP_VERSIONS = 5
+
+
+def get_snapshot_dir():
+    return os.path.join(settings.STATIC_ROOT, SNAPSHOT_DIRNAME)
+
+
+def get_snapshot_url_prefix():
+    return f'{settings.STATIC_URL.rstrip("/")}/{SNAPSHOT_DIRNAME}/'
+
+
+def round_remaining_seats(remaining):
+    """Round down to CATALOG_SNAPSHOT_SEATS_STEP so the snapshot does not churn on every enrollment."""
+    step = settings.CATALOG_SNAPSHOT_SEATS_STEP
+    if remaining is None or remaining < step:
+        return remaining
+    return remaining - remaining % step
+
+
+def serialize_batch(batch):
+    remaining = None
+    if batch.max_enrollments is not None:
+        remaining = max(batch.max_enrollments - batch.reserved_seats, 0)
+    return {
+        'id': batch.id,
+        'name': batch.name,
+        'start_date': batch.start_date,
+        'end_date': batch.end_date,
+        'price': str(batch.price),
+        'pix_installment_price': str(batch.pix_installment_price),
+        'credit_card_price': str(batch.credit_card_price),
+        'max_enrollments': batch.max_enrollments,
+        'remaining_seats': round_remaining_seats(remaining),
+        'is_full': remaining == 0,
+        'status': batch.status,
+    }
+
+
+def build_catalog_snapshot():
+    """Return the snapshot payload for the currently active catalog."""
+    from apps.enrollments.models import Settings
+
+    now = timezone.now()
+    active_batches = Batch.objects.filter(status='ACTIVE').order_by('start_date')
+    products = Product.objects.filter(is_active=True).prefetch_related(
+        Prefetch('batches', queryset=active_batches, to_attr='active_batches')
+    )
+
+    serialized_products = []
+    for product in products:
+        active_batch = product.active_batches[0] if product.active_batches else None
+        serialized_products.append({
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'image': product.image.url if product.image else None,
+            'base_price': str(product.base_price),
+            'max_installments': product.max_installments,
+            'is_active': product.is_active,
+            'event_date': product.event_date,
+            'active_batch': serialize_batch(active_batch) if active_batch else None,
+        })
+
+    valid_until = now + timedelta(seconds=settings.CATALOG_SNAPSHOT_MAX_AGE)
+    boundary = seconds_until_next_batch_boundary()
+    if boundary is not None:
+        valid_until = min(valid_until, now + timedelta(seconds=boundary))
+
+    # Read from the database: on a Settings change this runs before the
+    # cached singleton is invalidated.
+    global_settings, _created = Settings.objects.get_or_create(pk=1)
+    return {
+        'generated_at': now,
+        'valid_until': valid_until,
+        'settings': {'max_installments': global_settings.max_installments},
+        'products': serialized_products,
+    }
+
+
+def _atomic_write(path, content):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _prune_versions(directory, current):
+    versions = sorted(
+        (
+            entry for entry in os.scandir(directory)
+            if entry.name.startswith('catalog.') and entry.name != SNAPSHOT_FILENAME
+            and entry.name != current
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in versions[KEEP_VERSIONS - 1:]:
+        os.remove(entry.path)
+
+
+def write_catalog_snapshot():
+    """
+    Build and write the snapshot files.
+
+    Returns:
+        Name of the versioned snapshot file
+    """
+    directory = get_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    payload = build_catalog_snapshot()
+    content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+    versioned_name = f'catalog.{version}.json'
+
+    payload['version'] = version
+    payload['url'] = f'{get_snapshot_url_prefix()}{versioned_name}'
+    content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+    _atomic_write(os.path.join(directory, versioned_name), content)
+    _atomic_write(os.path.join(directory, SNAPSHOT_FILENAME), content)
+    _prune_versions(directory, versioned_name)
+    return versioned_name
+
+
+def refresh_catalog_snapshot():
+    """
+    Rewrite the snapshot after a catalog change.
+
+    Only runs where static files have been collected (i.e. deployed
+    instances); failures are logged so they never break the admin save.
+    Other instances pick the change up through the catalog version.
+    """
+    if not os.path.isdir(settings.STATIC_ROOT):
+        return
+    try:
+        write_catalog_snapshot()
+    except Exception as e:
+        logger.error(f'Failed to write catalog snapshot: {e}')
@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.products.cache import get_catalog_version, get_or_build, invalidate_catalog, seconds_until_next_batch_boundary
+from apps.products.models import Batch, Product
+from apps.products.snapshot import write_catalog_snapshot
+from apps.products.transitions import update_batch_statuses
+
+
+class ProductCatalogCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.product = Product.objects.create(
+            name='Acampamento Teste',
+            description='Produto de teste',
+            base_price=Decimal('100.00'),
+            max_installments=8,
+            is_active=True,
+        )
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote 1',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(hours=2),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('110.00'),
+            credit_card_price=Decimal('120.00'),
+        )
+        self.detail_url = reverse('products:product-detail', args=[self.product.id])
+
+    def test_detail_is_served_from_cache(self):
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('public', first['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(second.data, first.data)
+
+    def test_saving_batch_invalidates_cache(self):
+        self.client.get(self.detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.credit_card_price = Decimal('150.00')
+            self.batch.save()
+
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['active_batch']['credit_card_price'], '150.00')
+
+    def test_deactivating_product_invalidates_list(self):
+        list_url = reverse('products:product-list')
+        self.assertEqual(len(self.client.get(list_url).data['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_active = False
+            self.product.save()
+
+        self.assertEqual(len(self.client.get(list_url).data['results']), 0)
+
+    def test_cache_lifetime_is_bounded_by_next_batch_boundary(self):
+        seconds = seconds_until_next_batch_boundary()
+        self.assertLessEqual(seconds, 2 * 60 * 60 + 1)
+        self.assertGreater(seconds, 2 * 60 * 60 - 60)
+
+    def test_missing_product_is_not_cached(self):
+        url = reverse('products:product-detail', args=[self.product.id + 1])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_active_batch_is_not_cached(self):
+        Batch.objects.filter(pk=self.batch.pk).update(status='ENDED')
+        url = reverse('products:product-active-batch', args=[self.product.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        Batch.objects.filter(pk=self.batch.pk).update(status='ACTIVE')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_rebuild_only_releases_its_own_lock(self):
+        def builder():
+            # Our lock expired mid-build and another caller took it
+            cache.set('key:lock', 'other', timeout=10)
+            return {'status': 200}
+
+        get_or_build('key', builder)
+        self.assertEqual(cache.get('key:lock'), 'other')
+
+
+class CatalogSnapshotTests(APITestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        override = override_settings(STATIC_ROOT=self.static_root, CATALOG_SNAPSHOT_SEATS_STEP=10)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        now = timezone.now()
+        self.product = Product.objects.create(
+            name='Acampamento Teste',
+            description='Produto de teste',
+            base_price=Decimal('100.00'),
+            max_installments=8,
+            is_active=True,
+        )
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote 1',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(hours=2),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('110.00'),
+            credit_card_price=Decimal('120.00'),
+            max_enrollments=57,
+        )
+
+    def read_snapshot(self, name='catalog.json'):
+        with open(os.path.join(self.static_root, 'catalog', name)) as f:
+            return json.load(f)
+
+    def test_snapshot_contains_active_batch_prices_and_rounded_seats(self):
+        versioned_name = write_catalog_snapshot()
+
+        snapshot = self.read_snapshot()
+        self.assertEqual(snapshot, self.read_snapshot(versioned_name))
+        batch = snapshot['products'][0]['active_batch']
+        self.assertEqual(batch['credit_card_price'], '120.00')
+        self.assertEqual(batch['remaining_seats'], 50)
+        self.assertIn('max_installments', snapshot['settings'])
+        self.assertLessEqual(parse_datetime(snapshot['valid_until']), self.batch.end_date)
+
+    def test_snapshot_is_rewritten_when_batch_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.price = Decimal('90.00')
+            self.batch.save()
+
+        self.assertEqual(self.read_snapshot()['products'][0]['active_batch']['price'], '90.00')
+
+    def test_snapshot_is_served_as_static_file(self):
+        write_catalog_snapshot()
+
+        response = self.client.get('/static/catalog/catalog.json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age', response['Cache-Control'])
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['products'][0]['id'], self.product.id)
+
+    def test_watcher_rebuilds_when_catalog_version_changes(self):
+        def change_from_another_process():
+            # Bulk update plus version bump, as batch transitions do
+            Batch.objects.filter(pk=self.batch.pk).update(price=Decimal('80.00'))
+            invalidate_catalog()
+
+        sleeps = [change_from_another_process, KeyboardInterrupt]
+
+        def sleep(seconds):
+            step = sleeps.pop(0)
+            if step is KeyboardInterrupt:
+                raise KeyboardInterrupt
+            step()
+
+        with mock.patch('apps.products.management.commands.build_catalog_snapshot.time.sleep', sleep):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('build_catalog_snapshot', '--watch', stdout=StringIO())
+
+        self.assertEqual(sleeps, [])
+        self.assertEqual(self.read_snapshot()['products'][0]['active_batch']['price'], '80.00')
+
+    def test_watcher_keeps_running_after_an_error(self):
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > 1:
+                raise KeyboardInterrupt
+
+        command = 'apps.products.management.commands.build_catalog_snapshot'
+        with mock.patch(f'{command}.time.sleep', sleep), \
+                mock.patch(f'{command}.write_catalog_snapshot', side_effect=[OSError('disk full'), 'catalog.json']) as write, \
+                self.assertLogs(command, level='ERROR'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('build_catalog_snapshot', '--watch', stdout=StringIO())
+
+        self.assertEqual(write.call_count, 2)
+
+
+class BatchStatusTransitionTests(APITestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = Product.objects.create(
+            name='Acampamento Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+
+    def create_batch(self, name, start, end, **kwargs):
+        return Batch.objects.create(
+            product=self.product,
+            name=name,
+            start_date=self.now + start,
+            end_date=self.now + end,
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('110.00'),
+            credit_card_price=Decimal('120.00'),
+            **kwargs
+        )
+
+    def test_statuses_follow_date_boundaries(self):
+        lote1 = self.create_batch('Lote 1', timedelta(days=-2), timedelta(hours=1))
+        lote2 = self.create_batch('Lote 2', timedelta(hours=1), timedelta(days=5))
+        self.assertEqual((lote1.status, lote2.status), ('ACTIVE', 'SCHEDULED'))
+
+        changes = update_batch_statuses(now=self.now + timedelta(hours=2))
+
+        self.assertEqual(changes['ENDED'], 1)
+        self.assertEqual(changes['ACTIVE'], 1)
+        lote1.refresh_from_db()
+        lote2.refresh_from_db()
+        self.assertEqual((lote1.status, lote2.status), ('ENDED', 'ACTIVE'))
+
+    def test_sold_out_lote_activates_next_one(self):
+        lote1 = self.create_batch('Lote 1', timedelta(days=-2), timedelta(days=2), max_enrollments=1)
+        lote2 = self.create_batch('Lote 2', timedelta(days=2), timedelta(days=5))
+
+        self.assertTrue(Batch.reserve_seat(lote1.id))
+        lote1.refresh_from_db()
+        self.assertEqual(lote1.status, 'FULL')
+
+        update_batch_statuses()
+
+        lote2.refresh_from_db()
+        self.assertEqual(lote2.status, 'ACTIVE')
+        self.assertEqual(self.product.get_active_batch(), lote2)
+
+    def test_released_seat_reopens_full_batch(self):
+        lote1 = self.create_batch('Lote 1', timedelta(days=-2), timedelta(days=2), max_enrollments=1)
+        Batch.reserve_seat(lote1.id)
+
+        Batch.adjust_reserved_seats(lote1.id, -1)
+
+        lote1.refresh_from_db()
+        self.assertEqual(lote1.status, 'ACTIVE')
+
+    def test_capacity_flips_invalidate_the_catalog(self):
+        cache.clear()
+        lote1 = self.create_batch('Lote 1', timedelta(days=-2), timedelta(days=2), max_enrollments=2)
+        unlimited = self.create_batch('Lote 2', timedelta(days=-2), timedelta(days=2))
+        version = get_catalog_version()
+
+        def change(action):
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+            lote1.refresh_from_db()
+            return get_catalog_version()
+
+        # Seats that do not change the status keep the cached catalog
+        self.assertEqual(change(lambda: Batch.reserve_seat(lote1.id)), version)
+        self.assertEqual(change(lambda: Batch.reserve_seat(unlimited.id)), version)
+
+        sold_out = change(lambda: Batch.reserve_seat(lote1.id))
+        self.assertEqual((lote1.status, lote1.reserved_seats), ('FULL', 2))
+        self.assertGreater(sold_out, version)
+        self.assertFalse(Batch.reserve_seat(lote1.id))
+
+        reopened = change(lambda: Batch.adjust_reserved_seats(lote1.id, -1))
+        self.assertEqual((lote1.status, lote1.reserved_seats), ('ACTIVE', 1))
+        self.assertGreater(reopened, sold_out)
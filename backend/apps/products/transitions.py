@@ -0,0 +1,93 @@
+"""
+Scheduled batch status transitions.
+
+Batch status is the single source of truth for readers (active batch
+lookups, catalog endpoints, snapshot). It is moved forward in bulk here:
+
+- SCHEDULED -> ACTIVE at start_date
+- SCHEDULED/ACTIVE/FULL -> ENDED at end_date
+- ACTIVE <-> FULL when capacity is reached/freed (also done immediately
+  by Batch.reserve_seat/adjust_reserved_seats)
+
+When a lote sells out, the next scheduled lote of the same product is
+activated right away (its start_date is moved to now).
+
+Run ``python manage.py update_batch_statuses --watch`` to apply transitions
+at each boundary.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Batch
+
+
+def update_batch_statuses(now=None):
+    """
+    Apply all due status transitions.
+
+    Returns:
+        Dict with the number of batches moved to each status
+    """
+    now = now or timezone.now()
+    has_capacity = Q(max_enrollments__isnull=True) | Q(reserved_seats__lt=F('max_enrollments'))
+    is_full = Q(max_enrollments__isnull=False, reserved_seats__gte=F('max_enrollments'))
+    in_window = Q(start_date__lte=now, end_date__gte=now)
+
+    with transaction.atomic():
+        changes = {
+            'ENDED': Batch.objects.filter(
+                end_date__lt=now,
+                status__in=['SCHEDULED', 'ACTIVE', 'FULL'],
+            ).update(status='ENDED', updated_at=now),
+            'FULL': Batch.objects.filter(
+                in_window, is_full, status__in=['SCHEDULED', 'ACTIVE'],
+            ).update(status='FULL', updated_at=now),
+            'ACTIVE': Batch.objects.filter(
+                in_window, has_capacity, status__in=['SCHEDULED', 'FULL'],
+            ).update(status='ACTIVE', updated_at=now),
+        }
+        changes['ACTIVE'] += activate_next_batches(now)
+
+    if any(changes.values()):
+        _notify_catalog_changed()
+    return changes
+
+
+def activate_next_batches(now):
+    """
+    Open the next lote of every product whose current lote sold out.
+
+    Returns:
+        Number of batches activated
+    """
+    sold_out_products = Batch.objects.filter(
+        status='FULL', end_date__gte=now,
+    ).exclude(
+        product__batches__status='ACTIVE',
+    ).values_list('product_id', flat=True).distinct()
+
+    activated = 0
+    for product_id in sold_out_products:
+        next_batch = Batch.objects.select_for_update().filter(
+            product_id=product_id,
+            status='SCHEDULED',
+            end_date__gt=now,
+        ).order_by('start_date').first()
+        if next_batch is None:
+            continue
+        activated += Batch.objects.filter(pk=next_batch.pk, status='SCHEDULED').update(
+            status='ACTIVE',
+            start_date=now,
+            updated_at=now,
+        )
+    return activated
+
+
+def _notify_catalog_changed():
+    # Bulk updates skip the post_save handlers that normally do this.
+    from .cache import invalidate_catalog
+    from .snapshot import refresh_catalog_snapshot
+
+    transaction.on_commit(invalidate_catalog)
+    transaction.on_commit(refresh_catalog_snapshot)
@@ -4,11 +4,39 @@ Product views.
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from .cache import catalog_cache_key, get_or_build, set_catalog_cache_headers
 from .models import Product, Batch
 from .serializers import ProductSerializer, ProductListSerializer, BatchSerializer
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class CachedCatalogMixin:
+    """
+    Serve read-only catalog endpoints from the catalog cache.
+
+    Payloads are keyed by the full request URL (pagination links are
+    absolute) and only successful responses are cached.
+    """
+
+    def cached_response(self, request, build):
+        def builder():
+            response = build()
+            return {'status': response.status_code, 'data': response.data}
+
+        key = catalog_cache_key(self.basename, self.action, request.build_absolute_uri())
+        payload = get_or_build(key, builder, cacheable=lambda payload: payload['status'] == 200)
+        response = Response(payload['data'], status=payload['status'])
+        if payload['status'] == 200:
+            set_catalog_cache_headers(response)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedCatalogMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedCatalogMixin, self).retrieve(request, *args, **kwargs))
+
+
+class ProductViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for products.
     List and retrieve active products.
@@ -26,23 +54,27 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def batches(self, request, pk=None):
         """Get all batches for a product."""
-        product = self.get_object()
-        batches = product.batches.filter(status='ACTIVE').order_by('start_date')
-        serializer = BatchSerializer(batches, many=True)
-        return Response(serializer.data)
+        def build():
+            product = self.get_object()
+            batches = product.batches.filter(status='ACTIVE').order_by('start_date')
+            serializer = BatchSerializer(batches, many=True)
+            return Response(serializer.data)
+        return self.cached_response(request, build)
     
     @action(detail=True, methods=['get'])
     def active_batch(self, request, pk=None):
         """Get active batch for a product."""
-        product = self.get_object()
-        batch = product.get_active_batch()
-        if batch:
-            serializer = BatchSerializer(batch)
-            return Response(serializer.data)
-        return Response({'detail': 'Nenhum lote ativo'}, status=404)
+        def build():
+            product = self.get_object()
+            batch = product.get_active_batch()
+            if batch:
+                serializer = BatchSerializer(batch)
+                return Response(serializer.data)
+            return Response({'detail': 'Nenhum lote ativo'}, status=404)
+        return self.cached_response(request, build)
 
 
-class BatchViewSet(viewsets.ReadOnlyModelViewSet):
+class BatchViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for batches.
     List and retrieve active batches.
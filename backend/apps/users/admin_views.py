@@ -6,24 +6,120 @@ from decimal import Decimal
 
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Q
+from django.core.paginator import Paginator as DjangoPaginator, PageNotAnInteger, EmptyPage
+from django.db import connection
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncMonth, TruncWeek
 from django.utils import timezone
 from datetime import timedelta
 
 from .permissions import IsAdminUser
-from apps.enrollments.models import Enrollment
-from apps.enrollments.serializers import EnrollmentSerializer
+from apps.enrollments.models import Coupon, Enrollment
+from apps.enrollments.search import normalize_search_query
+from apps.enrollments.serializers import EnrollmentSerializer, optimize_enrollment_queryset
 from apps.payments.models import Payment
 from apps.products.models import Product, Batch
 from apps.products.serializers import ProductSerializer, BatchSerializer
 
 
+OVERDUE_PAYMENT_STATUSES = ['CREATED', 'PENDING', 'OVERDUE']
+PAID_PAYMENT_STATUSES = ['CONFIRMED', 'RECEIVED']
+
+CASH_FLOW_PERIODS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# (key, min days overdue, max days overdue) - None means open-ended.
+OVERDUE_AGING_BUCKETS = [
+    ('1_7', 1, 7),
+    ('8_30', 8, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None),
+]
+
+
+def estimate_table_count(model):
+    """
+    Return the planner's row estimate for a model's table.
+
+    Only available on PostgreSQL (pg_class.reltuples); returns None on other
+    databases or when the table has never been analyzed.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Paginator that reports a precomputed estimate instead of running COUNT(*)."""
+
+    def __init__(self, object_list, per_page, estimated_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        # Paginator.count is a cached_property; seeding it skips the query.
+        self.count = estimated_count
+
+    def validate_number(self, number):
+        # The estimate may lag behind the real table size, so only reject
+        # malformed numbers and let the page slice decide what is empty.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('O número da página não é um inteiro')
+        if number < 1:
+            raise EmptyPage('O número da página é menor que 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
 class AdminEnrollmentPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+    estimated_count = None
+
+    def django_paginator_class(self, object_list, per_page, **kwargs):
+        if self.estimated_count is not None:
+            return EstimatedCountPaginator(object_list, per_page, self.estimated_count, **kwargs)
+        return DjangoPaginator(object_list, per_page, **kwargs)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.estimated_count is not None:
+            response.data['count_is_estimate'] = True
+        return response
+
+
+class AdminEnrollmentCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key, newest first.
+
+    The cursor only stores the first ordering field, so that field has to be
+    unique: created_at is not (bulk inserts share it, and ties fall back to
+    offsets), while ids follow creation order.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
 
 
 def calculate_asaas_fee(payment_amount, payment_method, installments):
@@ -53,23 +149,55 @@ def calculate_asaas_fee(payment_amount, payment_method, installments):
     return Decimal('0')
 
 
+def asaas_fee_expression(amount, payments_count):
+    """
+    SQL counterpart of calculate_asaas_fee for an enrollment.
+
+    Args:
+        amount: Expression with the total paid amount
+        payments_count: Expression with the number of paid payments
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    card_fixed_fee = payments_count * Value(Decimal('0.49'), output_field=money)
+    return Case(
+        When(
+            payment_method__in=['PIX_CASH', 'PIX_INSTALLMENT'],
+            then=payments_count * Value(Decimal('1.99'), output_field=money),
+        ),
+        When(
+            payment_method='CREDIT_CARD',
+            installments__gte=2,
+            installments__lte=6,
+            then=card_fixed_fee + amount * Value(Decimal('0.0249'), output_field=money),
+        ),
+        When(
+            payment_method='CREDIT_CARD',
+            then=card_fixed_fee + amount * Value(Decimal('0.0299'), output_field=money),
+        ),
+        default=Value(Decimal('0'), output_field=money),
+        output_field=money,
+    )
+
+
 def build_overdue_enrollments():
     """Build grouped overdue enrollments for admin dashboards."""
     today = timezone.localdate()
-    unpaid_statuses = ['CREATED', 'PENDING', 'OVERDUE']
     payments = Payment.objects.select_related(
         'enrollment',
         'enrollment__product',
         'enrollment__batch',
         'enrollment__user',
+        'enrollment__coupon',
     ).prefetch_related(
         'enrollment__payments',
     ).filter(
         due_date__lt=today,
-        status__in=unpaid_statuses,
+        status__in=OVERDUE_PAYMENT_STATUSES,
     ).order_by('enrollment_id', 'due_date', 'installment_number')
 
     grouped = OrderedDict()
+    # Shared so settings/active batch/batch counts are memoized across rows.
+    serializer_context = {}
     total_overdue_amount = Decimal('0')
     total_overdue_payments = 0
 
@@ -78,7 +206,7 @@ def build_overdue_enrollments():
         enrollment_id = enrollment.id
 
         if enrollment_id not in grouped:
-            serialized_enrollment = EnrollmentSerializer(enrollment).data
+            serialized_enrollment = EnrollmentSerializer(enrollment, context=serializer_context).data
             grouped[enrollment_id] = {
                 **serialized_enrollment,
                 'overdue_payments': [],
@@ -127,6 +255,304 @@ def build_overdue_enrollments():
     }
 
 
+def build_overdue_aging_report():
+    """
+    Build overdue amounts and counts bucketed by days overdue, per product and batch.
+
+    Everything is computed by a single aggregate query over Payment; the
+    buckets are expressed as due_date ranges so the (status, due_date)
+    index can be used.
+    """
+    today = timezone.localdate()
+
+    bucket_aggregates = {}
+    for key, min_days, max_days in OVERDUE_AGING_BUCKETS:
+        bucket_filter = Q(due_date__lte=today - timedelta(days=min_days))
+        if max_days is not None:
+            bucket_filter &= Q(due_date__gte=today - timedelta(days=max_days))
+        bucket_aggregates[f'{key}_count'] = Count('id', filter=bucket_filter)
+        bucket_aggregates[f'{key}_amount'] = Sum('amount', filter=bucket_filter)
+
+    rows = Payment.objects.filter(
+        due_date__lt=today,
+        status__in=OVERDUE_PAYMENT_STATUSES,
+    ).values(
+        'enrollment__product_id',
+        'enrollment__product__name',
+        'enrollment__batch_id',
+        'enrollment__batch__name',
+    ).annotate(
+        enrollments_count=Count('enrollment_id', distinct=True),
+        payments_count=Count('id'),
+        overdue_amount=Sum('amount'),
+        **bucket_aggregates,
+    ).order_by('enrollment__product__name', 'enrollment__batch__name')
+
+    totals = {
+        key: {'count': 0, 'amount': Decimal('0')}
+        for key, _min_days, _max_days in OVERDUE_AGING_BUCKETS
+    }
+    total_amount = Decimal('0')
+    total_payments = 0
+    results = []
+
+    for row in rows:
+        buckets = {}
+        for key, _min_days, _max_days in OVERDUE_AGING_BUCKETS:
+            count = row[f'{key}_count']
+            amount = row[f'{key}_amount'] or Decimal('0')
+            buckets[key] = {'count': count, 'amount': str(amount)}
+            totals[key]['count'] += count
+            totals[key]['amount'] += amount
+
+        total_amount += row['overdue_amount'] or Decimal('0')
+        total_payments += row['payments_count']
+        results.append({
+            'product_id': row['enrollment__product_id'],
+            'product_name': row['enrollment__product__name'],
+            'batch_id': row['enrollment__batch_id'],
+            'batch_name': row['enrollment__batch__name'],
+            'enrollments_count': row['enrollments_count'],
+            'payments_count': row['payments_count'],
+            'amount': str(row['overdue_amount'] or Decimal('0')),
+            'buckets': buckets,
+        })
+
+    return {
+        'reference_date': today.isoformat(),
+        'total_overdue_payments': total_payments,
+        'total_overdue_amount': str(total_amount),
+        'buckets': {
+            key: {'count': value['count'], 'amount': str(value['amount'])}
+            for key, value in totals.items()
+        },
+        'results': results,
+    }
+
+
+def calculate_on_time_rates(today=None):
+    """
+    Historical on-time payment rate per enrollment payment method.
+
+    Only installments already due are considered; an installment counts as
+    on time when it was paid on or before its due date.
+    """
+    today = today or timezone.localdate()
+    rows = Payment.objects.filter(
+        due_date__lt=today,
+    ).exclude(
+        status__in=['CANCELLED', 'REFUNDED'],
+    ).values('enrollment__payment_method').annotate(
+        due_count=Count('id'),
+        on_time_count=Count(
+            'id',
+            filter=Q(status__in=PAID_PAYMENT_STATUSES, paid_at__date__lte=F('due_date')),
+        ),
+    ).order_by()
+
+    rates = {}
+    total_due = 0
+    total_on_time = 0
+    for row in rows:
+        total_due += row['due_count']
+        total_on_time += row['on_time_count']
+        rates[row['enrollment__payment_method']] = (
+            Decimal(row['on_time_count']) / Decimal(row['due_count'])
+        )
+
+    overall = Decimal(total_on_time) / Decimal(total_due) if total_due else Decimal('1')
+    return rates, overall
+
+
+def build_cash_flow_projection(period='month', weighted=False, horizon_days=180):
+    """
+    Project expected receipts from outstanding payments, grouped by due period.
+
+    Amounts are aggregated in SQL by truncated due_date and payment method.
+    When weighted, each method's amount is multiplied by its historical
+    on-time rate (falling back to the overall rate for methods with no
+    history).
+    """
+    today = timezone.localdate()
+    until = today + timedelta(days=horizon_days)
+    truncate = CASH_FLOW_PERIODS[period]
+
+    if weighted:
+        rates, overall_rate = calculate_on_time_rates(today)
+    else:
+        rates, overall_rate = {}, Decimal('1')
+
+    def expected(amount, payment_method):
+        return (amount * rates.get(payment_method, overall_rate)).quantize(Decimal('0.01'))
+
+    outstanding = Payment.objects.filter(status__in=OVERDUE_PAYMENT_STATUSES)
+
+    overdue_rows = outstanding.filter(due_date__lt=today).values(
+        'enrollment__payment_method',
+    ).annotate(
+        payments_count=Count('id'),
+        amount=Sum('amount'),
+    ).order_by()
+
+    overdue = {'count': 0, 'amount': Decimal('0'), 'expected_amount': Decimal('0')}
+    for row in overdue_rows:
+        overdue['count'] += row['payments_count']
+        overdue['amount'] += row['amount']
+        overdue['expected_amount'] += expected(row['amount'], row['enrollment__payment_method'])
+
+    rows = outstanding.filter(
+        due_date__gte=today,
+        due_date__lte=until,
+    ).annotate(
+        period_start=truncate('due_date'),
+    ).values(
+        'period_start',
+        'enrollment__payment_method',
+    ).annotate(
+        payments_count=Count('id'),
+        amount=Sum('amount'),
+    ).order_by('period_start', 'enrollment__payment_method')
+
+    projection = OrderedDict()
+    for row in rows:
+        period_start = row['period_start']
+        if hasattr(period_start, 'date'):
+            period_start = period_start.date()
+        key = period_start.isoformat()
+        entry = projection.setdefault(key, {
+            'period_start': key,
+            'count': 0,
+            'amount': Decimal('0'),
+            'expected_amount': Decimal('0'),
+            'by_payment_method': {},
+        })
+        method = row['enrollment__payment_method']
+        method_expected = expected(row['amount'], method)
+        entry['count'] += row['payments_count']
+        entry['amount'] += row['amount']
+        entry['expected_amount'] += method_expected
+        entry['by_payment_method'][method or 'UNKNOWN'] = {
+            'count': row['payments_count'],
+            'amount': str(row['amount']),
+            'expected_amount': str(method_expected),
+        }
+
+    results = []
+    for entry in projection.values():
+        entry['amount'] = str(entry['amount'])
+        entry['expected_amount'] = str(entry['expected_amount'])
+        results.append(entry)
+
+    return {
+        'period': period,
+        'weighted': weighted,
+        'from': today.isoformat(),
+        'until': until.isoformat(),
+        'on_time_rates': {
+            (method or 'UNKNOWN'): float(rate) for method, rate in rates.items()
+        },
+        'overdue': {
+            'count': overdue['count'],
+            'amount': str(overdue['amount']),
+            'expected_amount': str(overdue['expected_amount']),
+        },
+        'results': results,
+    }
+
+
+def build_coupon_performance_report(coupon_id=None):
+    """
+    Redemptions, conversions, discounts and revenue per coupon, product and batch.
+
+    Computed by a single aggregate query over Enrollment (using the
+    (coupon, status) index). Paid amounts are correlated per-enrollment
+    subqueries over Payment rather than a join, so enrollment columns such
+    as coupon_discount are not multiplied by the number of installments.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid_payments = Payment.objects.filter(
+        enrollment=OuterRef('pk'),
+        status__in=PAID_PAYMENT_STATUSES,
+    ).order_by().values('enrollment')
+    paid_amount = Coalesce(
+        Subquery(paid_payments.annotate(total=Sum('amount')).values('total'), output_field=money),
+        Value(Decimal('0'), output_field=money),
+    )
+    paid_count = Coalesce(
+        Subquery(paid_payments.annotate(total=Count('id')).values('total')),
+        Value(0),
+    )
+    is_paid = Q(status='PAID')
+
+    enrollments = Enrollment.objects.filter(coupon__isnull=False)
+    if coupon_id is not None:
+        enrollments = enrollments.filter(coupon_id=coupon_id)
+
+    rows = enrollments.values(
+        'coupon_id',
+        'coupon__code',
+        'product_id',
+        'product__name',
+        'batch_id',
+        'batch__name',
+    ).annotate(
+        redemptions=Count('id'),
+        paid_conversions=Count('id', filter=is_paid),
+        coupon_discount=Sum('coupon_discount', filter=is_paid),
+        discount_amount=Sum('discount_amount', filter=is_paid),
+        gross_revenue=Sum(paid_amount, output_field=money),
+        fees=Sum(asaas_fee_expression(paid_amount, paid_count), output_field=money),
+    ).order_by('coupon__code', 'product__name', 'batch__name')
+
+    metrics = ['coupon_discount', 'discount_amount', 'gross_revenue', 'fees', 'net_revenue']
+    coupons = OrderedDict()
+    for row in rows:
+        gross_revenue = row['gross_revenue'] or Decimal('0')
+        fees = (row['fees'] or Decimal('0')).quantize(Decimal('0.01'))
+        values = {
+            'coupon_discount': row['coupon_discount'] or Decimal('0'),
+            'discount_amount': row['discount_amount'] or Decimal('0'),
+            'gross_revenue': gross_revenue,
+            'fees': fees,
+            'net_revenue': gross_revenue - fees,
+        }
+
+        coupon = coupons.setdefault(row['coupon_id'], {
+            'coupon_id': row['coupon_id'],
+            'code': row['coupon__code'],
+            'redemptions': 0,
+            'paid_conversions': 0,
+            **{metric: Decimal('0') for metric in metrics},
+            'breakdown': [],
+        })
+        coupon['redemptions'] += row['redemptions']
+        coupon['paid_conversions'] += row['paid_conversions']
+        for metric in metrics:
+            coupon[metric] += values[metric]
+
+        coupon['breakdown'].append({
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'batch_id': row['batch_id'],
+            'batch_name': row['batch__name'],
+            'redemptions': row['redemptions'],
+            'paid_conversions': row['paid_conversions'],
+            **{metric: str(values[metric]) for metric in metrics},
+        })
+
+    results = []
+    for coupon in coupons.values():
+        coupon['conversion_rate'] = round(coupon['paid_conversions'] / coupon['redemptions'], 4)
+        for metric in metrics:
+            coupon[metric] = str(coupon[metric])
+        results.append(coupon)
+
+    return {
+        'count': len(results),
+        'results': results,
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_dashboard_stats(request):
@@ -233,14 +659,74 @@ def admin_overdue_enrollments(request):
     return Response(build_overdue_enrollments())
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_overdue_aging_report(request):
+    """Overdue amounts bucketed by days overdue, per product and batch."""
+
+    return Response(build_overdue_aging_report())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_cash_flow_projection(request):
+    """
+    Expected receipts from outstanding installments by week or month.
+
+    Query params:
+    - period: 'week' or 'month' (default 'month')
+    - weighted: '1'/'true' to weight by historical on-time rates
+    - horizon_days: how far ahead to project (default 180, max 730)
+    """
+    period = request.query_params.get('period', 'month')
+    if period not in CASH_FLOW_PERIODS:
+        return Response(
+            {'detail': 'Período inválido. Use "week" ou "month".'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    weighted = request.query_params.get('weighted', '').lower() in ['1', 'true', 'yes']
+
+    try:
+        horizon_days = int(request.query_params.get('horizon_days', 180))
+    except (TypeError, ValueError):
+        return Response(
+            {'detail': 'horizon_days inválido.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    horizon_days = max(1, min(horizon_days, 730))
+
+    return Response(build_cash_flow_projection(period, weighted, horizon_days))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_coupon_performance(request, pk=None):
+    """Coupon redemptions, conversions, discounts and revenue by product and batch."""
+    if pk is not None and not Coupon.objects.filter(pk=pk).exists():
+        return Response(
+            {'detail': 'Cupom não encontrado.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(build_coupon_performance_report(pk))
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_enrollments_list(request):
-    """List all enrollments with filters."""
+    """
+    List all enrollments with filters.
+
+    Pagination modes:
+    - default: page-number pagination (?page=N) with an exact count;
+      pass ?estimate_count=1 on unfiltered listings to use the planner's
+      row estimate instead of COUNT(*).
+    - ?pagination=cursor: keyset pagination ordered by id (newest first);
+      follow the returned next/previous links. No total count is returned.
+    """
     
-    enrollments = Enrollment.objects.select_related(
-        'product', 'batch', 'user'
-    ).prefetch_related('payments').order_by('-created_at')
+    enrollments = optimize_enrollment_queryset(Enrollment.objects.all()).order_by('-created_at')
     
     # Filters
     status_filter = request.query_params.get('status')
@@ -258,16 +744,21 @@ def admin_enrollments_list(request):
         enrollments = enrollments.filter(payment_method=payment_method_filter)
     
     if search:
-        enrollments = enrollments.filter(
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(form_data__nome_completo__icontains=search) |
-            Q(form_data__email__icontains=search) |
-            Q(form_data__cpf__icontains=search)
-        )
+        # search_document holds the normalized name/email/CPF digits and is
+        # trigram-indexed on PostgreSQL, so this is an index-assisted LIKE.
+        search_term = normalize_search_query(search)
+        if search_term:
+            enrollments = enrollments.filter(search_document__contains=search_term)
+
+    if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+        paginator = AdminEnrollmentCursorPagination()
+    else:
+        paginator = AdminEnrollmentPagination()
+        is_filtered = any([status_filter, product_filter, payment_method_filter, search])
+        wants_estimate = request.query_params.get('estimate_count', '').lower() in ['1', 'true', 'yes']
+        if wants_estimate and not is_filtered:
+            paginator.estimated_count = estimate_table_count(Enrollment)
 
-    paginator = AdminEnrollmentPagination()
     page = paginator.paginate_queryset(enrollments, request)
     serializer = EnrollmentSerializer(page, many=True)
     return paginator.get_paginated_response(serializer.data)
@@ -2,12 +2,15 @@ from decimal import Decimal
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from apps.enrollments.models import Enrollment
+from apps.enrollments.models import Coupon, Enrollment, Settings
+from apps.payments.models import Payment
 from apps.products.models import Batch, Product
 
 
@@ -87,3 +90,415 @@ class AdminEnrollmentSearchTests(APITestCase):
         self.assertEqual(response.data['count'], 1)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['id'], self.matching_enrollment.id)
+
+    def test_admin_enrollment_search_ignores_accents_and_case(self):
+        self.matching_enrollment.form_data = {'nome_completo': 'Maria José Conceição'}
+        self.matching_enrollment.save()
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-enrollments-list'),
+            {'search': 'JOSE CONCEICAO'},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.matching_enrollment.id)
+
+    def test_admin_enrollment_search_matches_cpf_digits(self):
+        self.other_enrollment.form_data = {'cpf': '529.982.247-25'}
+        self.other_enrollment.save()
+        self.client.force_authenticate(user=self.admin)
+
+        for search in ['52998224725', '982.247']:
+            response = self.client.get(
+                reverse('users:admin-enrollments-list'),
+                {'search': search},
+            )
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], 1)
+            self.assertEqual(response.data['results'][0]['id'], self.other_enrollment.id)
+
+    def test_admin_enrollment_search_follows_user_rename(self):
+        self.other_user.first_name = 'Joaquim'
+        self.other_user.save()
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-enrollments-list'),
+            {'search': 'joaquim'},
+        )
+
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.other_enrollment.id)
+
+    def test_last_login_update_skips_search_documents(self):
+        self.other_user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.other_user.save(update_fields=['last_login'])
+
+    def test_admin_enrollment_list_query_count_does_not_grow_with_rows(self):
+        Settings.get_settings()
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('users:admin-enrollments-list')
+
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(url)
+
+        for index in range(5):
+            user = User.objects.create_user(
+                email=f'extra{index}@example.com',
+                password='password123',
+            )
+            enrollment = Enrollment.objects.create(
+                user=user,
+                product=self.product,
+                batch=self.batch,
+                total_amount=Decimal('100.00'),
+                final_amount=Decimal('100.00'),
+            )
+            Payment.objects.create(
+                enrollment=enrollment,
+                amount=Decimal('100.00'),
+                due_date=timezone.localdate(),
+            )
+
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(url)
+
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(large_page), len(small_page))
+
+    def test_admin_enrollment_cursor_pagination_walks_all_rows(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-enrollments-list'),
+            {'pagination': 'cursor', 'page_size': 1},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'][0]['id'], self.other_enrollment.id)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id'], self.matching_enrollment.id)
+        self.assertIsNone(response.data['next'])
+
+    def test_admin_enrollment_cursor_pagination_handles_equal_created_at(self):
+        for index in range(3):
+            user = User.objects.create_user(email=f'tie{index}@example.com', password='password123')
+            Enrollment.objects.create(
+                user=user,
+                product=self.product,
+                batch=self.batch,
+                form_data={},
+                total_amount=Decimal('100.00'),
+                final_amount=Decimal('100.00'),
+            )
+        Enrollment.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(user=self.admin)
+
+        seen = []
+        url = reverse('users:admin-enrollments-list') + '?pagination=cursor&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen.extend(enrollment['id'] for enrollment in response.data['results'])
+            self.assertNotIn('o=', response.data['next'] or '')
+            url = response.data['next']
+
+        self.assertEqual(seen, sorted(Enrollment.objects.values_list('id', flat=True), reverse=True))
+
+    def test_admin_enrollment_estimate_count_falls_back_to_exact_count(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-enrollments-list'),
+            {'estimate_count': '1'},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertNotIn('count_is_estimate', response.data)
+
+
+class AdminOverdueAgingReportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='password123',
+            is_staff=True,
+        )
+        self.user = User.objects.create_user(
+            email='maria@example.com',
+            password='password123',
+        )
+
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+
+        self.enrollment = Enrollment.objects.create(
+            user=self.user,
+            product=self.product,
+            batch=self.batch,
+            total_amount=Decimal('120.00'),
+            final_amount=Decimal('120.00'),
+        )
+
+        today = timezone.localdate()
+        for installment, (days_overdue, payment_status) in enumerate([
+            (3, 'PENDING'),
+            (20, 'OVERDUE'),
+            (120, 'CREATED'),
+            (45, 'RECEIVED'),
+            (0, 'PENDING'),
+        ], start=1):
+            Payment.objects.create(
+                enrollment=self.enrollment,
+                installment_number=installment,
+                amount=Decimal('30.00'),
+                status=payment_status,
+                due_date=today - timedelta(days=days_overdue),
+            )
+
+    def test_overdue_aging_report_buckets_unpaid_payments(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(reverse('users:admin-overdue-aging'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_overdue_payments'], 3)
+        self.assertEqual(Decimal(response.data['total_overdue_amount']), Decimal('90.00'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        row = response.data['results'][0]
+        self.assertEqual(row['batch_id'], self.batch.id)
+        self.assertEqual(row['enrollments_count'], 1)
+        self.assertEqual(row['buckets']['1_7']['count'], 1)
+        self.assertEqual(row['buckets']['8_30']['count'], 1)
+        self.assertEqual(row['buckets']['31_60']['count'], 0)
+        self.assertEqual(row['buckets']['90_plus']['count'], 1)
+        self.assertEqual(Decimal(row['buckets']['90_plus']['amount']), Decimal('30.00'))
+
+    def test_overdue_aging_report_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse('users:admin-overdue-aging'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AdminCashFlowProjectionTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='password123',
+            is_staff=True,
+        )
+        user = User.objects.create_user(
+            email='maria@example.com',
+            password='password123',
+        )
+        product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        batch = Batch.objects.create(
+            product=product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        enrollment = Enrollment.objects.create(
+            user=user,
+            product=product,
+            batch=batch,
+            payment_method='PIX_INSTALLMENT',
+            installments=4,
+            total_amount=Decimal('120.00'),
+            final_amount=Decimal('120.00'),
+        )
+
+        today = timezone.localdate()
+        # Two matured installments: one paid on time, one still overdue.
+        Payment.objects.create(
+            enrollment=enrollment,
+            installment_number=1,
+            amount=Decimal('30.00'),
+            status='RECEIVED',
+            due_date=today - timedelta(days=40),
+            paid_at=now - timedelta(days=41),
+        )
+        Payment.objects.create(
+            enrollment=enrollment,
+            installment_number=2,
+            amount=Decimal('30.00'),
+            status='OVERDUE',
+            due_date=today - timedelta(days=10),
+        )
+        Payment.objects.create(
+            enrollment=enrollment,
+            installment_number=3,
+            amount=Decimal('30.00'),
+            status='CREATED',
+            due_date=today + timedelta(days=20),
+        )
+        Payment.objects.create(
+            enrollment=enrollment,
+            installment_number=4,
+            amount=Decimal('30.00'),
+            status='CREATED',
+            due_date=today + timedelta(days=50),
+        )
+
+    def test_projection_groups_outstanding_payments_by_period(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-cash-flow-projection'),
+            {'period': 'month'},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['overdue']['count'], 1)
+        self.assertEqual(sum(row['count'] for row in response.data['results']), 2)
+        self.assertEqual(
+            sum(Decimal(row['amount']) for row in response.data['results']),
+            Decimal('60.00'),
+        )
+
+    def test_weighted_projection_applies_on_time_rate(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-cash-flow-projection'),
+            {'period': 'week', 'weighted': '1'},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['on_time_rates']['PIX_INSTALLMENT'], 0.5)
+        self.assertEqual(
+            sum(Decimal(row['expected_amount']) for row in response.data['results']),
+            Decimal('30.00'),
+        )
+
+    def test_invalid_period_is_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(
+            reverse('users:admin-cash-flow-projection'),
+            {'period': 'year'},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdminCouponPerformanceTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='password123',
+            is_staff=True,
+        )
+        self.product = Product.objects.create(
+            name='Produto Teste',
+            base_price=Decimal('100.00'),
+            is_active=True,
+        )
+        now = timezone.now()
+        self.batch = Batch.objects.create(
+            product=self.product,
+            name='Lote Teste',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=10),
+            price=Decimal('100.00'),
+            pix_installment_price=Decimal('120.00'),
+            credit_card_price=Decimal('130.00'),
+        )
+        self.coupon = Coupon.objects.create(
+            code='PROMO10',
+            discount_type='FIXED',
+            discount_value=Decimal('10.00'),
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=10),
+        )
+
+        today = timezone.localdate()
+        for index, (enrollment_status, payment_statuses) in enumerate([
+            ('PAID', ['RECEIVED', 'CONFIRMED']),
+            ('PENDING_PAYMENT', ['PENDING']),
+        ]):
+            enrollment = Enrollment.objects.create(
+                user=User.objects.create_user(email=f'user{index}@example.com', password='password123'),
+                product=self.product,
+                batch=self.batch,
+                coupon=self.coupon,
+                status=enrollment_status,
+                payment_method='PIX_INSTALLMENT',
+                installments=2,
+                total_amount=Decimal('120.00'),
+                coupon_discount=Decimal('10.00'),
+                discount_amount=Decimal('10.00'),
+                final_amount=Decimal('110.00'),
+            )
+            for installment, payment_status in enumerate(payment_statuses, start=1):
+                Payment.objects.create(
+                    enrollment=enrollment,
+                    installment_number=installment,
+                    amount=Decimal('55.00'),
+                    status=payment_status,
+                    due_date=today,
+                )
+
+    def test_report_aggregates_redemptions_and_revenue_in_one_query(self):
+        self.client.force_authenticate(user=self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('users:admin-coupon-performance', args=[self.coupon.pk])
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        enrollment_queries = [q for q in queries.captured_queries if 'enrollments_enrollment' in q['sql']]
+        self.assertEqual(len(enrollment_queries), 1)
+
+        coupon = response.data['results'][0]
+        self.assertEqual(coupon['redemptions'], 2)
+        self.assertEqual(coupon['paid_conversions'], 1)
+        self.assertEqual(coupon['conversion_rate'], 0.5)
+        # Not multiplied by the two paid installments
+        self.assertEqual(Decimal(coupon['coupon_discount']), Decimal('10.00'))
+        self.assertEqual(Decimal(coupon['gross_revenue']), Decimal('110.00'))
+        self.assertEqual(Decimal(coupon['fees']), Decimal('3.98'))
+        self.assertEqual(Decimal(coupon['net_revenue']), Decimal('106.02'))
+        self.assertEqual(coupon['breakdown'][0]['batch_id'], self.batch.id)
+
+    def test_unknown_coupon_returns_404(self):
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.get(reverse('users:admin-coupon-performance', args=[9999]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
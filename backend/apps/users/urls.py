@@ -15,6 +15,9 @@ from .views import (
 from .admin_views import (
     admin_dashboard_stats,
     admin_overdue_enrollments,
+    admin_overdue_aging_report,
+    admin_cash_flow_projection,
+    admin_coupon_performance,
     admin_enrollments_list,
     admin_enrollment_update,
     admin_products_list,
@@ -47,6 +50,10 @@ urlpatterns = [
     # Admin endpoints
     path('admin/dashboard/', admin_dashboard_stats, name='admin-dashboard'),
     path('admin/overdue-enrollments/', admin_overdue_enrollments, name='admin-overdue-enrollments'),
+    path('admin/overdue-aging/', admin_overdue_aging_report, name='admin-overdue-aging'),
+    path('admin/cash-flow-projection/', admin_cash_flow_projection, name='admin-cash-flow-projection'),
+    path('admin/coupons/performance/', admin_coupon_performance, name='admin-coupons-performance'),
+    path('admin/coupons/<int:pk>/performance/', admin_coupon_performance, name='admin-coupon-performance'),
     path('admin/enrollments/', admin_enrollments_list, name='admin-enrollments-list'),
     path('admin/enrollments/<int:pk>/', admin_enrollment_update, name='admin-enrollment-update'),
     path('admin/products/', admin_products_list, name='admin-products-list'),
@@ -145,7 +145,7 @@ def password_reset_request_view(request):
     from django.contrib.auth.tokens import default_token_generator
     from django.utils.http import urlsafe_base64_encode
     from django.utils.encoding import force_bytes
-    from apps.enrollments.email_service import send_password_reset_email
+    from apps.enrollments.outbox import queue_email
     
     serializer = PasswordResetRequestSerializer(data=request.data)
     
@@ -163,8 +163,13 @@ def password_reset_request_view(request):
             frontend_url = getattr(settings, 'FRONTEND_URL', 'https://areamais.com.br')
             reset_link = f"{frontend_url}/reset-password/{uid}/{token}/"
             
-            # Send email via Resend
-            send_password_reset_email(user, reset_link)
+            # Queue email (sent via Resend by the outbox worker)
+            queue_email(
+                'password_reset',
+                user.email,
+                f'password_reset:{user.pk}:{token}',
+                {'user_id': user.pk, 'reset_link': reset_link},
+            )
             
             return Response({
                 'detail': 'Email de recuperação enviado com sucesso. Verifique sua caixa de entrada.'
@@ -47,7 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'apps.products.middleware.CatalogSnapshotWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +97,26 @@ else:
         }
     }
 
+# Cache
+# A shared Redis cache lets every gunicorn worker see the same entries (and
+# the same invalidations); without REDIS_URL each process keeps its own.
+REDIS_URL = config('REDIS_URL', default='')
+# Features keeping cross-process state in the cache check this flag
+CACHE_IS_SHARED = bool(REDIS_URL)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -165,7 +185,7 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'Retry-After']
 CORS_PREFLIGHT_MAX_AGE = 86400
 
 # CSRF / Proxy / HTTPS
@@ -249,3 +269,49 @@ BACKEND_URL = config('BACKEND_URL', default='http://localhost:8000')
 ASAAS_API_KEY = config('ASAAS_API_KEY', default='')
 ASAAS_ENV = config('ASAAS_ENV', default='sandbox')
 ASAAS_WEBHOOK_TOKEN = config('ASAAS_WEBHOOK_TOKEN', default='')
+
+# Payment status stream (Server-Sent Events)
+PAYMENT_EVENTS_TIMEOUT = config('PAYMENT_EVENTS_TIMEOUT', default=300, cast=int)  # seconds
+PAYMENT_EVENTS_HEARTBEAT = config('PAYMENT_EVENTS_HEARTBEAT', default=15, cast=int)  # seconds
+# Open streams per web process (each holds a gunicorn thread, see gunicorn.conf.py).
+# Beyond this clients get 503 + Retry-After and reconnect with backoff.
+PAYMENT_EVENTS_MAX_STREAMS = config('PAYMENT_EVENTS_MAX_STREAMS', default=16, cast=int)
+PAYMENT_EVENTS_RETRY_AFTER = config('PAYMENT_EVENTS_RETRY_AFTER', default=5, cast=int)  # seconds
+
+# Expiry of unpaid enrollments (expire_enrollments command)
+ENROLLMENT_EXPIRY_HOURS = config('ENROLLMENT_EXPIRY_HOURS', default=72, cast=int)
+ENROLLMENT_EXPIRY_CHUNK_SIZE = config('ENROLLMENT_EXPIRY_CHUNK_SIZE', default=200, cast=int)
+ENROLLMENT_EXPIRY_CANCEL_WORKERS = config('ENROLLMENT_EXPIRY_CANCEL_WORKERS', default=4, cast=int)
+
+# Coupon lookup cache
+COUPON_CACHE_TIMEOUT = config('COUPON_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+COUPON_NEGATIVE_CACHE_TIMEOUT = config('COUPON_NEGATIVE_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+COUPON_LOCAL_CACHE_TIMEOUT = config('COUPON_LOCAL_CACHE_TIMEOUT', default=30, cast=int)  # seconds
+
+# Transactional email outbox (send_emails command)
+EMAIL_OUTBOX_WORKERS = config('EMAIL_OUTBOX_WORKERS', default=4, cast=int)
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)  # seconds, doubles per attempt
+EMAIL_OUTBOX_MAX_RETRY_DELAY = config('EMAIL_OUTBOX_MAX_RETRY_DELAY', default=3600, cast=int)  # seconds
+EMAIL_OUTBOX_LEASE = config('EMAIL_OUTBOX_LEASE', default=300, cast=int)  # seconds
+EMAIL_PROVIDER_RATE_LIMIT = config('EMAIL_PROVIDER_RATE_LIMIT', default=2, cast=float)  # Resend requests per second (account-wide with REDIS_URL)
+
+# Installment reminders (send_installment_reminders command)
+INSTALLMENT_REMINDER_DAYS = config('INSTALLMENT_REMINDER_DAYS', default=3, cast=int)  # days before due date
+
+# Global Settings singleton cache
+SETTINGS_CACHE_TIMEOUT = config('SETTINGS_CACHE_TIMEOUT', default=3600, cast=int)  # seconds
+SETTINGS_LOCAL_CACHE_TIMEOUT = config('SETTINGS_LOCAL_CACHE_TIMEOUT', default=10, cast=int)  # seconds
+
+# Waiting room for batch openings
+WAITING_ROOM_ENABLED = config('WAITING_ROOM_ENABLED', default=False, cast=bool)
+WAITING_ROOM_ADMISSIONS_PER_SECOND = config('WAITING_ROOM_ADMISSIONS_PER_SECOND', default=2, cast=int)
+WAITING_ROOM_MAX_CATCH_UP = config('WAITING_ROOM_MAX_CATCH_UP', default=10, cast=int)  # seconds
+WAITING_ROOM_TTL = config('WAITING_ROOM_TTL', default=7200, cast=int)  # seconds
+
+# Public catalog cache
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=60, cast=int)  # seconds
+CATALOG_BROWSER_MAX_AGE = config('CATALOG_BROWSER_MAX_AGE', default=30, cast=int)  # seconds
+CATALOG_SNAPSHOT_MAX_AGE = config('CATALOG_SNAPSHOT_MAX_AGE', default=900, cast=int)  # seconds
+CATALOG_SNAPSHOT_SEATS_STEP = config('CATALOG_SNAPSHOT_SEATS_STEP', default=10, cast=int)
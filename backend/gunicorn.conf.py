@@ -3,6 +3,8 @@ Gunicorn configuration file for Railway deployment.
 """
 import multiprocessing
 import os
+import subprocess
+import sys
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
@@ -10,7 +12,13 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.getenv('WEB_CONCURRENCY', 2))
-worker_class = 'sync'
+# Threaded workers so long-lived payment event streams (SSE) do not pin a
+# whole worker process each. A stream thread mostly sleeps on a queue and
+# holds no database connection, so threads are sized for them: up to
+# PAYMENT_EVENTS_MAX_STREAMS (16) streams per process, leaving 8 threads for
+# regular requests.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 24))
 worker_connections = 1000
 timeout = 120  # 2 minutes - increased from default 30s
 graceful_timeout = 30
@@ -40,3 +48,19 @@ tmp_upload_dir = None
 # SSL (if needed)
 # keyfile = None
 # certfile = None
+
+
+# Catalog snapshot
+# The snapshot is served from this instance's STATIC_ROOT, so the process
+# that keeps it fresh has to run here rather than in a separate Procfile
+# process with its own filesystem.
+def when_ready(server):
+    server.catalog_snapshot_watcher = subprocess.Popen(
+        [sys.executable, 'manage.py', 'build_catalog_snapshot', '--watch'],
+    )
+
+
+def on_exit(server):
+    watcher = getattr(server, 'catalog_snapshot_watcher', None)
+    if watcher is not None and watcher.poll() is None:
+        watcher.terminate()
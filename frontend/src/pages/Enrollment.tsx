@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ArrowLeft, User, Phone, FileText, Calendar, CreditCard, Check, Ticket, X } from 'lucide-react';
-import { getProducts, getProduct, createEnrollment, getEnrollments, validateCoupon, type Product, type Enrollment } from '../services/api'; // getEnrollments used in handleSubmit
+import { getProducts, getProduct, createEnrollment, getEnrollments, validateCoupon, joinWaitingRoom, getWaitingRoomStatus, type Product, type Enrollment, type WaitingRoomStatus } from '../services/api'; // getEnrollments used in handleSubmit
 import ProgressSteps from '../components/ProgressSteps';
 
 export default function Enrollment() {
@@ -12,6 +12,7 @@ export default function Enrollment() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [completedEnrollment, setCompletedEnrollment] = useState<Enrollment | null>(null);
+  const [queuePosition, setQueuePosition] = useState<number | null>(null);
   
   // Coupon states
   const [couponCode, setCouponCode] = useState('');
@@ -128,6 +129,30 @@ export default function Enrollment() {
     setCouponError('');
   };
 
+  // Wait in the virtual queue until admitted; returns the token to enroll with.
+  // The token is kept in sessionStorage so resubmitting after a form error
+  // keeps the user's place instead of joining at the back again.
+  const queueTokenKey = (batchId: number) => `waitingRoomToken:${batchId}`;
+
+  const waitForAdmission = async (batchId: number): Promise<string | undefined> => {
+    const storedToken = sessionStorage.getItem(queueTokenKey(batchId));
+    const storedStatus = storedToken
+      ? await getWaitingRoomStatus(storedToken).then(response => response.data).catch(() => null)
+      : null;
+    let queueStatus: WaitingRoomStatus = storedStatus ?? (await joinWaitingRoom(batchId)).data;
+    if (queueStatus.token) {
+      sessionStorage.setItem(queueTokenKey(batchId), queueStatus.token);
+    }
+    while (!queueStatus.admitted && queueStatus.token) {
+      setQueuePosition(queueStatus.position);
+      const delay = Math.max(queueStatus.retry_after, 1) * 1000;
+      await new Promise(resolve => setTimeout(resolve, delay));
+      queueStatus = (await getWaitingRoomStatus(queueStatus.token)).data;
+    }
+    setQueuePosition(null);
+    return queueStatus.token || undefined;
+  };
+
   const processEnrollment = async () => {
     setLoading(true);
     setError('');
@@ -157,13 +182,17 @@ export default function Enrollment() {
         has_coupon: couponApplied
       });
 
+      const queueToken = await waitForAdmission(selectedProduct.active_batch.id);
+
       const response = await createEnrollment({
         product_id: selectedProduct.id,
         batch_id: selectedProduct.active_batch.id,
         form_data: formData,
         coupon_code: couponApplied ? couponCode : undefined,
+        queue_token: queueToken,
       });
 
+      sessionStorage.removeItem(queueTokenKey(selectedProduct.active_batch.id));
       console.log('Enrollment created successfully:', response);
       console.log('Response data:', response.data);
       
@@ -196,6 +225,10 @@ export default function Enrollment() {
             : err.response.data.form_data;
         } else if (err.response.data.coupon_code) {
           errorMessage = err.response.data.coupon_code;
+        } else if (err.response.data.queue_token) {
+          errorMessage = Array.isArray(err.response.data.queue_token)
+            ? err.response.data.queue_token[0]
+            : err.response.data.queue_token;
         } else if (typeof err.response.data === 'string') {
           errorMessage = err.response.data;
         }
@@ -203,6 +236,7 @@ export default function Enrollment() {
       
       setError(errorMessage);
     } finally {
+      setQueuePosition(null);
       setLoading(false);
     }
   };
@@ -623,7 +657,9 @@ export default function Enrollment() {
               disabled={loading}
               className="w-full btn-primary disabled:opacity-50 disabled:cursor-not-allowed"
             >
-              {loading ? 'Processando...' : 'Continuar para Pagamento'}
+              {queuePosition !== null
+                ? `Você está na fila: ${queuePosition} pessoa(s) à sua frente`
+                : loading ? 'Processando...' : 'Continuar para Pagamento'}
             </button>
           </form>
         </div>
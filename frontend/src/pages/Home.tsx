@@ -2,20 +2,35 @@ import { useState, useEffect } from 'react';
 import { Calendar, MapPin, Users, Clock, LogIn, LogOut, User as UserIcon } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
-import { getProducts, getProduct, getSettings, type Product } from '../services/api';
+import { getCatalogSnapshot, getProducts, getProduct, getSettings, type CatalogSnapshotProduct, type Product } from '../services/api';
 import Countdown from '../components/Countdown';
 
 export default function Home() {
   const navigate = useNavigate();
   const { isAuthenticated, user, logout, isAdmin } = useAuth();
-  const [products, setProducts] = useState<Product[]>([]);
+  const [products, setProducts] = useState<Array<Product | CatalogSnapshotProduct>>([]);
   const [eventDate, setEventDate] = useState<Date | null>(null);
   const [maxInstallments, setMaxInstallments] = useState(6);
 
   useEffect(() => {
+    loadCatalog();
+  }, []);
+
+  const loadCatalog = async () => {
+    const snapshot = await getCatalogSnapshot();
+    if (snapshot) {
+      setProducts(snapshot.products.slice(0, 1));
+      if (snapshot.products.length > 0 && snapshot.products[0].event_date) {
+        setEventDate(new Date(snapshot.products[0].event_date));
+      }
+      setMaxInstallments(snapshot.settings.max_installments);
+      return;
+    }
+
+    // Snapshot unavailable or expired: fall back to the API
     loadProducts();
     loadSettings();
-  }, []);
+  };
 
   const loadProducts = async () => {
     try {
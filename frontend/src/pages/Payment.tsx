@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { useNavigate, useParams, useSearchParams } from 'react-router-dom';
 import { ArrowLeft, Copy, Check, QrCode, CreditCard as CreditCardIcon } from 'lucide-react';
-import { getEnrollment, createPayment, type Enrollment, type Payment } from '../services/api';
+import { getEnrollment, getPaymentQuote, getPaymentStatus, streamPaymentEvents, createPayment, PaymentEventsBusyError, type Enrollment, type Payment, type PaymentQuote, type PaymentStatus } from '../services/api';
 import ProgressSteps from '../components/ProgressSteps';
 import CreditCardForm, { type CardData } from '../components/CreditCardForm';
 
@@ -18,6 +18,7 @@ export default function PaymentPage() {
   console.log('paymentId from URL:', paymentIdFromUrl);
   
   const [enrollment, setEnrollment] = useState<Enrollment | null>(null);
+  const [quote, setQuote] = useState<PaymentQuote | null>(null);
   const [payment, setPayment] = useState<Payment | null>(null);
   const [paymentLoaded, setPaymentLoaded] = useState(false);
   const [loading, setLoading] = useState(false);
@@ -37,10 +38,13 @@ export default function PaymentPage() {
   const discountAmount = enrollment?.discount_amount ? parseFloat(String(enrollment.discount_amount)) : 0;
   const hasDiscount = discountAmount > 0;
   
-  // Apply discount to each payment method price
-  const pixCashPrice = Math.max(0, batchPixCashPrice - discountAmount);
-  const pixInstallmentPrice = Math.max(0, batchPixInstallmentPrice - discountAmount);
-  const creditCardPrice = Math.max(0, batchCreditCardPrice - discountAmount);
+  // Final price per payment method: from the server quote (coupon applied to
+  // each method's price), falling back to the enrollment's discount
+  const quotedPrice = (method: PaymentQuote['methods'][number]['payment_method']) =>
+    quote?.methods.find((m) => m.payment_method === method)?.final_amount;
+  const pixCashPrice = quotedPrice('PIX_CASH') ?? Math.max(0, batchPixCashPrice - discountAmount);
+  const pixInstallmentPrice = quotedPrice('PIX_INSTALLMENT') ?? Math.max(0, batchPixInstallmentPrice - discountAmount);
+  const creditCardPrice = quotedPrice('CREDIT_CARD') ?? Math.max(0, batchCreditCardPrice - discountAmount);
 
   const steps = [
     { number: 1, title: 'Dados Pessoais', description: 'Informações básicas' },
@@ -57,6 +61,12 @@ export default function PaymentPage() {
           const response = await getEnrollment(Number(enrollmentId));
           setEnrollment(response.data);
           
+          if (response.data.status === 'PENDING_PAYMENT') {
+            getPaymentQuote(Number(enrollmentId))
+              .then((quoteResponse) => setQuote(quoteResponse.data))
+              .catch((err) => console.error('Error loading payment quote:', err));
+          }
+          
           if (response.data.payments && response.data.payments.length > 0) {
             let selectedPayment = response.data.payments[0];
             
@@ -77,39 +87,82 @@ export default function PaymentPage() {
   }, [enrollmentId, paymentIdFromUrl]);
 
 
-  // Poll payment status when payment exists and is not confirmed
+  // Watch payment status when payment exists and is not confirmed:
+  // listen to the server event stream; while it is unavailable, check the
+  // status once per retry and reconnect with exponential backoff
   useEffect(() => {
     if (!payment || payment.status === 'CONFIRMED' || payment.status === 'RECEIVED') {
       return;
     }
 
-    const pollInterval = setInterval(async () => {
-      try {
+    const controller = new AbortController();
+
+    const applyStatus = async (paymentStatus: PaymentStatus) => {
+      if (paymentStatus.status === payment.status && paymentStatus.paid_at === payment.paid_at) {
+        return;
+      }
+      console.log('Payment status update:', paymentStatus);
+      setPayment((current) => current && current.id === paymentStatus.id
+        ? { ...current, status: paymentStatus.status, paid_at: paymentStatus.paid_at }
+        : current
+      );
+      if (paymentStatus.status === 'CONFIRMED' || paymentStatus.status === 'RECEIVED') {
+        // Refresh the full enrollment once to pick up its new status
         const response = await getEnrollment(Number(enrollmentId));
-        
-        // Update enrollment data
         setEnrollment(response.data);
-        
-        // Find the SAME payment by ID, not just the first one
-        const updatedPayment = response.data.payments?.find((p: any) => p.id === payment.id);
-        
-        if (updatedPayment) {
-          console.log('Polling - Updated payment:', updatedPayment);
-          // Update payment to get latest status
-          setPayment(updatedPayment);
-          
-          if (updatedPayment.status === 'CONFIRMED' || updatedPayment.status === 'RECEIVED') {
-            console.log('Payment confirmed! Stopping polling.');
-            clearInterval(pollInterval);
+      }
+    };
+
+    const wait = (ms: number) => new Promise<void>((resolve) => {
+      const timer = setTimeout(resolve, ms);
+      controller.signal.addEventListener('abort', () => {
+        clearTimeout(timer);
+        resolve();
+      }, { once: true });
+    });
+
+    (async () => {
+      let failures = 0;
+      // Reconnect after each server-side timeout until the payment is paid
+      while (!controller.signal.aborted) {
+        try {
+          const lastStatus = await streamPaymentEvents(payment.id, applyStatus, controller.signal);
+          failures = 0;
+          if (lastStatus && (lastStatus.status === 'CONFIRMED' || lastStatus.status === 'RECEIVED')) {
+            return;
+          }
+        } catch (err) {
+          if (controller.signal.aborted) {
+            return;
+          }
+          failures += 1;
+          const retryAfter = err instanceof PaymentEventsBusyError ? err.retryAfter : 3;
+          // Exponential backoff capped at 30s, with jitter so clients turned
+          // away together do not all come back at once
+          const delay = Math.min(retryAfter * 2 ** (failures - 1), 30) * (0.75 + Math.random() * 0.5);
+          console.warn(`Payment events stream unavailable, retrying in ${Math.round(delay)}s:`, err);
+          await wait(delay * 1000);
+          if (controller.signal.aborted) {
+            return;
+          }
+          try {
+            // Unchanged responses come back as 304
+            const { data: paymentStatus } = await getPaymentStatus(payment.id);
+            await applyStatus(paymentStatus);
+            if (paymentStatus.status === 'CONFIRMED' || paymentStatus.status === 'RECEIVED') {
+              return;
+            }
+          } catch (pollErr) {
+            console.error('Error checking payment status:', pollErr);
           }
         }
-      } catch (err) {
-        console.error('Error polling payment status:', err);
       }
-    }, 3000); // Poll every 3 seconds
+    })();
 
-    return () => clearInterval(pollInterval);
-  }, [payment?.id, enrollmentId]);
+    return () => {
+      controller.abort();
+    };
+  }, [payment?.id, payment?.status, enrollmentId]);
 
   const loadEnrollment = async () => {
     try {
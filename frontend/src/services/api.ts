@@ -4,6 +4,11 @@ import axios from 'axios';
 // Falls back to localhost for local development
 const API_URL = (import.meta as any).env?.VITE_API_URL || 'http://localhost:8000/api';
 
+// Static catalog snapshot written by the backend (build_catalog_snapshot) and
+// served by WhiteNoise, so the landing page does not hit the API.
+const CATALOG_SNAPSHOT_URL = (import.meta as any).env?.VITE_CATALOG_SNAPSHOT_URL
+  || `${API_URL.replace(/\/api\/?$/, '')}/static/catalog/catalog.json`;
+
 // Função para obter o CSRF token do cookie
 function getCookie(name: string): string | null {
   const value = `; ${document.cookie}`;
@@ -66,6 +71,24 @@ export interface Batch {
   status: string;
 }
 
+export interface CatalogSnapshotBatch extends Omit<Batch, 'current_enrollments' | 'max_enrollments'> {
+  max_enrollments: number | null;
+  remaining_seats: number | null; // Arredondado para baixo
+}
+
+export interface CatalogSnapshotProduct extends Omit<Product, 'active_batch'> {
+  active_batch: CatalogSnapshotBatch | null;
+}
+
+export interface CatalogSnapshot {
+  version: string;
+  url: string;
+  generated_at: string;
+  valid_until: string;
+  settings: { max_installments: number };
+  products: CatalogSnapshotProduct[];
+}
+
 export interface Enrollment {
   id: number;
   user_email?: string;
@@ -101,6 +124,15 @@ export interface Payment {
   created_at: string;
 }
 
+export interface PaymentStatus {
+  id: number;
+  status: string;
+  paid_at: string | null;
+  updated_at: string;
+  enrollment_id: number;
+  enrollment_status: string;
+}
+
 export interface PaginatedResponse<T> {
   count: number;
   next: string | null;
@@ -137,14 +169,45 @@ export const getProducts = () => api.get<{ results: Product[] }>('/products/prod
 export const getProduct = (id: number) =>
   api.get<Product>(`/products/products/${id}/`);
 
+// Returns null when the snapshot is missing or past its valid_until date,
+// in which case callers should fall back to the API.
+export const getCatalogSnapshot = async (): Promise<CatalogSnapshot | null> => {
+  try {
+    const response = await axios.get<CatalogSnapshot>(CATALOG_SNAPSHOT_URL);
+    if (new Date(response.data.valid_until).getTime() <= Date.now()) {
+      return null;
+    }
+    return response.data;
+  } catch {
+    return null;
+  }
+};
+
 // Enrollments
 export const createEnrollment = (data: {
   product_id: number;
   batch_id: number;
   form_data: any;
   coupon_code?: string;
+  queue_token?: string;
 }) => api.post<Enrollment>('/enrollments/', data);
 
+// Waiting room
+export interface WaitingRoomStatus {
+  token: string | null;
+  batch_id: number;
+  admitted: boolean;
+  position: number;
+  estimated_wait: number; // segundos
+  retry_after: number; // segundos
+}
+
+export const joinWaitingRoom = (batchId: number) =>
+  api.post<WaitingRoomStatus>('/enrollments/waiting-room/', { batch_id: batchId });
+
+export const getWaitingRoomStatus = (token: string) =>
+  api.get<WaitingRoomStatus>(`/enrollments/waiting-room/${token}/`);
+
 export const validateCoupon = (data: {
   code: string;
   product_id: number;
@@ -174,12 +237,99 @@ export const createPayment = (data: {
   };
 }) => api.post<Payment>('/payments/', data);
 
+// Lightweight status check for polling; the browser revalidates it with ETag (304 when unchanged)
+export const getPaymentStatus = (id: number) =>
+  api.get<PaymentStatus>(`/payments/${id}/status/`);
+
+// Server-Sent Events stream of payment status changes.
+// Uses fetch (not EventSource) so the auth token can be sent as a header.
+// Resolves with the last status received when the stream ends (paid or timed out).
+// The server is at its stream limit; reconnect after retryAfter seconds
+export class PaymentEventsBusyError extends Error {
+  retryAfter: number;
+
+  constructor(retryAfter: number) {
+    super('Payment events stream busy');
+    this.retryAfter = retryAfter;
+  }
+}
+
+export const streamPaymentEvents = async (
+  id: number,
+  onStatus: (status: PaymentStatus) => void,
+  signal?: AbortSignal
+): Promise<PaymentStatus | null> => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_URL}/payments/${id}/events/`, {
+    headers: {
+      Accept: 'text/event-stream',
+      ...(token ? { Authorization: `Token ${token}` } : {}),
+    },
+    credentials: 'include',
+    signal,
+  });
+
+  if (response.status === 503) {
+    throw new PaymentEventsBusyError(Number(response.headers.get('Retry-After')) || 5);
+  }
+  if (!response.ok || !response.body) {
+    throw new Error(`Payment events stream failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let lastStatus: PaymentStatus | null = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator = buffer.indexOf('\n\n');
+    while (separator !== -1) {
+      const message = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      separator = buffer.indexOf('\n\n');
+
+      const lines = message.split('\n');
+      const event = lines.find((line) => line.startsWith('event: '))?.slice(7);
+      const data = lines.find((line) => line.startsWith('data: '))?.slice(6);
+      if (event === 'status' && data) {
+        lastStatus = JSON.parse(data) as PaymentStatus;
+        onStatus(lastStatus);
+      }
+    }
+  }
+
+  return lastStatus;
+};
+
 export const calculatePayment = (data: {
   enrollment_id: number;
   payment_method: string;
   installments: number;
 }) => api.post('/payments/calculate/', data);
 
+export interface PaymentQuoteMethod {
+  payment_method: 'PIX_CASH' | 'PIX_INSTALLMENT' | 'CREDIT_CARD';
+  original_amount: number;
+  discount_amount: number;
+  final_amount: number;
+  options: { installments: number; installment_value: number }[];
+}
+
+export interface PaymentQuote {
+  enrollment_id: number;
+  coupon_code: string | null;
+  max_installments: number;
+  methods: PaymentQuoteMethod[];
+}
+
+// Every payment method x installment count in one call; revalidated with ETag
+export const getPaymentQuote = (enrollmentId: number) =>
+  api.get<PaymentQuote>(`/payments/quote/${enrollmentId}/`);
+
 // Authentication
 export interface User {
   id: number;